@@ -0,0 +1,82 @@
+import importlib
+import threading
+
+from loader import FIX_CENTS, SHARED_DIR, make_partitioned_sync, save_sync_snapshot, secrets_file_account
+from price_changes import ChangeStore
+from price_cube import CubeStore
+from price_quality import QualityStore
+from shared_dataset import SharedSync
+from sheet_sync import BackgroundRefresher
+
+# =========================================================
+#   PROCESS DATA (one per server process, shared by all sessions)
+#   The shared dataset, its refresher thread and the per-version stores.
+#   serve.py builds it while the server starts, so the first session
+#   finds the data loaded, checked and in the cube; under a plain
+#   `streamlit run dashboard.py` the first session's login builds it.
+# =========================================================
+REFRESH_INTERVAL = 30  # seconds between change checks
+# Needed by the first dashboard run (charts, sidebar logo) but not by the
+# login, so they are imported in the background meanwhile
+DEFERRED_MODULES = ["altair", "PIL.Image"]
+
+
+class AppData:
+    def __init__(self, account=secrets_file_account):
+        # The process holding the leader lock reads the sheets and publishes
+        # each version as an Arrow file; every process serves that file
+        # memory-mapped
+        self.sync = SharedSync(SHARED_DIR, lambda: make_partitioned_sync(account))
+        self.quality = QualityStore(correct=FIX_CENTS)
+        self.cubes = CubeStore()
+        self.changes = ChangeStore()
+        # Set by the dashboard: drops its caches of the old version
+        self.on_new_version = None
+        self.refresher = BackgroundRefresher(self.sync, interval=REFRESH_INTERVAL, on_change=self._on_change)
+
+    def _on_change(self, sync: SharedSync):
+        # Runs on the refresher thread when a new data version is published
+        if sync.source is not None:
+            save_sync_snapshot(sync.source)
+        if self.on_new_version is not None:
+            self.on_new_version()
+        # Check the prices and build the cube now, so the next rerun (or the
+        # first one after login) doesn't have to
+        snapshot, _ = self.quality.get(sync.current())
+        if not snapshot.frame.empty:
+            self.cubes.get(snapshot.version, snapshot.frame, snapshot.parent_version, snapshot.delta)
+            self.changes.get(snapshot.version, snapshot.frame, snapshot.parent_version, snapshot.delta)
+
+
+_lock = threading.Lock()
+_preloaded: AppData | None = None
+_taken = False
+
+
+def import_deferred():
+    for name in DEFERRED_MODULES:
+        importlib.import_module(name)
+
+
+def preload(account=secrets_file_account) -> AppData | None:
+    """Build this process's AppData and start loading, unless a session already took one."""
+    global _preloaded
+    with _lock:
+        if _preloaded is None and not _taken:
+            _preloaded = AppData(account)
+            _preloaded.refresher.start()
+        data = _preloaded
+    import_deferred()
+    return data
+
+
+def take_preloaded(account=secrets_file_account) -> AppData:
+    # The preloaded AppData the first time; a new one after that (e.g. once
+    # st.cache_resource has been cleared) or without a preload
+    global _preloaded, _taken
+    with _lock:
+        data, _preloaded, _taken = _preloaded, None, True
+    if data is None:
+        data = AppData(account)
+        threading.Thread(target=import_deferred, name="import-deferred", daemon=True).start()
+    return data
@@ -0,0 +1,250 @@
+import os
+
+# =========================================================
+#   STATIC ASSETS (CSS, logo)
+#   Built once per process, when dashboard.py first imports this module;
+#   the script itself runs again on every interaction. Each page gets one
+#   ready-made <style> block.
+# =========================================================
+LOGO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "potwell_logo_rgb_mv.jpg")
+
+# ---------- LOGIN (dark) ----------
+LOGIN_CSS = """
+    .stApp {
+        background: radial-gradient(circle at 50% 10%, rgb(25, 25, 30) 0%, rgb(5, 5, 5) 100%);
+        color: #e0e0e0;
+    }
+
+    /* INPUT FIELDS STYLING (login) */
+    div[data-testid="stTextInput"] input {
+        background-color: rgba(255, 255, 255, 0.05) !important;
+        color: #e0e0e0 !important;
+        border: 1px solid rgba(255, 255, 255, 0.12) !important;
+        border-radius: 10px !important;
+        padding: 10px 12px !important;
+    }
+    div[data-testid="stTextInput"] input:focus {
+        border-color: rgba(14, 165, 183, 0.9) !important;
+        box-shadow: 0 0 10px rgba(14, 165, 183, 0.25) !important;
+    }
+"""
+
+LOCK_CSS = """
+    /* LOCK */
+    .lock-container { position: relative; width: 60px; height: 60px; margin: 0 auto 30px auto; }
+    .lock-body {
+        width: 40px; height: 30px; background: #444; position: absolute; bottom: 0; left: 50%;
+        transform: translateX(-50%); border-radius: 6px; transition: background 0.35s ease, box-shadow 0.35s ease;
+    }
+    .lock-shackle {
+        width: 24px; height: 30px; border: 4px solid #444; border-bottom: 0; border-radius: 15px 15px 0 0;
+        position: absolute; top: 2px; left: 50%; transform: translateX(-50%);
+        transition: transform 0.45s ease, border-color 0.35s ease; transform-origin: 100% 100%;
+    }
+
+    /* Success (GREEN) */
+    .success .lock-shackle { transform: translateX(-50%) rotateY(180deg) translateX(15px); border-color: #22c55e; }
+    .success .lock-body { background: #22c55e; box-shadow: 0 0 22px rgba(34, 197, 94, 0.55); }
+
+    /* Error (RED) */
+    .error .lock-shackle { border-color: #ef4444; }
+    .error .lock-body { background: #ef4444; box-shadow: 0 0 22px rgba(239, 68, 68, 0.45); }
+
+    /* Shake animation */
+    @keyframes shake {
+      0%{transform:translateX(-50%) translateX(0)}
+      15%{transform:translateX(-50%) translateX(-6px)}
+      30%{transform:translateX(-50%) translateX(6px)}
+      45%{transform:translateX(-50%) translateX(-5px)}
+      60%{transform:translateX(-50%) translateX(5px)}
+      75%{transform:translateX(-50%) translateX(-3px)}
+      100%{transform:translateX(-50%) translateX(0)}
+    }
+    .shake { animation: shake 0.5s ease-in-out 1; }
+
+    /* Status messages */
+    .status-msg { text-align: center; font-family: monospace; letter-spacing: 2px; margin-top: 18px; font-size: 13px; }
+    .status-success { color: #22c55e; }
+    .status-error { color: #ef4444; }
+"""
+
+# Only while logged out
+LOGIN_SCREEN_CSS = """
+    /* Hide Sidebar on Login */
+    [data-testid="stSidebar"] { display: none; }
+
+    /* Card centered */
+    div[data-testid="stAppViewContainer"] .main .block-container {
+        max-width: 520px !important;
+        padding: 60px 44px !important;
+        margin: 10vh auto 0 auto !important;
+        background: rgba(255, 255, 255, 0.03) !important;
+        backdrop-filter: blur(20px);
+        -webkit-backdrop-filter: blur(20px);
+        border: 1px solid rgba(255, 255, 255, 0.08) !important;
+        border-radius: 24px !important;
+        box-shadow: 0 20px 50px rgba(0, 0, 0, 0.5) !important;
+    }
+
+    /* Typography */
+    h2 { text-align: center; font-weight: 600; letter-spacing: 2px; font-size: 28px; margin-bottom: 0px; color: #e5e7eb; }
+    p  { text-align: center; color: #9ca3af; font-size: 12px; margin-top: -10px; margin-bottom: 40px; }
+
+    /* Form width = input width */
+    div[data-testid="stForm"]{
+        max-width: 420px !important;
+        margin: 0 auto !important;
+    }
+
+    /* Password field container */
+    div[data-testid="stForm"] div[data-testid="stTextInput"] { width: 100% !important; }
+    div[data-testid="stForm"] div[data-testid="stTextInput"] > div {
+        border: 1px solid rgba(255,255,255,0.14) !important;
+        border-radius: 12px !important;
+        background: rgba(255,255,255,0.06) !important;
+        padding: 2px !important;
+    }
+
+    /* Input itself */
+    div[data-testid="stForm"] div[data-testid="stTextInput"] input {
+        border: none !important;
+        outline: none !important;
+        background: transparent !important;
+        color: #000000 !important;
+        padding: 12px 12px !important;
+    }
+    div[data-testid="stForm"] div[data-testid="stTextInput"] input::placeholder {
+        color: #6b7280 !important;
+    }
+    div[data-testid="stForm"] div[data-testid="stTextInput"]:focus-within > div {
+        border-color: rgba(14, 165, 183, 0.9) !important;
+        box-shadow: 0 0 12px rgba(14, 165, 183, 0.22) !important;
+    }
+
+    /* Hide Streamlit's form hint */
+    div[data-testid="stTextInput"] [data-testid="InputInstructions"] { display: none !important; }
+    div[data-testid="stTextInput"] [data-testid="stInputInstructions"] { display: none !important; }
+    div[data-testid="stTextInput"] div[aria-live="polite"] { display: none !important; }
+
+    /* Center submit button */
+    div[data-testid="stFormSubmitButton"]{
+        display: flex !important;
+        justify-content: center !important;
+        margin-top: 14px !important;
+    }
+    div[data-testid="stFormSubmitButton"] > button {
+        width: auto !important;
+        min-width: 180px !important;
+        padding: 12px 22px !important;
+        border-radius: 12px !important;
+        border: none !important;
+        font-weight: 800 !important;
+        letter-spacing: 1px !important;
+        background: linear-gradient(135deg, #19b8d6 0%, #0ea5b7 60%, #0891b2 100%) !important;
+        color: #061018 !important;
+        transition: transform 0.15s ease, box-shadow 0.15s ease !important;
+    }
+    div[data-testid="stFormSubmitButton"] > button:hover {
+        box-shadow: 0 10px 25px rgba(14, 165, 183, 0.25) !important;
+        transform: translateY(-1px) scale(1.01);
+    }
+"""
+
+# Shown over the dashboard right after login; fades out in the browser
+LOGIN_SUCCESS_OVERLAY = """
+<style>
+""" + LOCK_CSS + """
+.login-overlay {
+    position: fixed; inset: 0; z-index: 999999; pointer-events: none;
+    display: flex; flex-direction: column; align-items: center; justify-content: center;
+    background: radial-gradient(circle at 50% 10%, rgb(25, 25, 30) 0%, rgb(5, 5, 5) 100%);
+    animation: login-overlay-out 0.4s ease 0.8s forwards;
+}
+@keyframes login-overlay-out { to { opacity: 0; visibility: hidden; } }
+</style>
+<div class="login-overlay">
+    <div class="lock-container success">
+        <div class="lock-shackle"></div>
+        <div class="lock-body"></div>
+    </div>
+    <div class="status-msg status-success">SALASANA OIKEIN</div>
+</div>
+"""
+
+# ---------- DASHBOARD (light) ----------
+DASHBOARD_CSS = """
+    /* Vaaleampi tausta vain dashboardille */
+    .stApp {
+        background: radial-gradient(circle at 50% 10%, rgb(245, 246, 250) 0%, rgb(232, 235, 242) 100%);
+        color: #111827;
+    }
+
+    /* Yleinen typografia */
+    h1, h2, h3, h4, h5, h6, p, div, span, label {
+        color: #111827;
+    }
+
+    /* Sidebar vaaleaksi */
+    section[data-testid="stSidebar"] {
+        background: rgba(255, 255, 255, 0.75);
+        backdrop-filter: blur(8px);
+        -webkit-backdrop-filter: blur(8px);
+        border-right: 1px solid rgba(17, 24, 39, 0.08);
+    }
+
+    /* Inputit dashboardilla */
+    div[data-testid="stTextInput"] input,
+    div[data-testid="stNumberInput"] input,
+    div[data-testid="stDateInput"] input,
+    div[data-testid="stMultiSelect"] div[role="combobox"],
+    div[data-testid="stSelectbox"] div[role="combobox"] {
+        background-color: rgba(255, 255, 255, 0.95) !important;
+        color: #111827 !important;
+        border: 1px solid rgba(17, 24, 39, 0.15) !important;
+        border-radius: 8px !important;
+    }
+
+    /* Fokus */
+    div[data-testid="stTextInput"] input:focus,
+    div[data-testid="stNumberInput"] input:focus,
+    div[data-testid="stDateInput"] input:focus {
+        border-color: #00d4ff !important;
+        box-shadow: 0 0 10px rgba(0, 212, 255, 0.15) !important;
+    }
+
+    /* Streamlit dataframet vaalealle paremmin */
+    div[data-testid="stDataFrame"] {
+        background: rgba(255,255,255,0.85) !important;
+        border-radius: 12px;
+        padding: 6px;
+        border: 1px solid rgba(17, 24, 39, 0.08);
+    }
+
+    /* Altair/Chart container */
+    div[data-testid="stAltairChart"] {
+        background: rgba(255,255,255,0.85) !important;
+        border-radius: 12px;
+        padding: 12px;
+        border: 1px solid rgba(17, 24, 39, 0.08);
+    }
+"""
+
+
+def _style(*blocks: str) -> str:
+    return "<style>" + "".join(blocks) + "</style>"
+
+
+# The login rules come first on the dashboard too, as they always have
+LOGIN_STYLE = _style(LOGIN_CSS, LOGIN_SCREEN_CSS, LOCK_CSS)
+DASHBOARD_STYLE = _style(LOGIN_CSS, DASHBOARD_CSS)
+
+
+def _read(path: str) -> bytes | None:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+LOGO = _read(LOGO_FILE)  # None without the file
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+from price_cube import SUM_SCALE, PriceCube
+from stores import ALLOWED_CHAINS
+
+# =========================================================
+#   BASKET PRICE INDEX
+#   Chained Laspeyres-type index of a fixed product basket (one unit of
+#   each product) per chain or group. Built from the cube's Ketju / Ryhmä
+#   tables as one [member, date, product] array of mean prices:
+#     - gaps are filled by carrying the last price forward
+#     - the link from one survey date to the next compares the basket
+#       cost of the products priced on both dates
+#     - the index is the running product of the links, 100 at the start
+#   Every step is a NumPy operation over all members, dates and products.
+# =========================================================
+CHAIN_MEMBERS = [c for chains in ALLOWED_CHAINS.values() for c in chains]
+GROUP_MEMBERS = list(ALLOWED_CHAINS)
+
+
+def _positions(column: pd.Series, labels: list[str]) -> np.ndarray:
+    # Position of each value in `labels` (-1 if absent), via the category codes
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        at = pd.Index(labels).get_indexer(column.cat.categories.astype(str))
+        codes = column.cat.codes.to_numpy()
+        return np.where(codes >= 0, at[codes], -1)
+    return pd.Index(labels).get_indexer(column.astype(str))
+
+
+def price_array(cube: PriceCube, level: str, members: list[str], products: list[str]):
+    """(dates, [member, date, product] mean prices with NaN gaps) from a cube level."""
+    table = cube.levels[level]
+    dates = np.unique(table["pvm"].to_numpy())
+    m = _positions(table[level], members)
+    p = _positions(table["tuote"], products)
+    keep = (m >= 0) & (p >= 0) & (table["count"].to_numpy() > 0)
+    d = np.searchsorted(dates, table["pvm"].to_numpy()[keep])
+
+    prices = np.full((len(members), len(dates), len(products)), np.nan)
+    prices[m[keep], d, p[keep]] = (
+        table["sum"].to_numpy()[keep] / (table["count"].to_numpy()[keep] * SUM_SCALE)
+    )
+    return dates, prices
+
+
+def carry_forward(prices: np.ndarray) -> np.ndarray:
+    # Last known price along the date axis (axis 1)
+    seen = ~np.isnan(prices)
+    last = np.where(seen, np.arange(prices.shape[1])[None, :, None], 0)
+    np.maximum.accumulate(last, axis=1, out=last)
+    return np.take_along_axis(prices, last, axis=1)
+
+
+class BasketIndex:
+    def __init__(self, cube: PriceCube, level: str, members: list[str], products: list[str]):
+        self.level = level
+        self.products = list(products)
+        dates, raw = price_array(cube, level, members, self.products)
+        # Members without any basket price are left out
+        present = ~np.isnan(raw).all(axis=(1, 2))
+        self.members = [m for m, ok in zip(members, present) if ok]
+        self.dates = dates
+        self.prices = carry_forward(raw[present])
+
+        # Link date t-1 -> t over the products priced on both
+        both = ~np.isnan(self.prices[:, 1:]) & ~np.isnan(self.prices[:, :-1])
+        now = np.where(both, self.prices[:, 1:], 0.0).sum(axis=2)
+        before = np.where(both, self.prices[:, :-1], 0.0).sum(axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            links = np.where(before > 0, now / before, np.nan)
+        self.links = np.concatenate([np.full((len(self.members), 1), np.nan), links], axis=1)
+        # Cost of the whole basket where every product has a price
+        complete = ~np.isnan(self.prices).any(axis=2)
+        self.cost = np.where(complete, np.nan_to_num(self.prices).sum(axis=2), np.nan)
+        self.priced = ~np.isnan(self.prices).all(axis=2)
+
+    @property
+    def empty(self) -> bool:
+        return not self.members or not len(self.dates)
+
+    def series(self, start_date=None, end_date=None) -> pd.DataFrame:
+        """Long table (pvm, member, Indeksi, Korin hinta), 100 at each member's first date in range."""
+        lo = 0 if start_date is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start_date)))
+        hi = len(self.dates) if end_date is None else np.searchsorted(
+            self.dates, np.datetime64(pd.Timestamp(end_date) + pd.Timedelta(days=1))
+        )
+        links = self.links[:, lo:hi]
+        priced = self.priced[:, lo:hi]
+        if not links.shape[1]:
+            return pd.DataFrame(columns=["pvm", self.level, "Indeksi", "Korin hinta"])
+
+        # Base: the first date in range with a price; no link into it
+        started = np.maximum.accumulate(priced, axis=1)
+        first = started & ~np.concatenate([np.zeros((len(self.members), 1), bool), started[:, :-1]], axis=1)
+        step = np.where(started & ~first & ~np.isnan(links), links, 1.0)
+        index = np.where(started, 100.0 * np.cumprod(step, axis=1), np.nan)
+
+        n_members, n_dates = index.shape
+        return pd.DataFrame({
+            "pvm": np.tile(self.dates[lo:hi], n_members),
+            self.level: np.repeat(self.members, n_dates),
+            "Indeksi": index.ravel(),
+            "Korin hinta": self.cost[:, lo:hi].ravel(),
+        }).dropna(subset=["Indeksi"]).reset_index(drop=True)
+
+
+def common_basket(cube: PriceCube, chains: list[str] = CHAIN_MEMBERS) -> list[str]:
+    """Products priced at some point in every one of `chains` (all products if none)."""
+    table = cube.levels["Ketju"]
+    products = sorted(str(t) for t in table["tuote"].cat.categories) if isinstance(
+        table["tuote"].dtype, pd.CategoricalDtype) else sorted(table["tuote"].astype(str).unique())
+    m = _positions(table["Ketju"], chains)
+    p = _positions(table["tuote"], products)
+    keep = (m >= 0) & (p >= 0) & (table["count"].to_numpy() > 0)
+    priced = np.zeros((len(chains), len(products)), dtype=bool)
+    priced[m[keep], p[keep]] = True
+    present = priced.any(axis=1)
+    if not present.any():
+        return []
+    everywhere = priced[present].all(axis=0)
+    anywhere = priced.any(axis=0)
+    return [t for t, ok in zip(products, everywhere if everywhere.any() else anywhere) if ok]
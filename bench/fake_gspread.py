@@ -0,0 +1,125 @@
+import contextlib
+import datetime
+import itertools
+import re
+import time
+from unittest import mock
+
+import gspread
+
+# =========================================================
+#   FAKE GOOGLE SHEETS
+#   Just the gspread surface the dashboard uses (authorize -> open ->
+#   worksheets() -> get_all_values / batch_get, get_lastUpdateTime),
+#   backed by lists of rows. `fake_google(rows)` patches gspread and the
+#   oauth2client credentials so dashboard.py runs without network access.
+#   `latency` adds a fixed delay to every values call, like a real request.
+# =========================================================
+_RANGE = re.compile(r"^([A-Z]+)(\d+):([A-Z]+)(\d*)$")
+
+
+def _column_number(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+_ids = itertools.count(1)
+
+
+class FakeWorksheet:
+    def __init__(self, rows: list[list[str]], spreadsheet=None, title: str = "Sheet1", latency: float = 0.0):
+        self.rows = [list(r) for r in rows]
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = next(_ids)
+        self.latency = latency
+        self.calls = []
+
+    def get_all_values(self) -> list[list[str]]:
+        self.calls.append(("get_all_values",))
+        time.sleep(self.latency)
+        return [list(r) for r in self.rows]
+
+    def batch_get(self, ranges: list[str]) -> list[list[list[str]]]:
+        self.calls.append(("batch_get", tuple(ranges)))
+        time.sleep(self.latency)
+        out = []
+        for a1 in ranges:
+            m = _RANGE.match(a1)
+            if m is None:
+                raise ValueError(f"Unsupported range: {a1}")
+            first_col, last_col = _column_number(m.group(1)), _column_number(m.group(3))
+            first_row = int(m.group(2))
+            last_row = int(m.group(4)) if m.group(4) else len(self.rows)
+            block = [r[first_col - 1:last_col] for r in self.rows[first_row - 1:last_row]]
+            out.append(block)
+        return out
+
+    def append_rows(self, rows: list[list[str]]):
+        # New survey rows, like a user typing into the sheet
+        self.rows.extend(list(r) for r in rows)
+        if self.spreadsheet is not None:
+            self.spreadsheet.touch()
+
+
+class FakeSpreadsheet:
+    def __init__(self, title: str, worksheets: dict[str, list[list[str]]], latency: float = 0.0):
+        self.title = title
+        self.id = f"fake-{next(_ids)}"
+        self._worksheets = [
+            FakeWorksheet(rows, spreadsheet=self, title=ws_title, latency=latency)
+            for ws_title, rows in worksheets.items()
+        ]
+        self._modified = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    @property
+    def sheet1(self) -> FakeWorksheet:
+        return self._worksheets[0]
+
+    def worksheets(self) -> list[FakeWorksheet]:
+        return list(self._worksheets)
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        for ws in self._worksheets:
+            if ws.title == title:
+                return ws
+        raise gspread.exceptions.WorksheetNotFound(title)
+
+    def touch(self):
+        self._modified += datetime.timedelta(seconds=1)
+
+    def get_lastUpdateTime(self) -> str:
+        self.sheet1.calls.append(("get_lastUpdateTime",))
+        return self._modified.isoformat()
+
+
+class FakeClient:
+    def __init__(self, spreadsheets: list[FakeSpreadsheet]):
+        self.spreadsheets = {s.title: s for s in spreadsheets}
+
+    def open(self, title: str) -> FakeSpreadsheet:
+        try:
+            return self.spreadsheets[title]
+        except KeyError:
+            raise gspread.exceptions.SpreadsheetNotFound(title) from None
+
+
+@contextlib.contextmanager
+def fake_google(rows: list[list[str]], worksheets: dict | None = None,
+                archives: dict | None = None, latency: float = 0.0):
+    """Patch gspread/oauth2client; yields the main FakeSpreadsheet.
+
+    `rows` is the main "Potwell Data" sheet1; `worksheets` adds more
+    worksheets to it ({title: rows}) and `archives` more spreadsheets
+    ({spreadsheet title: {worksheet title: rows}}).
+    """
+    spreadsheet = FakeSpreadsheet("Potwell Data", {"Sheet1": rows, **(worksheets or {})}, latency)
+    others = [FakeSpreadsheet(title, sheets, latency) for title, sheets in (archives or {}).items()]
+    client = FakeClient([spreadsheet] + others)
+    creds = "oauth2client.service_account.ServiceAccountCredentials"
+    with mock.patch("gspread.authorize", lambda _creds: client), \
+            mock.patch(f"{creds}.from_json_keyfile_dict", lambda *a, **k: None), \
+            mock.patch(f"{creds}.from_json_keyfile_name", lambda *a, **k: None):
+        yield spreadsheet
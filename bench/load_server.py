@@ -0,0 +1,80 @@
+"""Run the dashboard against a synthetic, fake Google Sheet (for load tests).
+
+    python -m bench.load_server                          # medium data on :8599
+    python -m bench.load_server --scale large --latency 0.3 --port 8600
+    python -m bench.load_server --no-preload             # like `streamlit run dashboard.py`
+
+The server runs in a throwaway working directory with a dummy service
+account, so the published dataset and snapshots start empty and the first
+load goes through the same sheet sync as production. `--append-every`
+adds a survey date to the sheet now and then, so new data versions arrive
+while sessions are connected. bench/load_test.py starts this as a
+subprocess; it can also be run by hand and pointed at with --url.
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench.fake_gspread import fake_google  # noqa: E402
+from bench.run import SCALES  # noqa: E402
+from bench.synthetic import generate_rows  # noqa: E402
+
+SECRETS = '[gcp_service_account]\ntype = "service_account"\n'
+
+
+def append_surveys(sheet, every: float):
+    # Copies the latest survey date's rows one week later, every `every` s
+    while True:
+        time.sleep(every)
+        rows = sheet.rows[1:]
+        day = max(r[0] for r in rows)  # ISO dates sort as text
+        new_day = (datetime.date.fromisoformat(day) + datetime.timedelta(days=7)).isoformat()
+        sheet.append_rows([[new_day, *r[1:]] for r in rows if r[0] == day])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="medium", choices=list(SCALES))
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every sheet values call")
+    parser.add_argument("--append-every", type=float, help="add a survey date every this many seconds")
+    parser.add_argument("--no-preload", action="store_true", help="don't load the data before the first session")
+    args, streamlit_args = parser.parse_known_args(argv)
+
+    rows = generate_rows(*SCALES[args.scale])
+    print(f"{len(rows) - 1:,} rows ({args.scale})", file=sys.stderr)
+
+    from streamlit.web import cli
+
+    import serve
+
+    with tempfile.TemporaryDirectory(prefix="potwell-load-") as workdir, \
+            fake_google(rows, latency=args.latency) as spreadsheet:
+        os.makedirs(os.path.join(workdir, ".streamlit"))
+        with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w", encoding="utf-8") as f:
+            f.write(SECRETS)
+        os.chdir(workdir)
+        if args.append_every:
+            threading.Thread(
+                target=append_surveys, args=(spreadsheet.sheet1, args.append_every), name="append", daemon=True,
+            ).start()
+        if not args.no_preload:
+            threading.Thread(target=serve.preload, name="preload", daemon=True).start()
+        sys.argv = [
+            "streamlit", "run", os.path.join(ROOT, "dashboard.py"),
+            "--server.port", str(args.port), "--server.headless", "true",
+            "--browser.gatherUsageStats", "false", *streamlit_args,
+        ]
+        return cli.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+"""Concurrent-session load test of the dashboard in headless Chromium.
+
+    python -m bench.load_test                          # 1, 5 and 10 sessions, medium data
+    python -m bench.load_test --sessions 1,10,25 --iterations 10 --scale large
+    python -m bench.load_test --url http://localhost:8501 --pid 4242   # a running server
+    python -m bench.load_test --json load.json         # results for sizing
+
+Needs Playwright's Chromium (`playwright install chromium`). Unless --url is
+given, the app is started with bench/load_server.py (synthetic data, fake
+sheets) and its memory and CPU are sampled from /proc, so Linux only.
+
+Each session logs in, then runs --iterations rounds of: sidebar date range,
+sidebar product multiselect, matrix_radio. Every step waits until the rerun
+it caused has finished in the browser. One warm-up session runs first (it
+builds the shared per-version caches), then the session counts one after
+the other, all sessions of a count at once. Per count it prints time to
+first render (login page, dashboard after login), p50/p95/p99 per
+interaction, and the server's CPU time per rerun and memory per session.
+If either of those grows more than --max-growth times from the smallest to
+the largest count, the cost of a session depends on how many users there
+are; the exit code is then 1, as it is when a session fails.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+from playwright.async_api import async_playwright
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = os.environ.get("POTWELL_PASSWORD", "Potwell25!")
+DEFAULT_SESSIONS = "1,5,10"
+INTERACTIONS = ["date_range", "products", "matrix_radio"]
+# Growth below these is noise, whatever the ratio
+MIN_GROWTH_CPU = 0.005  # s per rerun
+MIN_GROWTH_MEMORY = 2 * 2**20  # bytes per session
+
+# Browser clock (performance.now()) of every finished script run: the
+# stApp's data-test-script-state going back to "notRunning"
+RUN_TRACKER = """
+window.__potwellRuns = [];
+new MutationObserver(records => {
+    for (const r of records) {
+        if (r.oldValue !== "notRunning" && r.target.getAttribute(r.attributeName) === "notRunning") {
+            window.__potwellRuns.push(performance.now());
+        }
+    }
+}).observe(document, {
+    subtree: true, attributes: true, attributeOldValue: true, attributeFilter: ["data-test-script-state"],
+});
+"""
+
+
+# =========================================================
+#   SERVER
+# =========================================================
+def start_server(args) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "bench.load_server", "--scale", args.scale, "--port", str(args.port),
+           "--latency", str(args.latency)]
+    if args.append_every:
+        cmd += ["--append-every", str(args.append_every)]
+    if args.no_preload:
+        cmd.append("--no-preload")
+    # Streamlit's banner goes to stdout; errors still show on stderr
+    return subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL)
+
+
+def wait_healthy(url: str, proc: subprocess.Popen | None, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"load_server exited with {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=2) as resp:
+                if resp.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"{url} not healthy after {timeout:g} s")
+
+
+class ProcSampler:
+    """RSS and CPU time of one process from /proc; the peak RSS between resets."""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = self.rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="proc-sampler", daemon=True)
+        self._thread.start()
+
+    def rss(self) -> int:
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            # Fields after the ")" of the command name; utime and stime are 14 and 15
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def reset_peak(self) -> int:
+        self.peak_rss = self.rss()
+        return self.peak_rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.peak_rss = max(self.peak_rss, self.rss())
+            except OSError:
+                return
+
+    def stop(self):
+        self._stop.set()
+
+
+# =========================================================
+#   SESSIONS
+# =========================================================
+class Session:
+    def __init__(self, page, timeout: float):
+        self.page = page
+        self.timeout = timeout * 1000
+        self.times = {}
+
+    async def runs(self) -> int:
+        return await self.page.evaluate("window.__potwellRuns.length")
+
+    async def wait_run(self, after: int) -> float:
+        # Browser time when the first run after `after` finished
+        await self.page.wait_for_function("n => window.__potwellRuns.length > n", arg=after, timeout=self.timeout)
+        return await self.page.evaluate("n => window.__potwellRuns[n]", after)
+
+    async def timed(self, name: str, action):
+        n, t0 = await self.page.evaluate("[window.__potwellRuns.length, performance.now()]")
+        await action()
+        end = await self.wait_run(n)
+        self.times.setdefault(name, []).append((end - t0) / 1000)
+
+    async def login(self, url: str):
+        page = self.page
+        await page.goto(url)
+        # Navigation start -> login script finished
+        self.times["login_page"] = [await self.wait_run(0) / 1000]
+        await page.get_by_placeholder("SYÖTÄ SALASANA").fill(PASSWORD)
+        await self.timed("dashboard", page.get_by_role("button", name="KIRJAUDU").click)
+        await page.get_by_role("heading", name="Hintaseuranta", exact=True).wait_for(timeout=self.timeout)
+
+    async def date_range(self, i: int):
+        # Start date one day later / back, committed when the field loses focus
+        field = self.page.get_by_test_id("stSidebar").get_by_test_id("stDateInput")
+        day = field.locator('[role="spinbutton"][data-type="day"]').first
+
+        async def action():
+            await day.press("ArrowUp" if i % 2 == 0 else "ArrowDown")
+            await day.evaluate("el => el.blur()")
+
+        await self.timed("date_range", action)
+
+    async def products(self, i: int):
+        # Add one more product / remove it again (Backspace on the empty input)
+        page = self.page
+        box = page.get_by_test_id("stSidebar").get_by_test_id("stMultiSelect").filter(has_text="Tuotteet graafiin")
+        field = box.locator("input")
+
+        async def add():
+            await field.click()
+            await page.get_by_test_id("stMultiSelectDropdown").locator(
+                '[role="option"]:not([aria-selected="true"])').first.click()
+            await page.keyboard.press("Escape")
+
+        async def remove():
+            await field.focus()
+            await page.keyboard.press("Backspace")
+
+        await self.timed("products", add if i % 2 == 0 else remove)
+
+    async def matrix_radio(self, i: int):
+        radio = self.page.get_by_test_id("stRadio").filter(has_text="Valitse Ryhmä matriisiin")
+        group = "S-Ryhmä" if i % 2 == 0 else "K-Ryhmä"
+        await self.timed("matrix_radio", radio.get_by_text(group, exact=True).click)
+
+
+async def run_session(browser, url: str, delay: float, iterations: int, think: float, timeout: float) -> dict:
+    await asyncio.sleep(delay)
+    context = await browser.new_context(viewport={"width": 1600, "height": 1000})
+    try:
+        await context.add_init_script(RUN_TRACKER)
+        page = await context.new_page()
+        page.set_default_timeout(timeout * 1000)
+        session = Session(page, timeout)
+        await session.login(url)
+        for i in range(iterations):
+            for name in INTERACTIONS:
+                await asyncio.sleep(think)
+                await getattr(session, name)(i)
+        session.times["reruns"] = await session.runs()
+        return session.times
+    finally:
+        await context.close()
+
+
+async def run_level(browser, args, n: int, sampler: ProcSampler | None) -> dict:
+    rss0 = sampler.reset_peak() if sampler else None
+    cpu0 = sampler.cpu_seconds() if sampler else None
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*[
+        run_session(browser, args.url, i * args.ramp, args.iterations, args.think, args.timeout) for i in range(n)
+    ], return_exceptions=True)
+    wall = time.perf_counter() - t0
+
+    ok = [r for r in results if not isinstance(r, BaseException)]
+    errors = [f"{type(r).__name__}: {str(r).splitlines()[0] if str(r) else ''}"
+              for r in results if isinstance(r, BaseException)]
+    reruns = sum(r.pop("reruns") for r in ok)
+    times = {}
+    for r in ok:
+        for name, values in r.items():
+            times.setdefault(name, []).extend(values)
+
+    level = {
+        "sessions": n, "errors": errors, "wall_seconds": wall, "reruns": reruns,
+        "latency": {
+            name: {"n": len(v), **dict(zip(["p50", "p95", "p99"], np.percentile(v, [50, 95, 99]).tolist()))}
+            for name, v in times.items() if v
+        },
+    }
+    if sampler is not None:
+        cpu = sampler.cpu_seconds() - cpu0
+        level["server"] = {
+            "cpu_seconds": cpu,
+            "cpu_percent": 100 * cpu / wall,
+            "cpu_per_rerun": cpu / reruns if reruns else None,
+            "rss_start": rss0,
+            "rss_peak": sampler.peak_rss,
+            "memory_per_session": (sampler.peak_rss - rss0) / n,
+        }
+    return level
+
+
+def print_level(level: dict):
+    print(f"{level['sessions']} session(s): {level['reruns']} reruns in {level['wall_seconds']:.1f} s"
+          + (f", {len(level['errors'])} failed" if level["errors"] else ""))
+    for error in level["errors"]:
+        print(f"  ! {error}")
+    print(f"  {'':<14}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, t in level["latency"].items():
+        print(f"  {name:<14}{t['n']:>5}{t['p50'] * 1000:>10.0f}{t['p95'] * 1000:>10.0f}{t['p99'] * 1000:>10.0f}")
+    server = level.get("server")
+    if server:
+        per_rerun = server["cpu_per_rerun"]
+        print(f"  server: {per_rerun * 1000 if per_rerun is not None else float('nan'):.1f} ms CPU/rerun, "
+              f"{server['cpu_percent']:.0f} % CPU, "
+              f"{server['memory_per_session'] / 2**20:.1f} MB/session, "
+              f"peak RSS {server['rss_peak'] / 2**20:.0f} MB")
+
+
+def growth_failures(levels: list[dict], max_growth: float) -> list[str]:
+    # Server cost per rerun / per session, smallest vs largest session count
+    measured = [lv for lv in levels if lv.get("server") and lv["server"]["cpu_per_rerun"] is not None]
+    if len(measured) < 2:
+        return []
+    low, high = measured[0], measured[-1]
+    failures = []
+    for key, floor, unit, scale in [
+        ("cpu_per_rerun", MIN_GROWTH_CPU, "ms CPU/rerun", 1000),
+        ("memory_per_session", MIN_GROWTH_MEMORY, "MB/session", 1 / 2**20),
+    ]:
+        a, b = low["server"][key], high["server"][key]
+        if b > max(a, 0) * max_growth and b - a > floor:
+            failures.append(f"{key}: {b * scale:.1f} {unit} at {high['sessions']} sessions "
+                            f"vs {a * scale:.1f} at {low['sessions']}")
+    return failures
+
+
+async def run_all(args, levels: list[int], sampler: ProcSampler | None) -> list[dict]:
+    async with async_playwright() as pw:
+        browser = await pw.chromium.launch(headless=not args.headed)
+        try:
+            # Warm-up: first load of the data version, chart specs, indexes
+            await run_session(browser, args.url, 0, 1, 0, args.timeout)
+            out = []
+            for n in levels:
+                level = await run_level(browser, args, n, sampler)
+                print_level(level)
+                out.append(level)
+            return out
+        finally:
+            await browser.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", default=DEFAULT_SESSIONS, help="comma separated concurrent session counts")
+    parser.add_argument("--iterations", type=int, default=5, help="interaction rounds per session")
+    parser.add_argument("--think", type=float, default=0.5, help="seconds between interactions")
+    parser.add_argument("--ramp", type=float, default=0.2, help="seconds between session starts")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds per page load or rerun")
+    parser.add_argument("--max-growth", type=float, default=1.5)
+    parser.add_argument("--url", help="test this server instead of starting bench/load_server.py")
+    parser.add_argument("--pid", type=int, help="server process to sample with --url")
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--headed", action="store_true", help="show the browser windows")
+    server = parser.add_argument_group("bench/load_server.py (without --url)")
+    server.add_argument("--scale", default="medium", help="synthetic data size, as in bench/run.py")
+    server.add_argument("--port", type=int, default=8599)
+    server.add_argument("--latency", type=float, default=0.0, help="seconds added to every sheet values call")
+    server.add_argument("--append-every", type=float, help="add a survey date every this many seconds")
+    server.add_argument("--no-preload", action="store_true")
+    args = parser.parse_args(argv)
+
+    try:
+        levels = sorted({int(n) for n in args.sessions.split(",") if n.strip()})
+    except ValueError:
+        parser.error(f"--sessions: not a list of numbers: {args.sessions}")
+
+    proc = None
+    if args.url is None:
+        proc = start_server(args)
+        args.url = f"http://localhost:{args.port}"
+    args.url = args.url.rstrip("/")
+    sampler = None
+    try:
+        wait_healthy(args.url, proc)
+        pid = proc.pid if proc is not None else args.pid
+        sampler = ProcSampler(pid) if pid and os.path.exists(f"/proc/{pid}") else None
+        results = asyncio.run(run_all(args, levels, sampler))
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"url": args.url, "iterations": args.iterations, "levels": results}, f, indent=2)
+            f.write("\n")
+
+    failures = growth_failures(results, args.max_growth)
+    if failures:
+        print(f"\nPer-session cost grows with the number of sessions (> {args.max_growth:g}x):")
+        for line in failures:
+            print(f"  {line}")
+    failed = sum(len(level["errors"]) for level in results)
+    return 1 if failures or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
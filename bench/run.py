@@ -0,0 +1,246 @@
+"""Offline benchmarks for the dashboard data path.
+
+    python -m bench.run                        # small + medium, compare to baseline
+    python -m bench.run --scales large --repeat 5
+    python -m bench.run --save-baseline        # record this machine's timings
+    python -m bench.run --skip-app             # without the Streamlit stage
+
+Every stage runs against a synthetic sheet (bench/synthetic.py) and the
+fake gspread client (bench/fake_gspread.py), so no credentials are needed.
+A stage fails when its median is more than --tolerance times the stored
+baseline (and more than MIN_REGRESSION_SECONDS slower, to ignore noise).
+Stages without a baseline are listed; a commit that adds or changes a
+stage should re-save the baseline.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from basket_index import CHAIN_MEMBERS, GROUP_MEMBERS, BasketIndex, common_basket  # noqa: E402
+from bench.fake_gspread import fake_google  # noqa: E402
+from bench.synthetic import generate_rows  # noqa: E402
+from chart_data import chart_series  # noqa: E402
+from dataset import concat_frames  # noqa: E402
+from filter_index import FilterIndex  # noqa: E402
+from matrix import AsOfPrices  # noqa: E402
+from parsing import normalize_frame  # noqa: E402
+from price_changes import ChangeIndex  # noqa: E402
+from price_cube import PriceCube  # noqa: E402
+from price_quality import QualityReport  # noqa: E402
+from sheet_sync import rows_to_frame  # noqa: E402
+from stores import ALLOWED_CHAINS, classify_store, classify_stores  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# (stores, products, weekly survey dates)
+SCALES = {
+    "small": (20, 40, 26),
+    "medium": (60, 80, 104),
+    "large": (150, 120, 260),
+}
+DEFAULT_SCALES = ["small", "medium"]
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def measure(fn, repeat: int, setup=None) -> dict:
+    # Median/min wall time of fn(setup()); setup is not timed
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        t0 = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - t0)
+    return {"median": statistics.median(times), "min": min(times)}
+
+
+def bench_data_path(rows: list[list[str]], repeat: int) -> dict:
+    raw = rows_to_frame(rows[0], rows[1:])
+    df = normalize_frame(raw.copy())
+    checked = df.reset_index(drop=True)
+    df = QualityReport.from_frame(checked).apply(checked)
+    fidx = FilterIndex(df)
+    cube = PriceCube.from_frame(df)
+    asof = AsOfPrices(df)
+
+    products = sorted(df["tuote"].unique())[:3]
+    k_stores = [str(s) for s in fidx.take(fidx.rows("Ketju", ALLOWED_CHAINS["K-Ryhmä"]))["kauppa"].unique()]
+    all_stores = [str(s) for s in df["kauppa"].unique()]
+    end = fidx.max_date
+    start = end - datetime.timedelta(days=90)
+
+    def classify(series):
+        classify_store.cache_clear()
+        classify_stores(series)
+
+    def date_filter(_):
+        rows_ = fidx.rows("tuote", products, within=fidx.date_slice(start, end))
+        fidx.take(fidx.restrict(rows_, "kauppa", k_stores))
+
+    def stats(_):
+        for stores in (all_stores, k_stores):
+            sub = cube.select(fidx.min_date, end, products, stores)
+            cube.kpis(sub)
+            chart_series(cube, sub)
+
+    # Last survey date as a delta on top of the rest
+    last_date = checked["pvm"] == checked["pvm"].max()
+    history = checked[~last_date]
+    appended = concat_frames([history, checked[last_date]])
+    base_report = QualityReport.from_frame(history)
+
+    def quality(_):
+        QualityReport.from_frame(checked)
+
+    def quality_delta(report):
+        report.extend(appended, len(history))
+
+    def changes(_):
+        index = ChangeIndex.from_frame(df)
+        for chains in (None, *ALLOWED_CHAINS.values()):
+            index.largest(start, chains)
+
+    def basket(_):
+        products_ = common_basket(cube)
+        BasketIndex(cube, "Ketju", CHAIN_MEMBERS, products_).series(start, end)
+        BasketIndex(cube, "Ryhmä", GROUP_MEMBERS, products_).series()
+
+    def matrix(_):
+        # Latest two survey dates, then the latest against the first one
+        for chains in ALLOWED_CHAINS.values():
+            days = asof.survey_dates(chains)
+            asof.matrix(days[-1], days[-2], chains)
+            asof.matrix(days[-1], days[0], chains, max_age_days=30)
+
+    return {
+        "parse": measure(normalize_frame, repeat, setup=raw.copy),
+        "classify": measure(classify, repeat, setup=lambda: raw["kauppa"]),
+        "index": measure(lambda _: FilterIndex(df), repeat),
+        "date_filter": measure(date_filter, repeat),
+        "cube": measure(lambda _: PriceCube.from_frame(df), repeat),
+        "stats": measure(stats, repeat),
+        "asof": measure(lambda _: AsOfPrices(df), repeat),
+        "matrix": measure(matrix, repeat),
+        "quality": measure(quality, repeat),
+        "quality_delta": measure(quality_delta, repeat, setup=lambda: base_report),
+        "changes": measure(changes, repeat),
+        "basket": measure(basket, repeat),
+    }
+
+
+def bench_app(rows: list[list[str]]) -> dict:
+    # dashboard.py end to end: load_data() talks to the fake sheet
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    # Bare-mode AppTest warns about a missing runtime on every cache call
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    out = {}
+    with tempfile.TemporaryDirectory() as workdir, fake_google(rows):
+        cwd = os.getcwd()
+        os.chdir(workdir)  # snapshot goes to a throwaway .cache/
+        try:
+            st.cache_data.clear()
+            st.cache_resource.clear()
+            at = AppTest.from_file(os.path.join(ROOT, "dashboard.py"), default_timeout=600)
+            at.secrets["gcp_service_account"] = {"type": "service_account"}
+            at.session_state["password_correct"] = True
+
+            for label in ("app_cold", "app_warm"):
+                t0 = time.perf_counter()
+                at.run()
+                out[label] = {"median": time.perf_counter() - t0}
+                if at.exception:
+                    raise RuntimeError(f"dashboard.py failed: {at.exception[0].message}")
+        finally:
+            os.chdir(cwd)
+    return out
+
+
+def load_baseline() -> dict:
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> tuple[list[str], list[str]]:
+    # -> (regressions, stages without a baseline)
+    failures, missing = [], []
+    for scale, stages in results.items():
+        for stage, timing in stages.items():
+            ref = baseline.get(scale, {}).get(stage)
+            if ref is None:
+                missing.append(f"{scale}/{stage}")
+                continue
+            now = timing["median"]
+            if now > ref * tolerance and now - ref > MIN_REGRESSION_SECONDS:
+                failures.append(f"{scale}/{stage}: {now * 1000:.1f} ms vs baseline {ref * 1000:.1f} ms")
+    return failures, missing
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default=",".join(DEFAULT_SCALES),
+                        help=f"comma separated, of {', '.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--skip-app", action="store_true", help="skip the AppTest run of dashboard.py")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = set(scales) - SCALES.keys()
+    if unknown:
+        parser.error(f"unknown scale(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    for scale in scales:
+        n_stores, n_products, n_dates = SCALES[scale]
+        rows = generate_rows(n_stores, n_products, n_dates)
+        print(f"{scale}: {len(rows) - 1:,} rows ({n_stores} stores x {n_products} products x {n_dates} dates)")
+
+        stages = bench_data_path(rows, args.repeat)
+        if not args.skip_app:
+            stages.update(bench_app(rows))
+        for stage, timing in stages.items():
+            print(f"  {stage:<12} {timing['median'] * 1000:9.1f} ms")
+        results[scale] = stages
+
+    baseline = load_baseline()
+    if args.save_baseline:
+        # Merged, so a --skip-app run keeps the stored app timings
+        for scale, stages in results.items():
+            baseline.setdefault(scale, {}).update({stage: round(t["median"], 6) for stage, t in stages.items()})
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    failures, missing = compare(results, baseline, args.tolerance)
+    if missing and baseline:
+        print(f"\nNo baseline for {', '.join(missing)}; run with --save-baseline.")
+    if failures:
+        print(f"\nRegressions (> {args.tolerance:g}x baseline):")
+        for line in failures:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions." if baseline else "\nNo baseline stored; run with --save-baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import datetime
+import random
+
+from stores import CITYMARKET_OVERRIDES
+
+# =========================================================
+#   SYNTHETIC POTWELL SHEET
+#   Same shape as the "Potwell Data" worksheet: a header row and one row
+#   per (survey date, store, product), all values as strings. Store names
+#   follow the real conventions ("(SM …)" = K-Supermarket, "(KM …)" =
+#   K-Market, plain Citymarket locations, S-Group names written out) and
+#   prices come in the three spellings seen in the sheet: "1,49", "1.49"
+#   and cents "149".
+# =========================================================
+HEADER = ["pvm", "kauppa", "tuote", "EAN", "hinta"]
+
+CITIES = [
+    "Helsinki", "Espoo", "Vantaa", "Tampere", "Turku", "Oulu", "Jyväskylä",
+    "Lahti", "Kuopio", "Pori", "Joensuu", "Lappeenranta", "Hämeenlinna",
+    "Vaasa", "Seinäjoki", "Rovaniemi", "Mikkeli", "Kotka", "Salo", "Porvoo",
+]
+DISTRICTS = [
+    "Keskusta", "Itäkeskus", "Kamppi", "Hervanta", "Raksila", "Laune",
+    "Kupittaa", "Kaleva", "Tikkurila", "Leppävaara", "Kannelmäki", "Lielahti",
+]
+
+# (chain share, name template); {c} = city, {d} = district
+STORE_PATTERNS = [
+    (0.30, "{c} (KM {d})"),
+    (0.20, "{c} (SM {d})"),
+    (0.15, "Prisma {c}"),
+    (0.15, "S-Market {d}"),
+    (0.08, "Sale {d}"),
+    (0.07, "Alepa {d}"),
+    (0.05, "Lähikauppa {d}"),  # unclassified -> "Muu"
+]
+
+PRODUCT_KINDS = [
+    "Peruna kiinteä", "Peruna jauhoinen", "Uusi peruna", "Varhaisperuna",
+    "Salaattiperuna", "Uuniperuna", "Luomuperuna", "Pestyt perunat",
+    "Punainen peruna", "Ranskalaisperuna",
+]
+PACK_SIZES = ["500 g", "1 kg", "1,5 kg", "2 kg", "3 kg"]
+
+
+def ean13(body: int) -> str:
+    # 12 digits + GS1 check digit
+    digits = f"{body:012d}"
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+def store_names(n: int, rng: random.Random) -> list[str]:
+    names = list(CITYMARKET_OVERRIDES)[: max(n // 10, 1)]
+    weights = [w for w, _ in STORE_PATTERNS]
+    while len(names) < n:
+        _, pattern = rng.choices(STORE_PATTERNS, weights)[0]
+        name = pattern.format(c=rng.choice(CITIES), d=rng.choice(DISTRICTS))
+        if rng.random() < 0.05:
+            # Hand-typed spacing that normalize_store_name cleans up
+            name = name.replace("(", "( ").replace(")", " )")
+        if name not in names:
+            names.append(name)
+    return names[:n]
+
+
+def products(n: int) -> list[tuple[str, str]]:
+    out = []
+    for i in range(n):
+        kind = PRODUCT_KINDS[i % len(PRODUCT_KINDS)]
+        size = PACK_SIZES[(i // len(PRODUCT_KINDS)) % len(PACK_SIZES)]
+        series = i // (len(PRODUCT_KINDS) * len(PACK_SIZES))
+        name = f"{kind} {size}" + (f" ({series + 1})" if series else "")
+        out.append((name, ean13(641000000000 + i)))
+    return out
+
+
+def format_price(price: float, rng: random.Random) -> str:
+    r = rng.random()
+    if r < 0.55:
+        return f"{price:.2f}".replace(".", ",")
+    if r < 0.9:
+        return f"{price:.2f}"
+    return str(round(price * 100))
+
+
+def generate_rows(
+    n_stores: int,
+    n_products: int,
+    n_dates: int,
+    seed: int = 0,
+    start: datetime.date = datetime.date(2023, 1, 2),
+    coverage: float = 0.8,
+) -> list[list[str]]:
+    """Header + rows like `worksheet.get_all_values()`, weekly survey dates."""
+    rng = random.Random(seed)
+    stores = store_names(n_stores, rng)
+    items = products(n_products)
+
+    # Prices are sticky: each (store, product) keeps its price until a change
+    base = {ean: rng.uniform(0.6, 4.5) for _, ean in items}
+    current = {}
+
+    rows = [list(HEADER)]
+    for k in range(n_dates):
+        day = (start + datetime.timedelta(days=7 * k)).isoformat()
+        for store in stores:
+            for name, ean in items:
+                if rng.random() > coverage:
+                    continue
+                key = (store, ean)
+                if key not in current or rng.random() < 0.1:
+                    current[key] = round(base[ean] * rng.uniform(0.85, 1.2), 2)
+                rows.append([day, store, name, ean, format_price(current[key], rng)])
+    return rows
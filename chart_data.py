@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+# =========================================================
+#   CHART PAYLOAD
+#   The line chart gets at most MAX_CHART_POINTS points. Long ranges are
+#   first aggregated to weeks or months (from the cube, so means stay
+#   weighted by observations); if that is still too much, each line is
+#   thinned with LTTB (largest triangle three buckets).
+# =========================================================
+MAX_CHART_POINTS = 4000
+METRICS = ["Keskiarvo", "Minimi", "Maksimi"]
+
+RESOLUTIONS = ["D", "W", "M"]
+RESOLUTION_LABELS = {"D": "päivä", "W": "viikko", "M": "kuukausi"}
+AXIS_FORMATS = {"D": "%d.%m.", "W": "%d.%m.", "M": "%m/%Y"}
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the `threshold` points that best keep the shape of (x, y)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    out = np.empty(threshold, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def melt_stats(stats: pd.DataFrame) -> pd.DataFrame:
+    melted = stats.melt(["pvm", "tuote"], var_name="Mittari", value_name="Hinta")
+    # Gaps are not drawn anyway
+    return melted.dropna(subset=["Hinta"])
+
+
+def limit_points(melted: pd.DataFrame, max_points: int = MAX_CHART_POINTS) -> pd.DataFrame:
+    if len(melted) <= max_points:
+        return melted
+
+    groups = melted.groupby(["tuote", "Mittari"], observed=True, sort=False)
+    # Under 3 points a line keeps its ends (2) or just its latest point (1);
+    # with more lines than max_points the ones past it are left out
+    per_series = max(max_points // max(groups.ngroups, 1), 1)
+    keep = []
+    for _, series in groups:
+        if len(keep) == max_points:
+            break
+        series = series.sort_values("pvm")
+        if per_series < 3:
+            idx = [len(series) - 1] if per_series == 1 else np.unique([0, len(series) - 1])
+        else:
+            x = series["pvm"].to_numpy().astype("int64").astype("float64")
+            y = series["Hinta"].to_numpy(dtype="float64")
+            idx = lttb_indices(x, y, per_series)
+        keep.append(series.index.to_numpy()[idx])
+    return melted.loc[np.sort(np.concatenate(keep))]
+
+
+def chart_series(cube, sub: pd.DataFrame, max_points: int = MAX_CHART_POINTS) -> tuple[pd.DataFrame, str]:
+    """Melted chart rows for a cube selection and the resolution they are at."""
+    for freq in RESOLUTIONS:
+        melted = melt_stats(cube.stats(sub, freq))
+        if len(melted) <= max_points:
+            return melted, freq
+    return limit_points(melted, max_points), freq
+
+
+# ---------- chart specs ----------
+# Vega-Lite specs without data, built once per shape: a rerun only sends
+# the rows, and Altair is imported by the first chart, not by the login.
+def _vega_lite(chart) -> dict:
+    # What st.altair_chart() would send, minus the rows and Altair's own
+    # theme (Streamlit applies its theme)
+    spec = chart.to_dict()
+    spec.pop("data", None)
+    spec.pop("config", None)
+    return spec
+
+
+def price_chart_spec(resolution: str) -> dict:
+    """Price chart: a line and points per product and METRICS value."""
+    import altair as alt
+
+    # One dataset shared by both layers
+    base = alt.Chart().encode(
+        x=alt.X("pvm:T", axis=alt.Axis(format=AXIS_FORMATS[resolution], title=None)),
+        y=alt.Y("Hinta:Q", title="Hinta (€)", scale=alt.Scale(zero=False)),
+        color="tuote:N",
+    )
+    return _vega_lite(alt.layer(
+        base.mark_line(strokeWidth=3).encode(strokeDash="Mittari:N"),
+        base.mark_circle(size=80).encode(shape="Mittari:N"),
+        data=alt.Data(values=[]),
+    ).properties(height=400).interactive())
+
+
+def basket_chart_spec(level: str, members: list[str]) -> dict:
+    """Basket index: one line per member of `level`, in `members` order."""
+    import altair as alt
+
+    return _vega_lite(alt.Chart(alt.Data(values=[])).mark_line(strokeWidth=3).encode(
+        x=alt.X("pvm:T", title=None),
+        y=alt.Y("Indeksi:Q", scale=alt.Scale(zero=False)),
+        color=alt.Color(f"{level}:N", sort=members, title=None),
+        tooltip=["pvm:T", f"{level}:N", alt.Tooltip("Indeksi:Q", format=".1f"),
+                 alt.Tooltip("Korin hinta:Q", format=".2f")],
+    ).properties(height=350).interactive())
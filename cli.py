@@ -0,0 +1,146 @@
+"""Headless price reports: the dashboard's data pipeline without Streamlit.
+
+    python cli.py                              # matrices + alerts into ./reports
+    python cli.py --out /srv/potwell --threshold 15 --min-change 0.10
+    python cli.py --offline                    # only what the dashboard published
+    python cli.py --date 2024-05-13 --since 2024-04-01 -v
+    python cli.py --max-age 7                  # matrix also with prices up to a week old
+
+Reads the dataset the dashboard publishes (shared_dataset.py). When there
+is none yet, or with --sync, it syncs the sheets itself the same way the
+dashboard's leader process does (if a dashboard holds the leader lock,
+its latest version is used instead). Prices go through the same quality
+stage, then it writes per group:
+
+    <out>/hintamatriisi-<ryhmä>-<pvm>.csv   the price matrix, latest survey
+                                            vs the one before it; same-day
+                                            prices only, --max-age N also
+                                            shows prices up to N days old
+    <out>/hintamuutokset-<pvm>.csv          price changes since --since at
+                                            least --threshold % (alerts)
+
+Alerts are also printed, so cron mails them; otherwise the run is quiet.
+Exit code 1 means no data could be loaded.
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from loader import FIX_CENTS, SHARED_DIR, make_partitioned_sync, save_sync_snapshot
+from matrix import AsOfPrices
+from price_changes import ChangeIndex
+from price_quality import QualityStore
+from shared_dataset import SharedSync
+from sheet_sync import SyncSnapshot
+from stores import ALLOWED_CHAINS, slug
+
+DEFAULT_THRESHOLD = 10.0  # % change that raises an alert
+ALERT_COLUMNS = ["Ketju", "kauppa", "tuote", "ean", "Vanha", "Uusi", "Muutos €", "Muutos %", "Muutettu"]
+
+
+def load_snapshot(sync: bool, offline: bool, log) -> SyncSnapshot:
+    shared = SharedSync(SHARED_DIR, make_partitioned_sync)
+    if not offline and (sync or not shared.has_data):
+        try:
+            shared.refresh()
+        except Exception as exc:
+            if not shared.has_data:
+                raise
+            print(f"Sheets sync failed, using the published data: {exc}", file=sys.stderr)
+        if shared.source is not None:
+            save_sync_snapshot(shared.source)
+    log(f"data version {shared.version} ({shared.last_mode})")
+    return shared.current()
+
+
+def _date(text: str) -> datetime.date:
+    return datetime.date.fromisoformat(text)
+
+
+def write_matrices(asof: AsOfPrices, out: str, day=None, max_age: int | None = 0) -> list[str]:
+    # One file per group: `day` (default latest survey) vs the survey before it.
+    # Same-day prices only by default, like the dashboard's matrix
+    written = []
+    for group, chains in ALLOWED_CHAINS.items():
+        dates = asof.survey_dates(chains)
+        if not dates:
+            continue
+        day_now = day or dates[-1]
+        earlier = [d for d in dates if d < day_now]
+        matrix = asof.matrix(day_now, earlier[-1] if earlier else None, chains, max_age)
+        if matrix is None or matrix.empty:
+            continue
+        table = matrix.table
+        table.columns = [" / ".join(part for part in col if part) for col in table.columns]
+        path = os.path.join(out, f"hintamatriisi-{slug(group)}-{day_now.isoformat()}.csv")
+        table.to_csv(path, index=False, encoding="utf-8-sig")
+        written.append(path)
+    return written
+
+
+def price_alerts(changes: ChangeIndex, since, threshold: float, min_change: float = 0.0):
+    # Net changes since `since` of at least `threshold` % and `min_change` €
+    table = changes.since(since)
+    hits = table[(table["Muutos %"].abs() >= threshold) & (table["Muutos €"].abs() >= min_change)]
+    return hits.sort_values("Muutos %", key=abs, ascending=False)[ALERT_COLUMNS].reset_index(drop=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Potwell price matrices and change alerts without Streamlit.")
+    parser.add_argument("--out", default="reports", help="output directory (default: reports)")
+    parser.add_argument("--date", type=_date, help="matrix date, YYYY-MM-DD (default: latest survey)")
+    parser.add_argument("--max-age", type=int, default=0, metavar="N",
+                        help="carry prices of stores not surveyed that day at most N days (default: 0 = same day only)")
+    parser.add_argument("--since", type=_date, help="alerts since this date (default: the survey before the latest)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="alert at this %% change")
+    parser.add_argument("--min-change", type=float, default=0.0, help="and at least this many euros")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--sync", action="store_true", help="sync the sheets first even if data is published")
+    mode.add_argument("--offline", action="store_true", help="never touch the sheets")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print files and timings")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+
+    def log(message):
+        if args.verbose:
+            print(f"[{time.perf_counter() - t0:6.2f}s] {message}", file=sys.stderr)
+
+    try:
+        snapshot = load_snapshot(args.sync, args.offline, log)
+    except Exception as exc:
+        print(f"Data load failed: {exc}", file=sys.stderr)
+        return 1
+    if snapshot.frame.empty:
+        print("No data." if args.offline else "No data loaded from the sheets.", file=sys.stderr)
+        return 1
+
+    snapshot, quality = QualityStore(correct=FIX_CENTS).get(snapshot)
+    df = snapshot.frame
+    log(f"{len(df):,} rows, {len(quality)} flagged prices")
+    os.makedirs(args.out, exist_ok=True)
+
+    for path in write_matrices(AsOfPrices(df), args.out, args.date, args.max_age):
+        log(f"wrote {path}")
+
+    dates = [d.date() for d in pd.to_datetime(np.unique(df["pvm"].to_numpy()))]
+    since = args.since or (dates[-2] if len(dates) > 1 else dates[-1])
+    alerts = price_alerts(ChangeIndex.from_frame(df), since, args.threshold, args.min_change)
+    path = os.path.join(args.out, f"hintamuutokset-{dates[-1].isoformat()}.csv")
+    alerts.to_csv(path, index=False, encoding="utf-8-sig")
+    log(f"wrote {path}")
+
+    if len(alerts):
+        print(f"{len(alerts)} hintamuutosta ≥ {args.threshold:g} % {since:%d.%m.%Y} jälkeen:")
+        print(alerts.to_string(index=False, max_rows=50))
+    log("done")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,23 @@
 import streamlit as st
 import pandas as pd
-import altair as alt
-import numpy as np
+import functools
+import logging
 import os
-import re
-import time
-import traceback
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+
+from app_data import AppData, take_preloaded
+from assets import DASHBOARD_STYLE, LOGIN_STYLE, LOGIN_SUCCESS_OVERLAY, LOGO
+from loader import FIX_CENTS
+from sheet_sync import SyncSnapshot
+from chart_data import RESOLUTION_LABELS, basket_chart_spec, chart_series, price_chart_spec
+from exports import EXPORT_FORMATS, matrix_chunks, selection_chunks, selection_rows, write_export
+from filter_index import FilterIndex
+from matrix import MATRIX_PAGE_COLS, MATRIX_PAGE_ROWS, AsOfPrices, PriceMatrix, page_count, page_slice
+from basket_index import CHAIN_MEMBERS, GROUP_MEMBERS, BasketIndex, common_basket
+from price_changes import ChangeIndex
+from price_quality import REASONS, QualityReport
+from price_cube import PriceCube
+from perf import PerfRecorder, RerunTimer, enabled_by_env, note_miss
+from stores import ALLOWED_CHAINS, slug
 
 # =========================================================
 #   CONFIGURATION
@@ -19,100 +29,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# =========================================================
-#   CSS: LOGIN (dark) vs DASHBOARD (light)  (ORIGINAL)
-# =========================================================
-def apply_login_css():
-    st.markdown("""
-        <style>
-        .stApp {
-            background: radial-gradient(circle at 50% 10%, rgb(25, 25, 30) 0%, rgb(5, 5, 5) 100%);
-            color: #e0e0e0;
-        }
-
-        /* INPUT FIELDS STYLING (login) */
-        div[data-testid="stTextInput"] input {
-            background-color: rgba(255, 255, 255, 0.05) !important;
-            color: #e0e0e0 !important;
-            border: 1px solid rgba(255, 255, 255, 0.12) !important;
-            border-radius: 10px !important;
-            padding: 10px 12px !important;
-        }
-        div[data-testid="stTextInput"] input:focus {
-            border-color: rgba(14, 165, 183, 0.9) !important;
-            box-shadow: 0 0 10px rgba(14, 165, 183, 0.25) !important;
-        }
-        </style>
-    """, unsafe_allow_html=True)
-
-
-def apply_dashboard_css():
-    st.markdown("""
-        <style>
-        /* Vaaleampi tausta vain dashboardille */
-        .stApp {
-            background: radial-gradient(circle at 50% 10%, rgb(245, 246, 250) 0%, rgb(232, 235, 242) 100%);
-            color: #111827;
-        }
-
-        /* Yleinen typografia */
-        h1, h2, h3, h4, h5, h6, p, div, span, label {
-            color: #111827;
-        }
-
-        /* Sidebar vaaleaksi */
-        section[data-testid="stSidebar"] {
-            background: rgba(255, 255, 255, 0.75);
-            backdrop-filter: blur(8px);
-            -webkit-backdrop-filter: blur(8px);
-            border-right: 1px solid rgba(17, 24, 39, 0.08);
-        }
-
-        /* Inputit dashboardilla */
-        div[data-testid="stTextInput"] input,
-        div[data-testid="stNumberInput"] input,
-        div[data-testid="stDateInput"] input,
-        div[data-testid="stMultiSelect"] div[role="combobox"],
-        div[data-testid="stSelectbox"] div[role="combobox"] {
-            background-color: rgba(255, 255, 255, 0.95) !important;
-            color: #111827 !important;
-            border: 1px solid rgba(17, 24, 39, 0.15) !important;
-            border-radius: 8px !important;
-        }
-
-        /* Fokus */
-        div[data-testid="stTextInput"] input:focus,
-        div[data-testid="stNumberInput"] input:focus,
-        div[data-testid="stDateInput"] input:focus {
-            border-color: #00d4ff !important;
-            box-shadow: 0 0 10px rgba(0, 212, 255, 0.15) !important;
-        }
-
-        /* Streamlit dataframet vaalealle paremmin */
-        div[data-testid="stDataFrame"] {
-            background: rgba(255,255,255,0.85) !important;
-            border-radius: 12px;
-            padding: 6px;
-            border: 1px solid rgba(17, 24, 39, 0.08);
-        }
-
-        /* Altair/Chart container */
-        div[data-testid="stAltairChart"] {
-            background: rgba(255,255,255,0.85) !important;
-            border-radius: 12px;
-            padding: 12px;
-            border: 1px solid rgba(17, 24, 39, 0.08);
-        }
-        </style>
-    """, unsafe_allow_html=True)
-
-
 # =========================================================
 #   AUTHENTICATION LOGIC (ORIGINAL)
 # =========================================================
 def check_password():
-    apply_login_css()
-
     CORRECT_PASSWORD = "Potwell25!"
 
     # Init session state
@@ -122,357 +42,315 @@ def check_password():
         st.session_state.login_success_anim = False
     if "login_error_anim" not in st.session_state:
         st.session_state.login_error_anim = False
+    if "login_attempts" not in st.session_state:
+        st.session_state.login_attempts = 0
 
     # If already logged in, allow dashboard to render
     if st.session_state.password_correct:
+        if st.session_state.login_success_anim:
+            # Same rerun as the submit: the overlay animates in the browser
+            # while the dashboard renders underneath
+            st.markdown(LOGIN_SUCCESS_OVERLAY, unsafe_allow_html=True)
+            st.session_state.login_success_anim = False
         return True
 
-    # --- LOGIN SCREEN CSS (Only active when logged out) ---
-    st.markdown("""
-    <style>
-    /* Hide Sidebar on Login */
-    [data-testid="stSidebar"] { display: none; }
-
-    /* Card centered */
-    div[data-testid="stAppViewContainer"] .main .block-container {
-        max-width: 520px !important;
-        padding: 60px 44px !important;
-        margin: 10vh auto 0 auto !important;
-        background: rgba(255, 255, 255, 0.03) !important;
-        backdrop-filter: blur(20px);
-        -webkit-backdrop-filter: blur(20px);
-        border: 1px solid rgba(255, 255, 255, 0.08) !important;
-        border-radius: 24px !important;
-        box-shadow: 0 20px 50px rgba(0, 0, 0, 0.5) !important;
-    }
-
-    /* Typography */
-    h2 { text-align: center; font-weight: 600; letter-spacing: 2px; font-size: 28px; margin-bottom: 0px; color: #e5e7eb; }
-    p  { text-align: center; color: #9ca3af; font-size: 12px; margin-top: -10px; margin-bottom: 40px; }
-
-    /* Form width = input width */
-    div[data-testid="stForm"]{
-        max-width: 420px !important;
-        margin: 0 auto !important;
-    }
-
-    /* Password field container */
-    div[data-testid="stForm"] div[data-testid="stTextInput"] { width: 100% !important; }
-    div[data-testid="stForm"] div[data-testid="stTextInput"] > div {
-        border: 1px solid rgba(255,255,255,0.14) !important;
-        border-radius: 12px !important;
-        background: rgba(255,255,255,0.06) !important;
-        padding: 2px !important;
-    }
-
-    /* Input itself */
-    div[data-testid="stForm"] div[data-testid="stTextInput"] input {
-        border: none !important;
-        outline: none !important;
-        background: transparent !important;
-        color: #000000 !important;
-        padding: 12px 12px !important;
-    }
-    div[data-testid="stForm"] div[data-testid="stTextInput"] input::placeholder {
-        color: #6b7280 !important;
-    }
-    div[data-testid="stForm"] div[data-testid="stTextInput"]:focus-within > div {
-        border-color: rgba(14, 165, 183, 0.9) !important;
-        box-shadow: 0 0 12px rgba(14, 165, 183, 0.22) !important;
-    }
-
-    /* Hide Streamlit's form hint */
-    div[data-testid="stTextInput"] [data-testid="InputInstructions"] { display: none !important; }
-    div[data-testid="stTextInput"] [data-testid="stInputInstructions"] { display: none !important; }
-    div[data-testid="stTextInput"] div[aria-live="polite"] { display: none !important; }
-
-    /* Center submit button */
-    div[data-testid="stFormSubmitButton"]{
-        display: flex !important;
-        justify-content: center !important;
-        margin-top: 14px !important;
-    }
-    div[data-testid="stFormSubmitButton"] > button {
-        width: auto !important;
-        min-width: 180px !important;
-        padding: 12px 22px !important;
-        border-radius: 12px !important;
-        border: none !important;
-        font-weight: 800 !important;
-        letter-spacing: 1px !important;
-        background: linear-gradient(135deg, #19b8d6 0%, #0ea5b7 60%, #0891b2 100%) !important;
-        color: #061018 !important;
-        transition: transform 0.15s ease, box-shadow 0.15s ease !important;
-    }
-    div[data-testid="stFormSubmitButton"] > button:hover {
-        box-shadow: 0 10px 25px rgba(14, 165, 183, 0.25) !important;
-        transform: translateY(-1px) scale(1.01);
-    }
-
-    /* LOCK */
-    .lock-container { position: relative; width: 60px; height: 60px; margin: 0 auto 30px auto; }
-    .lock-body {
-        width: 40px; height: 30px; background: #444; position: absolute; bottom: 0; left: 50%;
-        transform: translateX(-50%); border-radius: 6px; transition: background 0.35s ease, box-shadow 0.35s ease;
-    }
-    .lock-shackle {
-        width: 24px; height: 30px; border: 4px solid #444; border-bottom: 0; border-radius: 15px 15px 0 0;
-        position: absolute; top: 2px; left: 50%; transform: translateX(-50%);
-        transition: transform 0.45s ease, border-color 0.35s ease; transform-origin: 100% 100%;
-    }
-
-    /* Success (GREEN) */
-    .success .lock-shackle { transform: translateX(-50%) rotateY(180deg) translateX(15px); border-color: #22c55e; }
-    .success .lock-body { background: #22c55e; box-shadow: 0 0 22px rgba(34, 197, 94, 0.55); }
-
-    /* Error (RED) */
-    .error .lock-shackle { border-color: #ef4444; }
-    .error .lock-body { background: #ef4444; box-shadow: 0 0 22px rgba(239, 68, 68, 0.45); }
-
-    /* Shake animation */
-    @keyframes shake {
-      0%{transform:translateX(-50%) translateX(0)}
-      15%{transform:translateX(-50%) translateX(-6px)}
-      30%{transform:translateX(-50%) translateX(6px)}
-      45%{transform:translateX(-50%) translateX(-5px)}
-      60%{transform:translateX(-50%) translateX(5px)}
-      75%{transform:translateX(-50%) translateX(-3px)}
-      100%{transform:translateX(-50%) translateX(0)}
-    }
-    .shake { animation: shake 0.5s ease-in-out 1; }
-
-    /* Status messages */
-    .status-msg { text-align: center; font-family: monospace; letter-spacing: 2px; margin-top: 18px; font-size: 13px; }
-    .status-success { color: #22c55e; }
-    .status-error { color: #ef4444; }
-    </style>
-    """, unsafe_allow_html=True)
+    # Load the data while the password is being typed
+    get_app_data()
+
+    def submit_password():
+        # Runs before the rerun, so a correct password renders the dashboard
+        # on that very rerun
+        ok = st.session_state.get("login_pass") == CORRECT_PASSWORD
+        st.session_state.password_correct = ok
+        st.session_state.login_success_anim = ok
+        st.session_state.login_error_anim = not ok
+        st.session_state.login_attempts += 1
 
-    # --- LOGIN CONTENT ---
+    # --- LOGIN SCREEN ---
+    st.markdown(LOGIN_STYLE, unsafe_allow_html=True)
     st.markdown("## POTWELL HINTASEURANTA")
     st.markdown("<p>Restricted Access Area</p>", unsafe_allow_html=True)
 
     # Lock classes based on state
     lock_classes = []
-    if st.session_state.login_success_anim:
-        lock_classes.append("success")
     if st.session_state.login_error_anim:
         lock_classes.append("error")
         lock_classes.append("shake")
     lock_class_str = " ".join(lock_classes)
 
+    # data-attempt changes the markup on every try, so the browser replays
+    # the shake without a reset rerun
     st.markdown(f"""
-        <div class="lock-container {lock_class_str}">
+        <div class="lock-container {lock_class_str}" data-attempt="{st.session_state.login_attempts}">
             <div class="lock-shackle"></div>
             <div class="lock-body"></div>
         </div>
     """, unsafe_allow_html=True)
 
-    # If success animation is active, show it briefly then enter dashboard
-    if st.session_state.login_success_anim:
-        st.markdown('<div class="status-msg status-success">SALASANA OIKEIN</div>', unsafe_allow_html=True)
-        time.sleep(0.8)
-        st.session_state.password_correct = True
-        st.session_state.login_success_anim = False
-        st.rerun()
-
     # Normal login form
     with st.form("login_form", clear_on_submit=False):
-        password = st.text_input(
+        st.text_input(
             "SYÖTÄ SALASANA",
             type="password",
             key="login_pass",
             label_visibility="collapsed",
             placeholder="SYÖTÄ SALASANA"
         )
-        submitted = st.form_submit_button("KIRJAUDU")
-
-    if submitted:
-        if password == CORRECT_PASSWORD:
-            st.session_state.login_error_anim = False
-            st.session_state.login_success_anim = True
-            st.rerun()
-        else:
-            st.session_state.login_success_anim = False
-            st.session_state.login_error_anim = True
-            st.rerun()
+        st.form_submit_button("KIRJAUDU", on_click=submit_password)
 
-    # Wrong password message + reset so shake can re-trigger next time
+    # Wrong password message; cleared for the next rerun
     if st.session_state.login_error_anim:
         st.markdown('<div class="status-msg status-error">VÄÄRÄ SALASANA</div>', unsafe_allow_html=True)
-        time.sleep(0.6)
         st.session_state.login_error_anim = False
-        st.rerun()
 
     return False
 
 
-if not check_password():
-    st.stop()
-
-apply_dashboard_css()
-
 # =========================================================
-#   STORE / CHAIN / GROUP MAPPING
-#   Your convention:
-#     SM = K-Supermarket
-#     KM = K-Market
-#   S-Group recognized only from explicit words (Prisma, S-Market, Sale, Alepa)
+#   PERFORMANCE PANEL (opt-in: POTWELL_PERF=1 or ?perf=1)
 # =========================================================
-def normalize_store_name(x: str) -> str:
-    s = str(x).strip()
-    s = re.sub(r"\s+", " ", s)
-    s = re.sub(r"\(\s*", "(", s)
-    s = re.sub(r"\s*\)", ")", s)
-    return s
-
-# Citymarkets in your data are plain location names (no "Citymarket" text)
-CITYMARKET_OVERRIDES = {
-    "Espoo (Iso Omena)",
-    "Jyväskylä (Seppälä)",
-    "Kuopio (Päiväranta)",
-    "Pirkkala",
-    "Rovaniemi",
-    "Seinäjoki (Päivölä)",
-    "Turku (Kupittaa)",
-    "Vaasa (Kivihaka)",
-}
-
-K_CHAIN_ORDER = ["Citymarket", "K-Supermarket", "K-Market"]
-S_CHAIN_ORDER = ["Prisma", "S-Market", "Sale", "Alepa"]
-
-ALLOWED_CHAINS = {
-    "K-Ryhmä": K_CHAIN_ORDER,
-    "S-Ryhmä": S_CHAIN_ORDER,
-}
-
-def get_chain(store: str) -> str:
-    n = normalize_store_name(store)
-    u = n.upper()
-
-    if n in CITYMARKET_OVERRIDES:
-        return "Citymarket"
-
-    # Your abbreviations (inside parentheses)
-    if re.search(r"\(\s*SM\b", u):
-        return "K-Supermarket"
-    if re.search(r"\(\s*KM\b", u):
-        return "K-Market"
-
-    # If some names contain chain text
-    if "CITYMARKET" in u or re.search(r"\(\s*CM\b", u):
-        return "Citymarket"
-    if "K-SUPERMARKET" in u or re.search(r"\bK[- ]?SUPERMARKET\b", u):
-        return "K-Supermarket"
-    if "K-MARKET" in u or re.search(r"\bK[- ]?MARKET\b", u):
-        return "K-Market"
-
-    # S-Group ONLY when explicitly written (prevents conflict with your SM=K-supermarket rule)
-    if "PRISMA" in u:
-        return "Prisma"
-    if "ALEPA" in u:
-        return "Alepa"
-    if re.search(r"\bSALE\b", u):
-        return "Sale"
-    if "SM Arabia" in u or "SM Leinola" in u or re.search(r"\bS[- ]?MARKET\b", u):
-        return "S-Market"
-
-    return "Muu"
-
-def get_group(chain: str) -> str:
-    if chain in K_CHAIN_ORDER:
-        return "K-Ryhmä"
-    if chain in S_CHAIN_ORDER:
-        return "S-Ryhmä"
-    return "Muu"
-
-def reorder_matrix_columns(matrix: pd.DataFrame, chain_order: list[str]) -> pd.DataFrame:
-    if matrix is None or matrix.empty:
-        return matrix
-    if not isinstance(matrix.columns, pd.MultiIndex) or matrix.columns.nlevels < 2:
-        return matrix
-
-    order_map = {c: i for i, c in enumerate(chain_order)}
-    cols = list(matrix.columns)
-
-    def sort_key(col):
-        ketju = col[0]
-        kauppa = col[1]
-        return (order_map.get(ketju, 999), str(kauppa))
-
-    return matrix.loc[:, sorted(cols, key=sort_key)]
+@st.cache_resource
+def get_perf_recorder() -> PerfRecorder:
+    # One per process; JSON lines on stderr, optional Prometheus text file
+    log = logging.getLogger("potwell.perf")
+    if not log.handlers:
+        log.addHandler(logging.StreamHandler())
+        log.setLevel(logging.INFO)
+    return PerfRecorder(metrics_file=os.environ.get("POTWELL_METRICS_FILE"))
+
 
 # =========================================================
 #   DATA LOADER
 # =========================================================
-@st.cache_data(ttl=60)
-def load_data():
-    scope = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    try:
-        if os.path.exists("service_account.json"):
-            creds = ServiceAccountCredentials.from_json_keyfile_name("service_account.json", scope)
-        else:
-            creds_dict = dict(st.secrets["gcp_service_account"])
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-
-        client = gspread.authorize(creds)
-        sheet = client.open("Potwell Data").sheet1
-        data = sheet.get_all_records()
-        df = pd.DataFrame(data)
-
-        if df.empty:
-            return df
-
-        required_cols = {"pvm", "hinta", "kauppa", "tuote"}
-        missing = required_cols - set(df.columns)
-        if missing:
-            raise ValueError(f"Missing required columns in sheet: {missing}")
-
-        # Normalize EAN column name (EAN/Ean/ean); if not present create empty
-        ean_candidates = [c for c in df.columns if str(c).strip().lower() == "ean"]
-        if ean_candidates:
-            df = df.rename(columns={ean_candidates[0]: "ean"})
-        else:
-            df["ean"] = ""
-
-        df["kauppa"] = df["kauppa"].apply(normalize_store_name)
-
-        df["pvm"] = pd.to_datetime(df["pvm"], errors="coerce")
-        df = df.dropna(subset=["pvm"])
-
-        df["hinta"] = df["hinta"].astype(str).str.replace(",", ".", regex=False)
-        df["hinta"] = pd.to_numeric(df["hinta"], errors="coerce")
-
-        # If prices sometimes stored as cents
-        df.loc[df["hinta"] > 40, "hinta"] = df["hinta"] / 100.0
-
-        df["Ketju"] = df["kauppa"].apply(get_chain)
-        df["Ryhmä"] = df["Ketju"].apply(get_group)
-
-        return df
-
-    except Exception:
+@st.cache_resource
+def get_app_data() -> AppData:
+    # One per process: the one serve.py preloaded at server start, if any.
+    # Its refresher thread polls the sheets for every session
+    data = take_preloaded(lambda: dict(st.secrets["gcp_service_account"]))
+    data.on_new_version = clear_version_caches
+    data.refresher.start()
+    return data
+
+
+def clear_version_caches():
+    # Runs on the refresher thread when a new data version is published:
+    # derived artifacts of the old version can't be hit any more
+    get_graph_stats.clear()
+    get_price_matrix.clear()
+    get_asof_prices.clear()
+    get_basket_products.clear()
+    get_basket_index.clear()
+    get_quality_review.clear()
+    get_largest_changes.clear()
+    get_selection_export.clear()
+    get_matrix_export.clear()
+
+
+FIRST_LOAD_TIMEOUT = 120
+REFRESH_TIMEOUT = 30  # "Päivitä" waits this long for the sheet check
+
+
+def load_data() -> SyncSnapshot:
+    # Last published (frame, version); never touches the network, except
+    # the very first load of a process without a snapshot.
+    refresher = get_app_data().refresher
+    if not refresher.sync.has_data:
+        with st.spinner("Ladataan dataa Google Sheetsistä..."):
+            refresher.wait_for_data(FIRST_LOAD_TIMEOUT)
+    snapshot = refresher.sync.current()
+    if snapshot.frame.empty and refresher.sync.last_error:
         st.error("Data load failed. See details below.")
-        st.code(traceback.format_exc())
-        return pd.DataFrame()
+        st.code(refresher.sync.last_error)
+    return snapshot
+
+
+@st.cache_resource(max_entries=2)
+def get_filter_index(data_version: str, _df: pd.DataFrame) -> FilterIndex:
+    # Built once per data version, shared by every session
+    note_miss()
+    return FilterIndex(_df)
+
+# =========================================================
+#   DERIVED ARTIFACTS (per data version + view, shared by all sessions)
+# =========================================================
+QUALITY_ROWS = 500  # rows shown in the price review table
+
+
+@st.cache_resource(max_entries=16)
+def get_quality_review(data_version: str, reasons: tuple, chain: str, _report: QualityReport) -> pd.DataFrame:
+    note_miss()
+    return _report.review(reasons, None if chain == "Kaikki" else [chain])
+
+
+TOP_CHANGES = 20  # rows in each Muutokset table
+
+
+@st.cache_resource(max_entries=32)
+def get_largest_changes(data_version: str, since, chains: tuple | None, _changes: ChangeIndex):
+    note_miss()
+    return _changes.largest(since, chains, n=TOP_CHANGES)
+
+
+@st.cache_resource
+def get_price_chart_spec(resolution: str) -> dict:
+    # Built (and Altair imported) once per process, not on every rerun
+    return price_chart_spec(resolution)
+
+
+@st.cache_resource(max_entries=8)
+def get_basket_chart_spec(level: str, members: tuple) -> dict:
+    return basket_chart_spec(level, list(members))
+
+
+@st.cache_resource(max_entries=2)
+def get_basket_products(data_version: str, _cube: PriceCube) -> list[str]:
+    # Default basket: products every compared chain has priced
+    note_miss()
+    return common_basket(_cube)
+
+
+@st.cache_resource(max_entries=8)
+def get_basket_index(data_version: str, level: str, basket: tuple, _cube: PriceCube) -> BasketIndex:
+    note_miss()
+    members = CHAIN_MEMBERS if level == "Ketju" else GROUP_MEMBERS
+    return BasketIndex(_cube, level, members, list(basket))
+
+
+@st.cache_resource(max_entries=64)
+def get_graph_stats(data_version: str, start_date, end_date, products: tuple, stores: tuple, _cube: PriceCube):
+    # KPI figures and the chart rows, read from the daily cube (store, chain,
+    # group or all-store level). The chart is kept under MAX_CHART_POINTS.
+    note_miss()
+    if not stores:
+        return None
+    sub = _cube.select(start_date, end_date, products, stores)
+    if sub.empty:
+        return None
+
+    graph = _cube.kpis(sub)
+    graph["melted"], graph["resolution"] = chart_series(_cube, sub)
+    return graph
+
+
+@st.cache_resource(max_entries=2)
+def get_asof_prices(data_version: str, _df: pd.DataFrame) -> AsOfPrices:
+    # Sorted per-series price history for the as-of matrix
+    note_miss()
+    return AsOfPrices(_df)
+
+
+# Label -> max age (days) of a price carried over from an earlier survey.
+# The first is the default: only the compared survey dates, like before
+# the as-of matrix; older prices are shown only when asked for.
+MATRIX_MAX_AGE = {"Sama päivä": 0, "7 päivää": 7, "30 päivää": 30, "90 päivää": 90, "Ei rajaa": None}
 
-df = load_data()
+
+@st.cache_resource(max_entries=32)
+def get_price_matrix(data_version: str, matrix_group: str, date_now, date_prev, max_age,
+                     _asof: AsOfPrices) -> PriceMatrix | None:
+    # STRICT: prevent leakage by filtering by allowed chains
+    note_miss()
+    return _asof.matrix(date_now, date_prev, ALLOWED_CHAINS[matrix_group], max_age)
+
+
+# =========================================================
+#   EXPORTS (built on click, off the script thread; shared by all sessions)
+# =========================================================
+# A multi-year selection is tens of MB, so only a few are kept
+@st.cache_resource(max_entries=4)
+def get_selection_export(data_version: str, start_date, end_date, products: tuple, stores: tuple,
+                         _fidx: FilterIndex, fmt: str) -> bytes:
+    rows = selection_rows(_fidx, start_date, end_date, products, stores)
+    return write_export(selection_chunks(_fidx, rows), fmt)
+
+
+@st.cache_resource(max_entries=16)
+def get_matrix_export(data_version: str, matrix_group: str, date_now, date_prev, max_age, search: str,
+                      chains: tuple, stores: tuple, _matrix: PriceMatrix, fmt: str) -> bytes:
+    rows = _matrix.search(search)
+    cols = _matrix.column_positions(chains, stores)
+    return write_export(matrix_chunks(_matrix, rows, cols), fmt)
+
+
+def export_buttons(label: str, file_stem: str, export, key: str):
+    # One button per format; export(fmt) runs only when a button is clicked,
+    # and the download doesn't rerun the script
+    cols = st.columns([2] + [1] * len(EXPORT_FORMATS))
+    cols[0].caption(label)
+    for col, (fmt, (ext, mime)) in zip(cols[1:], EXPORT_FORMATS.items()):
+        col.download_button(
+            fmt, data=functools.partial(export, fmt), file_name=f"{file_stem}.{ext}", mime=mime,
+            on_click="ignore", key=f"{key}_{fmt}", width="stretch",
+        )
+
+# =========================================================
+#   LOGIN GATE
+# =========================================================
+if not check_password():
+    st.stop()
+
+st.markdown(DASHBOARD_STYLE, unsafe_allow_html=True)
+app_data = get_app_data()
+
+perf_enabled = enabled_by_env() or st.query_params.get("perf") == "1"
+rerun = RerunTimer(get_perf_recorder() if perf_enabled else None)
+
+with rerun.stage("load_data") as stage:
+    snapshot = load_data()
+    stage.rows_out = len(snapshot.frame)
+with rerun.stage("quality", rows_in=len(snapshot.frame)) as stage:
+    quality_store = app_data.quality
+    stage.cache = "hit" if quality_store.version == snapshot.version else "miss"
+    # Cents corrected; the cube etc. below only see the corrected prices
+    snapshot, quality = quality_store.get(snapshot)
+df, data_version = snapshot.frame, snapshot.version
 if df.empty:
     st.stop()
 
+with rerun.stage("filter_index", rows_in=len(df), cached=True):
+    fidx = get_filter_index(data_version, df)
+with rerun.stage("cube", rows_in=len(df)) as stage:
+    cube_store = app_data.cubes
+    stage.cache = "hit" if cube_store.version == data_version else "miss"
+    # Delta syncs fold the new rows into the held cube instead of rebuilding it
+    cube = cube_store.get(data_version, df, snapshot.parent_version, snapshot.delta)
+df = fidx.frame  # sorted by pvm; row positions below refer to this frame
+
+if app_data.sync.last_error:
+    st.warning("Google Sheets ei vastaa – näytetään viimeisin tallennettu data.")
+    with st.expander("Virheen tiedot"):
+        st.code(app_data.sync.last_error)
+
+rejected = app_data.sync.rejected()
+if not rejected.empty:
+    with st.expander(f"⚠️ {len(rejected)} riviä ohitettiin tai jätettiin ilman hintaa"):
+        st.dataframe(rejected, hide_index=True)
+
+if len(quality):
+    n_fixed = len(quality.positions)
+    fixed_note = f"{n_fixed} korjattu senteistä euroiksi" if FIX_CENTS else "ei korjattu"
+    with st.expander(f"🔎 {len(quality)} poikkeavaa hintaa ({fixed_note})"):
+        q1, q2 = st.columns(2)
+        quality_reasons = q1.multiselect("Syy", REASONS, key="quality_reasons")
+        quality_chain = q2.selectbox("Ketju", ["Kaikki"] + fidx.chains("Kaikki"), key="quality_chain")
+        review = get_quality_review(data_version, tuple(quality_reasons), quality_chain, quality)
+        st.dataframe(review.head(QUALITY_ROWS), hide_index=True, width="stretch")
+        st.caption(
+            f"Uusimmat {min(len(review), QUALITY_ROWS)} / {len(review)}. Mediaani = tuotteen mediaanihinta "
+            "muissa kaupoissa samana päivänä (tai viimeisimpänä aiempana päivänä); edellinen = saman "
+            "kaupan edellinen hyväksytty hinta."
+        )
+
 # =========================================================
 #   SIDEBAR
 # =========================================================
 with st.sidebar:
-    if os.path.exists("potwell_logo_rgb_mv.jpg"):
-        st.image("potwell_logo_rgb_mv.jpg")
+    if LOGO is not None:
+        st.image(LOGO)
     st.write("---")
 
-    min_date = df["pvm"].min().date()
-    max_date = df["pvm"].max().date()
+    min_date = fidx.min_date
+    max_date = fidx.max_date
 
     date_value = st.date_input("Jakso", value=(min_date, max_date))
     if isinstance(date_value, (list, tuple)) and len(date_value) == 2:
@@ -484,24 +362,14 @@ with st.sidebar:
     sel_group = st.selectbox("Valitse Ryhmä", ["Kaikki", "K-Ryhmä", "S-Ryhmä"])
 
     # Chains available for selected group (exclude "Muu")
-    if sel_group == "Kaikki":
-        chains_avail = sorted([c for c in df["Ketju"].unique() if c != "Muu"])
-    else:
-        chains_avail = sorted(df[df["Ketju"].isin(ALLOWED_CHAINS[sel_group])]["Ketju"].unique())
+    chains_avail = fidx.chains(sel_group)
 
     sel_chain = st.selectbox("Valitse Ketju", ["Kaikki"] + chains_avail)
 
-    # Sidebar-driven filtering for product/store pickers
-    df_sb = df.copy()
-    if sel_group != "Kaikki":
-        df_sb = df_sb[df_sb["Ketju"].isin(ALLOWED_CHAINS[sel_group])]
-    if sel_chain != "Kaikki":
-        df_sb = df_sb[df_sb["Ketju"] == sel_chain]
-
-    all_p = sorted(df_sb["tuote"].dropna().unique())
+    # Sidebar-driven product/store pickers, precomputed per (group, chain)
+    all_p, all_s = fidx.picker_lists(sel_group, sel_chain)
     selected_products = st.multiselect("Tuotteet graafiin", all_p, default=[all_p[0]] if all_p else [])
 
-    all_s = sorted(df_sb["kauppa"].dropna().unique())
     selected_stores_graph = st.multiselect("Kaupat graafiin", all_s, default=all_s)
 
 # =========================================================
@@ -509,62 +377,40 @@ with st.sidebar:
 # =========================================================
 st.title("Hintaseuranta")
 
-mask = (df["pvm"].dt.date >= start_date) & (df["pvm"].dt.date <= end_date)
-df_filtered = df.loc[mask].copy()
-
 # =========================================================
 #   OSA 1: KPI & GRAAFI
 # =========================================================
-if not df_filtered.empty and selected_products and selected_stores_graph:
-    graph_df = df_filtered[
-        (df_filtered["tuote"].isin(selected_products)) &
-        (df_filtered["kauppa"].isin(selected_stores_graph))
-    ].copy()
-
-    if not graph_df.empty:
-        latest_date = graph_df["pvm"].max()
-        latest_avg = graph_df.loc[graph_df["pvm"] == latest_date, "hinta"].mean()
-
-        dates = sorted(graph_df["pvm"].unique())
-        if len(dates) > 1:
-            prev_date = dates[-2]
-            prev_avg = graph_df.loc[graph_df["pvm"] == prev_date, "hinta"].mean()
-            delta = latest_avg - prev_avg
-        else:
-            delta = 0
+if selected_products and selected_stores_graph:
+    with rerun.stage("graph_stats", cached=True) as stage:
+        graph = get_graph_stats(
+            data_version, start_date, end_date,
+            tuple(selected_products), tuple(selected_stores_graph), cube,
+        )
+        stage.rows_out = len(graph["melted"]) if graph is not None else 0
 
+    if graph is not None:
         k1, k2, k3 = st.columns(3)
-        k1.metric("Keskihinta", f"{latest_avg:.2f} €", f"{delta:.2f} €", delta_color="inverse")
-        k2.metric("Alin hinta", f"{graph_df['hinta'].min():.2f} €")
-        k3.metric("Ylin hinta", f"{graph_df['hinta'].max():.2f} €")
-
-        stats = (
-            graph_df.groupby(["pvm", "tuote"])["hinta"]
-            .agg(Keskiarvo="mean", Minimi="min", Maksimi="max")
-            .reset_index()
+        k1.metric("Keskihinta", f"{graph['latest_avg']:.2f} €", f"{graph['delta']:.2f} €", delta_color="inverse")
+        k2.metric("Alin hinta", f"{graph['min']:.2f} €")
+        k3.metric("Ylin hinta", f"{graph['max']:.2f} €")
+
+        resolution = graph["resolution"]
+        if resolution != "D":
+            st.caption(f"Pitkä jakso: graafissa {RESOLUTION_LABELS[resolution]}tason arvot.")
+
+        # Cached chart spec + serialization of the data
+        with rerun.stage("chart", rows_in=len(graph["melted"])):
+            st.vega_lite_chart(graph["melted"], get_price_chart_spec(resolution), width="stretch")
+
+        export_buttons(
+            "Lataa valitut hinnat (jakso, tuotteet, kaupat)",
+            f"hinnat-{start_date.isoformat()}-{end_date.isoformat()}",
+            functools.partial(
+                get_selection_export, data_version, start_date, end_date,
+                tuple(selected_products), tuple(selected_stores_graph), fidx,
+            ),
+            key="export_selection",
         )
-        melted = stats.melt(["pvm", "tuote"], var_name="Mittari", value_name="Hinta")
-
-        chart = (
-            alt.Chart(melted)
-            .mark_line(strokeWidth=3)
-            .encode(
-                x=alt.X("pvm:T", axis=alt.Axis(format="%d.%m.", title=None)),
-                y=alt.Y("Hinta:Q", title="Hinta (€)", scale=alt.Scale(zero=False)),
-                color="tuote:N",
-                strokeDash="Mittari:N",
-            )
-            + alt.Chart(melted)
-            .mark_circle(size=80)
-            .encode(
-                x="pvm:T",
-                y="Hinta:Q",
-                color="tuote:N",
-                shape="Mittari:N",
-            )
-        ).properties(height=400).interactive()
-
-        st.altair_chart(chart, use_container_width=True)
 
 st.write("---")
 
@@ -580,74 +426,186 @@ matrix_group = st.radio(
     key="matrix_radio",
 )
 
-# STRICT: prevent leakage by filtering by allowed chains
-m_df_raw = df[df["Ketju"].isin(ALLOWED_CHAINS[matrix_group])].copy()
+with rerun.stage("asof_prices", rows_in=len(df), cached=True):
+    asof = get_asof_prices(data_version, snapshot.frame)
+
+# Any two survey dates of the group; the latest two by default
+matrix_dates = asof.survey_dates(ALLOWED_CHAINS[matrix_group])
+matrix = None
+if matrix_dates:
+    m1, m2 = st.columns([3, 1])
+    if len(matrix_dates) > 1:
+        date_prev, date_now = m1.select_slider(
+            "Vertailtavat päivät",
+            options=matrix_dates,
+            value=(matrix_dates[-2], matrix_dates[-1]),
+            format_func=lambda d: d.strftime("%d.%m.%Y"),
+            key=f"matrix_days_{matrix_group}",
+        )
+    else:
+        date_prev, date_now = None, matrix_dates[-1]
+    max_age_label = m2.selectbox("Hinnan enimmäisikä", list(MATRIX_MAX_AGE), key="matrix_max_age")
 
-if not m_df_raw.empty:
-    m_dates = sorted(m_df_raw["pvm"].unique(), reverse=True)
-    m_latest_date = m_dates[0]
+    with rerun.stage("matrix", cached=True) as stage:
+        matrix = get_price_matrix(
+            data_version, matrix_group, date_now, date_prev, MATRIX_MAX_AGE[max_age_label], asof,
+        )
+        stage.rows_out = len(matrix.rows) if matrix is not None else 0
+
+    if matrix is not None and matrix.stale is not None and matrix.stale.any():
+        st.caption("Harmaalla pohjalla: kauppaa ei kysytty valittuna päivänä, viimeisin tunnettu hinta.")
+
+if matrix is not None and not matrix.empty:
+    # Only the visible page is formatted, styled and sent to the browser
+    f1, f2, f3 = st.columns([2, 2, 3])
+    matrix_search = f1.text_input("Hae tuote tai EAN", key="matrix_search")
+    matrix_chains = f2.multiselect(
+        "Ketjut", list(dict.fromkeys(matrix.columns.get_level_values("Ketju"))),
+        key=f"matrix_chains_{matrix_group}",
+    )
+    store_cols = matrix.column_positions(matrix_chains)
+    matrix_stores = f3.multiselect(
+        "Kaupat", list(matrix.columns.get_level_values("kauppa")[store_cols]),
+        key=f"matrix_stores_{matrix_group}",
+    )
 
-    latest_m = (
-        m_df_raw[m_df_raw["pvm"] == m_latest_date]
-        .copy()
-        .rename(columns={"hinta": "price_now"})
+    with rerun.stage("matrix_view") as stage:
+        view_rows = matrix.search(matrix_search)
+        view_cols = matrix.column_positions(matrix_chains, matrix_stores)
+        stage.rows_out = len(view_rows)
+
+    row_pages = page_count(len(view_rows), MATRIX_PAGE_ROWS)
+    col_pages = page_count(len(view_cols), MATRIX_PAGE_COLS)
+    p1, p2, p3 = st.columns([1, 1, 3])
+    # Keyed by the page count, so a narrower search starts from page 1
+    row_page = p1.number_input(
+        f"Sivu (1–{row_pages})", min_value=1, max_value=row_pages, value=1,
+        key=f"matrix_page_{row_pages}",
+    ) if row_pages > 1 else 1
+    col_page = p2.number_input(
+        f"Kauppasivu (1–{col_pages})", min_value=1, max_value=col_pages, value=1,
+        key=f"matrix_col_page_{col_pages}",
+    ) if col_pages > 1 else 1
+    page_rows = page_slice(view_rows, row_page, MATRIX_PAGE_ROWS)
+    page_cols = page_slice(view_cols, col_page, MATRIX_PAGE_COLS)
+    p3.caption(
+        f"{len(view_rows)} tuotetta, {len(view_cols)} kauppaa – "
+        f"näytetään {len(page_rows)} × {len(page_cols)}."
     )
 
-    if len(m_dates) > 1:
-        prev_m = (
-            m_df_raw[m_df_raw["pvm"] == m_dates[1]][["kauppa", "tuote", "ean", "hinta"]]
-            .rename(columns={"hinta": "price_prev"})
-        )
-        merged_m = pd.merge(latest_m, prev_m, on=["kauppa", "tuote", "ean"], how="left")
+    if len(page_rows) and len(page_cols):
+        with rerun.stage("styler", rows_in=len(page_rows) * len(page_cols)):
+            st.dataframe(
+                matrix.styled(page_rows, page_cols),
+                width="stretch",
+                height=800
+            )
     else:
-        merged_m = latest_m
-        merged_m["price_prev"] = np.nan
-
-    def format_m(row):
-        p = row["price_now"]
-        pr = row["price_prev"]
-        if pd.isna(p):
-            return None
-        if pd.isna(pr):
-            arr = ""
-        else:
-            arr = " ▲" if p > pr else " ▼" if p < pr else " ➖"
-        return f"{p:.2f} €{arr}"
-
-    merged_m["cell"] = merged_m.apply(format_m, axis=1)
-
-    # Pivot: tuote + ean on rows, columns are (Ketju, kauppa)
-    matrix = merged_m.pivot_table(
-        index=["tuote", "ean"],
-        columns=["Ketju", "kauppa"],
-        values="cell",
-        aggfunc="first",
+        st.info("Ei osumia.")
+
+    export_buttons(
+        "Lataa matriisi (haku ja rajaukset mukana, suunta omana sarakkeenaan)",
+        f"hintamatriisi-{slug(matrix_group)}-{date_now.isoformat()}",
+        functools.partial(
+            get_matrix_export, data_version, matrix_group, date_now, date_prev, MATRIX_MAX_AGE[max_age_label],
+            matrix_search, tuple(matrix_chains), tuple(matrix_stores), matrix,
+        ),
+        key="export_matrix",
     )
 
-    # Clean up
-    matrix = matrix.dropna(how="all")
-    matrix = matrix.dropna(axis=1, how="all")
+st.write("---")
 
-    # Order chains in columns (K: Citymarket -> K-Supermarket -> K-Market)
-    matrix = reorder_matrix_columns(matrix, chain_order=ALLOWED_CHAINS[matrix_group])
+# =========================================================
+#   OSA 3: MUUTOKSET (change points since a chosen date)
+# =========================================================
+st.subheader("📈 Muutokset")
+
+with rerun.stage("changes", rows_in=len(df)) as stage:
+    change_store = app_data.changes
+    stage.cache = "hit" if change_store.version == data_version else "miss"
+    changes = change_store.get(data_version, snapshot.frame, snapshot.parent_version, snapshot.delta)
+
+# Default: the survey before the latest one
+survey_dates = fidx.latest_dates(n=2)
+c1, c2, c3 = st.columns(3)
+changes_since = c1.date_input(
+    "Muutokset alkaen", value=survey_dates[-1].date(),
+    min_value=min_date, max_value=max_date, key="changes_since",
+)
+changes_group = c2.selectbox("Ryhmä", ["Kaikki", "K-Ryhmä", "S-Ryhmä"], key="changes_group")
+changes_chain = c3.selectbox("Ketju", ["Kaikki"] + fidx.chains(changes_group), key="changes_chain")
+if changes_chain != "Kaikki":
+    changes_chains = [changes_chain]
+elif changes_group != "Kaikki":
+    changes_chains = ALLOWED_CHAINS[changes_group]
+else:
+    changes_chains = None
+
+with rerun.stage("changes_query", rows_in=len(changes)) as stage:
+    ups, downs = get_largest_changes(
+        data_version, changes_since, tuple(changes_chains) if changes_chains else None, changes,
+    )
+    stage.rows_out = len(ups) + len(downs)
 
-    # Show EAN as normal column right after tuote
-    matrix = matrix.reset_index()
+if ups.empty and downs.empty:
+    st.info("Ei hintamuutoksia valitulla jaksolla.")
+else:
+    u, d = st.columns(2)
+    u.markdown("**Suurimmat nousut**")
+    u.dataframe(ups, hide_index=True, width="stretch")
+    d.markdown("**Suurimmat laskut**")
+    d.dataframe(downs, hide_index=True, width="stretch")
 
-    price_cols = [c for c in matrix.columns if c not in ["tuote", "ean"]]
+st.write("---")
 
-    st.dataframe(
-        matrix.style.map(
-            lambda v: "color: #16a34a; font-weight: 700;" if "▲" in str(v)
-            else "color: #dc2626; font-weight: 700;" if "▼" in str(v)
-            else "",
-            subset=price_cols
-        ),
-        use_container_width=True,
-        height=800
-    )
+# =========================================================
+#   OSA 4: KORIINDEKSI (chained basket index per chain / group)
+# =========================================================
+st.subheader("🧺 Koriindeksi")
+
+b1, b2 = st.columns([1, 3])
+basket_level = "Ketju" if b1.radio("Taso", ["Ketjut", "Ryhmät"], horizontal=True, key="basket_level") == "Ketjut" else "Ryhmä"
+basket = b2.multiselect(
+    "Kori", fidx.picker_lists("Kaikki", "Kaikki")[0],
+    default=get_basket_products(data_version, cube), key="basket_products",
+)
+
+if basket:
+    with rerun.stage("basket_index", cached=True) as stage:
+        basket_index = get_basket_index(data_version, basket_level, tuple(sorted(basket)), cube)
+        basket_series = basket_index.series(start_date, end_date)
+        stage.rows_out = len(basket_series)
+
+    if basket_series.empty:
+        st.info("Korin tuotteille ei ole hintoja valitulla jaksolla.")
+    else:
+        st.vega_lite_chart(
+            basket_series, get_basket_chart_spec(basket_level, tuple(basket_index.members)),
+            width="stretch",
+        )
+        st.caption(
+            f"Ketjutettu indeksi, 100 = jakson ensimmäinen hintapäivä. Korissa {len(basket)} tuotetta "
+            "(1 kpl kutakin); puuttuva hinta = edellinen havainto. Korin hinta vain, kun kaikille "
+            "tuotteille on hinta."
+        )
+        latest = basket_series.groupby(basket_level, sort=False).tail(1)
+        st.dataframe(latest.round({"Indeksi": 1, "Korin hinta": 2}), hide_index=True, width="stretch")
+else:
+    st.info("Valitse koriin vähintään yksi tuote.")
+
+rerun.finish()
+if rerun.enabled:
+    with st.sidebar.expander("⏱️ Suorituskyky"):
+        st.caption(f"Ajoja tässä prosessissa: {rerun.recorder.reruns}. p50/p95 viimeisimmistä ajoista.")
+        st.dataframe(pd.DataFrame(rerun.recorder.table()).convert_dtypes(), hide_index=True)
 
 if st.button("🔄 Päivitä"):
-    st.rerun()
+    # Rerun only once the check (and a new version's cache reset) is done,
+    # otherwise the rerun would show the same data
+    with st.spinner("Tarkistetaan uudet rivit..."):
+        refreshed = get_app_data().refresher.refresh_now(REFRESH_TIMEOUT)
+    if refreshed:
+        st.rerun()
+    st.info("Päivitys jatkuu taustalla; uudet rivit näkyvät, kun se valmistuu.")
 
 
@@ -0,0 +1,64 @@
+import hashlib
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# =========================================================
+#   COMPACT IN-MEMORY LAYOUT
+#   Dimension columns as categoricals (one string per distinct value),
+#   prices as float32 and dates as datetime64. The frame is shared by every
+#   rerun, so treat it as read-only and filter with masks / row positions.
+# =========================================================
+DIMENSION_COLUMNS = ["kauppa", "tuote", "ean", "Ketju", "Ryhmä"]
+PRICE_DECIMALS = 4
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty:
+        return df
+
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if col in DIMENSION_COLUMNS and not isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype("category")
+        elif col == "hinta" and s.dtype != "float32":
+            s = s.astype("float32")
+        elif col == "pvm" and not pd.api.types.is_datetime64_any_dtype(s):
+            s = pd.to_datetime(s, errors="coerce")
+        out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def price64(s: pd.Series) -> pd.Series:
+    # float32 storage -> float64 for arithmetic. Prices have at most a few
+    # decimals, so rounding drops the float32 representation error and
+    # means/sums match what the float64 sheet values would give. Exact for
+    # prices under ~800 € (float32 keeps 24 bits, 10^PRICE_DECIMALS steps).
+    return s.astype("float64").round(PRICE_DECIMALS)
+
+
+def concat_frames(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    # pd.concat turns categoricals with different categories into object
+    # columns, so union the categories and keep the compact layout.
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+
+    out = pd.concat(frames, ignore_index=True)
+    for col in DIMENSION_COLUMNS:
+        parts = [f[col] for f in frames if col in f.columns]
+        if len(parts) == len(frames) and all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            out[col] = union_categoricals(parts, sort_categories=True)
+    return out
+
+
+def frame_digest(df: pd.DataFrame, seed: str = "") -> str:
+    # Content hash of a frame; chained through `seed` for appended slices
+    h = hashlib.sha1(seed.encode("utf-8"))
+    h.update(",".join(map(str, df.columns)).encode("utf-8"))
+    if not df.empty:
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
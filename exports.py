@@ -0,0 +1,133 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset import price64
+from filter_index import FilterIndex
+from matrix import PriceMatrix
+
+# =========================================================
+#   EXPORTS (CSV, Parquet, XLSX)
+#   Files are written EXPORT_CHUNK_ROWS rows at a time: each chunk is cut
+#   from the shared frame / matrix grids, encoded and dropped, so next to
+#   the file being built there is only one chunk in memory, however long
+#   the selected period is. Every writer builds the file in one BytesIO and
+#   hands its buffer over with _take(), so the finished file exists once.
+# =========================================================
+EXPORT_CHUNK_ROWS = 50_000
+
+# format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+SELECTION_COLUMNS = ["pvm", "Ryhmä", "Ketju", "kauppa", "tuote", "ean", "hinta"]
+# Matrix direction codes (matrix.NO_PREV, UP, DOWN, SAME) as text
+DIRECTIONS = np.array(["", "▲", "▼", "➖"], dtype=object)
+XLSX_MAX_ROWS = 1_048_575  # data rows per sheet, under the header
+
+
+# ---------- chunks ----------
+def selection_rows(fidx: FilterIndex, start_date, end_date, products, stores) -> np.ndarray:
+    # Same rows as the KPI/graph selection of the sidebar
+    rows = fidx.rows("tuote", products, within=fidx.date_slice(start_date, end_date))
+    return fidx.restrict(rows, "kauppa", stores)
+
+
+def selection_chunks(fidx: FilterIndex, rows: np.ndarray, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # Always at least one (maybe empty) chunk, so the file gets its header
+    for i in range(0, max(len(rows), 1), chunk_rows):
+        part = fidx.take(rows[i:i + chunk_rows])[SELECTION_COLUMNS]
+        yield part.assign(hinta=price64(part["hinta"])).reset_index(drop=True)
+
+
+def matrix_chunks(matrix: PriceMatrix, rows: np.ndarray | None = None, cols: np.ndarray | None = None,
+                  chunk_rows: int = EXPORT_CHUNK_ROWS):
+    # tuote, ean, then per store its price and direction ("Ketju / kauppa",
+    # "Ketju / kauppa suunta"); numbers instead of the viewer's "1.99 € ▲"
+    rows = np.arange(len(matrix.rows)) if rows is None else np.asarray(rows)
+    cols = np.arange(len(matrix.columns)) if cols is None else np.asarray(cols)
+    names = [f"{chain} / {store}" for chain, store in matrix.columns[cols]]
+    for i in range(0, max(len(rows), 1), chunk_rows):
+        part = rows[i:i + chunk_rows]
+        keys = matrix.rows[part]
+        prices = matrix.prices[np.ix_(part, cols)]
+        directions = np.where(np.isnan(prices), "", DIRECTIONS[matrix.codes[np.ix_(part, cols)]])
+        data = {"tuote": keys.get_level_values(0).astype(str), "ean": keys.get_level_values(1).astype(str)}
+        for j, name in enumerate(names):
+            data[name] = prices[:, j]
+            data[f"{name} suunta"] = directions[:, j]
+        yield pd.DataFrame(data)
+
+
+# ---------- writers ----------
+def _take(buf: io.BytesIO) -> bytes:
+    # With no views of the buffer open, CPython's getvalue() returns the
+    # BytesIO's own bytes object (trimmed in place) instead of a copy. The
+    # BytesIO is dropped right after. Streamlit's download takes bytes, not
+    # a memoryview, so getbuffer() is no option.
+    out = buf.getvalue()
+    buf.close()
+    return out
+
+
+def write_csv(chunks) -> bytes:
+    buf = io.BytesIO()
+    buf.write("\ufeff".encode())  # BOM: Excel opens it as UTF-8, like cli.py's files
+    for i, part in enumerate(chunks):
+        buf.write(part.to_csv(index=False, header=i == 0).encode())
+    return _take(buf)
+
+
+def write_parquet(chunks) -> bytes:
+    # One row group per chunk, written straight into the BytesIO (an Arrow
+    # buffer would be copied again by to_pybytes())
+    buf = io.BytesIO()
+    writer = None
+    for part in chunks:
+        table = pa.Table.from_pandas(part, preserve_index=False, schema=writer.schema if writer else None)
+        if writer is None:
+            writer = pq.ParquetWriter(buf, table.schema)
+        writer.write_table(table)
+    writer.close()
+    return _take(buf)
+
+
+def write_xlsx(chunks) -> bytes:
+    # constant_memory: rows go to disk as they are written. Sheets hold
+    # XLSX_MAX_ROWS rows each; longer exports continue on the next sheet.
+    import xlsxwriter
+
+    buf = io.BytesIO()
+    book = xlsxwriter.Workbook(buf, {"constant_memory": True, "default_date_format": "yyyy-mm-dd"})
+    header = []
+
+    def new_sheet():
+        sheet = book.add_worksheet()
+        sheet.write_row(0, 0, header)
+        sheet.freeze_panes(1, 0)
+        return sheet
+
+    sheet, row = None, XLSX_MAX_ROWS + 1
+    for part in chunks:
+        header = list(part.columns)
+        for record in part.astype(object).where(part.notna(), None).to_numpy():
+            if row > XLSX_MAX_ROWS:
+                sheet, row = new_sheet(), 1
+            sheet.write_row(row, 0, record)
+            row += 1
+    if sheet is None:
+        new_sheet()
+    book.close()
+    return _take(buf)
+
+
+WRITERS = {"CSV": write_csv, "Parquet": write_parquet, "XLSX": write_xlsx}
+
+
+def write_export(chunks, fmt: str) -> bytes:
+    return WRITERS[fmt](chunks)
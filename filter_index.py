@@ -0,0 +1,137 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from stores import ALLOWED_CHAINS
+
+# =========================================================
+#   FILTER INDEX
+#   Built once per data version and shared by all sessions:
+#     - frame sorted by pvm -> date ranges are a binary search
+#     - posting lists (sorted row positions) per chain, group, product
+#       and store -> a selection costs the size of its result
+#     - sidebar picker lists for every (group, chain) combination
+# =========================================================
+INDEXED_COLUMNS = ["Ketju", "Ryhmä", "tuote", "kauppa"]
+
+EMPTY_ROWS = np.empty(0, dtype=np.int64)
+
+
+def _postings(s: pd.Series) -> dict:
+    # value -> ascending row positions, from the categorical codes
+    cat = s.astype("category")
+    codes = cat.cat.codes.to_numpy()
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes[codes >= 0], minlength=len(cat.cat.categories))
+    bounds = np.concatenate([[0], np.cumsum(counts)]) + int((codes < 0).sum())
+    return {
+        value: order[bounds[i]:bounds[i + 1]]
+        for i, value in enumerate(cat.cat.categories)
+        if counts[i]
+    }
+
+
+class FilterIndex:
+    def __init__(self, df: pd.DataFrame):
+        self.frame = df.sort_values("pvm", kind="stable").reset_index(drop=True)
+        self.dates = self.frame["pvm"].to_numpy()
+        self.postings = {col: _postings(self.frame[col]) for col in INDEXED_COLUMNS}
+        self.options = self._build_options()
+
+    def __len__(self):
+        return len(self.frame)
+
+    # ---------- dates ----------
+    @property
+    def min_date(self) -> datetime.date:
+        return pd.Timestamp(self.dates[0]).date()
+
+    @property
+    def max_date(self) -> datetime.date:
+        return pd.Timestamp(self.dates[-1]).date()
+
+    def date_slice(self, start_date: datetime.date, end_date: datetime.date) -> slice:
+        # Whole days, same as comparing pvm.dt.date against the bounds
+        lo = np.datetime64(pd.Timestamp(start_date))
+        hi = np.datetime64(pd.Timestamp(end_date) + pd.Timedelta(days=1))
+        return slice(
+            int(np.searchsorted(self.dates, lo, side="left")),
+            int(np.searchsorted(self.dates, hi, side="left")),
+        )
+
+    def latest_dates(self, rows: np.ndarray | None = None, n: int = 2) -> list[pd.Timestamp]:
+        # Last `n` distinct pvm values among `rows` (ascending positions), or
+        # among all rows without copying the dates
+        dates = self.dates if rows is None else self.dates[rows]
+        out = []
+        end = len(dates)
+        while end > 0 and len(out) < n:
+            d = dates[end - 1]
+            out.append(pd.Timestamp(d))
+            end = int(np.searchsorted(dates[:end], d, side="left"))
+        return out
+
+    # ---------- selections ----------
+    def rows(self, column: str, values, within: slice | None = None) -> np.ndarray:
+        """Ascending row positions where `column` is in `values` (and in `within`)."""
+        postings = self.postings[column]
+        parts = []
+        for v in values:
+            p = postings.get(v)
+            if p is None:
+                continue
+            if within is not None:
+                p = p[np.searchsorted(p, within.start):np.searchsorted(p, within.stop)]
+            parts.append(p)
+        if not parts:
+            return EMPTY_ROWS
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    def restrict(self, rows: np.ndarray, column: str, values) -> np.ndarray:
+        # Keep the rows whose `column` is in `values`; cost ~ len(rows)
+        col = self.frame[column]
+        wanted = col.cat.categories.get_indexer(list(values))
+        wanted = wanted[wanted >= 0]
+        codes = col.cat.codes.to_numpy()[rows]
+        return rows[np.isin(codes, wanted)]
+
+    def take(self, rows) -> pd.DataFrame:
+        return self.frame.iloc[rows]
+
+    # ---------- sidebar pickers ----------
+    def _build_options(self) -> dict:
+        pairs = {
+            col: self.frame.groupby(["Ketju", col], observed=True).size().index
+            for col in ("tuote", "kauppa")
+        }
+        chains_present = set(self.postings["Ketju"])
+
+        def lists(chains):
+            return tuple(
+                sorted({v for k, v in pairs[col] if k in chains})
+                for col in ("tuote", "kauppa")
+            )
+
+        options = {}
+        groups = {"Kaikki": sorted(c for c in chains_present if c != "Muu")}
+        for group, allowed in ALLOWED_CHAINS.items():
+            groups[group] = sorted(c for c in chains_present if c in allowed)
+
+        for group, chains in groups.items():
+            # Picker filtering uses the group's allowed chains; "Kaikki" = no filter
+            scope = chains_present if group == "Kaikki" else set(ALLOWED_CHAINS[group])
+            options[(group, "Kaikki")] = lists(scope)
+            for chain in chains:
+                options[(group, chain)] = lists({chain})
+        options["chains"] = groups
+        return options
+
+    def chains(self, group: str) -> list[str]:
+        return self.options["chains"][group]
+
+    def picker_lists(self, group: str, chain: str) -> tuple[list, list]:
+        # (products, stores) for the sidebar multiselects
+        return self.options.get((group, chain), ([], []))
@@ -0,0 +1,93 @@
+import os
+import tomllib
+import traceback
+
+from dataset import compact_frame, concat_frames
+from parsing import parse_sheet
+from partitions import PartitionedSync
+from snapshot import load_partitions, save_partitions
+
+# =========================================================
+#   DATA LOADER (shared by dashboard.py and cli.py)
+#   Nothing here imports Streamlit. gspread and oauth2client are imported
+#   only when the sheets are actually opened, so a process that just reads
+#   the published dataset starts fast.
+# =========================================================
+# Archive spreadsheets (closed years), comma separated
+ARCHIVE_SPREADSHEETS = [
+    name.strip() for name in os.environ.get("POTWELL_ARCHIVE_SPREADSHEETS", "").split(",") if name.strip()
+]
+SNAPSHOT_DIR = os.path.join(".cache", "partitions")
+# Published data versions, shared by every process on the machine
+SHARED_DIR = os.environ.get("POTWELL_SHARED_DIR") or os.path.join(".cache", "shared")
+# Seconds before a changed sheet is read in full instead of as a delta
+# (catches edits above the rows already synced)
+FULL_RELOAD_INTERVAL = float(os.environ.get("POTWELL_FULL_RELOAD_INTERVAL", "900"))
+# Cents prices ("149") are corrected unless POTWELL_FIX_CENTS=0
+FIX_CENTS = os.environ.get("POTWELL_FIX_CENTS", "1") != "0"
+# Same places Streamlit reads st.secrets from
+SECRETS_FILES = [os.path.join(".streamlit", "secrets.toml"), os.path.expanduser("~/.streamlit/secrets.toml")]
+
+
+def secrets_file_account() -> dict:
+    # [gcp_service_account] of the Streamlit secrets file, without Streamlit
+    for path in SECRETS_FILES:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                secrets = tomllib.load(f)
+            if "gcp_service_account" in secrets:
+                return dict(secrets["gcp_service_account"])
+    raise FileNotFoundError("No service_account.json nor [gcp_service_account] in .streamlit/secrets.toml")
+
+
+def open_spreadsheets(account=secrets_file_account):
+    # Main spreadsheet first, then archives. `account()` gives the service
+    # account info when there is no service_account.json
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    scope = [
+        "https://www.googleapis.com/auth/spreadsheets",
+        "https://www.googleapis.com/auth/drive",
+    ]
+    if os.path.exists("service_account.json"):
+        creds = ServiceAccountCredentials.from_json_keyfile_name("service_account.json", scope)
+    else:
+        creds = ServiceAccountCredentials.from_json_keyfile_dict(account(), scope)
+
+    client = gspread.authorize(creds)
+    return [client.open("Potwell Data")] + [client.open(name) for name in ARCHIVE_SPREADSHEETS]
+
+
+def save_sync_snapshot(sync: PartitionedSync):
+    if sync.last_mode in ("unchanged", "restored"):
+        return
+    try:
+        save_partitions(SNAPSHOT_DIR, sync.frames(), sync.state())
+    except Exception:
+        # A missing snapshot only costs a slower next start
+        traceback.print_exc()
+
+
+def sheet_modified_time(worksheet) -> str:
+    # One Drive metadata call; much cheaper than reading the values
+    return worksheet.spreadsheet.get_lastUpdateTime()
+
+
+def make_partitioned_sync(account=secrets_file_account) -> PartitionedSync:
+    # Only in the leader process: remembers the high-water marks between
+    # polls; closed years are read once
+    sync = PartitionedSync(
+        lambda: open_spreadsheets(account), parse=parse_sheet, concat=concat_frames, probe=sheet_modified_time,
+        full_reload_interval=FULL_RELOAD_INTERVAL,
+    )
+    try:
+        snap = load_partitions(SNAPSHOT_DIR)
+    except Exception:
+        traceback.print_exc()
+        snap = None
+    if snap is not None:
+        # Warm start: serve the last snapshot, reconcile with the sheets later
+        frames, state = snap
+        sync.restore({key: compact_frame(df) for key, df in frames.items()}, state)
+    return sync
@@ -0,0 +1,276 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from price_changes import observations, series_starts
+
+# =========================================================
+#   HINTAMATRIISI
+#   Rows (tuote, ean), columns (Ketju, kauppa), cells "1.99 € ▲".
+#   The matrix is kept as numeric grids (price, direction code, stale
+#   flag); cell strings and styles are made only for the slice being
+#   shown, so a page costs the same however many products and stores
+#   there are.
+# =========================================================
+MATRIX_KEYS = ["kauppa", "tuote", "ean"]
+
+NO_PREV, UP, DOWN, SAME = 0, 1, 2, 3
+
+ARROWS = np.array(["", " ▲", " ▼", " ➖"], dtype=object)
+CELL_STYLES = np.array(
+    ["", "color: #16a34a; font-weight: 700;", "color: #dc2626; font-weight: 700;", ""],
+    dtype=object,
+)
+# Price carried over from an earlier survey than the selected date
+STALE_STYLE = "background-color: #f3f4f6;"
+
+MATRIX_PAGE_ROWS = 50   # products per matrix page
+MATRIX_PAGE_COLS = 40   # stores per matrix page
+
+
+def direction_codes(price_now: np.ndarray, price_prev: np.ndarray) -> np.ndarray:
+    codes = np.full(len(price_now), NO_PREV, dtype=np.int8)
+    has_prev = ~np.isnan(price_prev)
+    codes[has_prev & (price_now > price_prev)] = UP
+    codes[has_prev & (price_now < price_prev)] = DOWN
+    codes[has_prev & (price_now == price_prev)] = SAME
+    return codes
+
+
+def format_cells(price_now: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    # Distinct prices are few, so format each one once and broadcast
+    uniq, inverse = np.unique(price_now, return_inverse=True)
+    labels = np.array([f"{p:.2f} €" for p in uniq], dtype=object)
+    return labels[inverse] + ARROWS[codes]
+
+
+def page_count(n: int, size: int) -> int:
+    # At least one (maybe empty) page
+    return max(1, -(-n // size))
+
+
+def page_slice(positions: np.ndarray, page: int, size: int) -> np.ndarray:
+    # Positions shown on 1-based `page`; the last page may be partial
+    return positions[(page - 1) * size:page * size]
+
+
+class PriceMatrix:
+    """Price, direction code and stale flag of every (row, column) cell."""
+
+    def __init__(self, rows: pd.MultiIndex, columns: pd.MultiIndex, prices: np.ndarray,
+                 codes: np.ndarray, stale: np.ndarray | None = None):
+        self.rows = rows          # (tuote, ean)
+        self.columns = columns    # (Ketju, kauppa)
+        self.prices = prices      # NaN = no cell
+        self.codes = codes
+        self.stale = stale
+        # Lower-case "tuote ean" per row for the search box
+        self._search_text = pd.Series(
+            [f"{t} {e}".lower() for t, e in rows], dtype=object
+        )
+
+    @property
+    def empty(self) -> bool:
+        return not len(self.rows) or not len(self.columns)
+
+    @property
+    def table(self) -> pd.DataFrame:
+        # Whole matrix as display strings; the viewer uses frame() on a slice
+        return self.frame()
+
+    def search(self, text: str = "") -> np.ndarray:
+        """Row positions whose product name or EAN contains `text`."""
+        text = text.strip().lower()
+        if not text:
+            return np.arange(len(self.rows))
+        return np.flatnonzero(self._search_text.str.contains(text, regex=False).to_numpy())
+
+    def column_positions(self, chains=None, stores=None) -> np.ndarray:
+        """Column positions limited to `chains` and/or `stores` (None = all)."""
+        keep = np.ones(len(self.columns), dtype=bool)
+        if chains:
+            keep &= self.columns.get_level_values("Ketju").isin(list(chains))
+        if stores:
+            keep &= self.columns.get_level_values("kauppa").isin(list(stores))
+        return np.flatnonzero(keep)
+
+    def frame(self, rows: np.ndarray | None = None, cols: np.ndarray | None = None) -> pd.DataFrame:
+        """Display table of a slice: tuote, ean, then one column per store."""
+        rows = np.arange(len(self.rows)) if rows is None else np.asarray(rows)
+        cols = np.arange(len(self.columns)) if cols is None else np.asarray(cols)
+        prices = self.prices[np.ix_(rows, cols)]
+        cells = np.full(prices.shape, np.nan, dtype=object)
+        has = ~np.isnan(prices)
+        cells[has] = format_cells(prices[has], self.codes[np.ix_(rows, cols)][has])
+        table = pd.DataFrame(cells, index=self.rows[rows], columns=self.columns[cols])
+        # Show EAN as normal column right after tuote
+        return table.reset_index()
+
+    def styled(self, rows: np.ndarray | None = None, cols: np.ndarray | None = None):
+        table = self.frame(rows, cols)
+        if self.empty or table.empty:
+            return table.style
+        rows = np.arange(len(self.rows)) if rows is None else np.asarray(rows)
+        cols = np.arange(len(self.columns)) if cols is None else np.asarray(cols)
+        styles = CELL_STYLES[self.codes[np.ix_(rows, cols)]]
+        if self.stale is not None:
+            stale = self.stale[np.ix_(rows, cols)]
+            if stale.any():
+                styles = np.where(stale, styles + STALE_STYLE, styles)
+        price_cols = list(table.columns[2:])
+        return table.style.apply(lambda _: styles, axis=None, subset=price_cols)
+
+
+def _sorted_codes(values) -> tuple[np.ndarray, np.ndarray]:
+    return pd.factorize(np.asarray(values, dtype=object), sort=True)
+
+
+def build_price_matrix(
+    latest: pd.DataFrame,
+    prev: pd.DataFrame | None,
+    chain_order: list[str],
+    stale: np.ndarray | None = None,
+) -> PriceMatrix:
+    """`latest` has `price_now`, `prev` (optional) has `price_prev` per MATRIX_KEYS.
+
+    `latest` may carry `price_prev` itself (with `prev` None); `stale`
+    flags rows of `latest` whose price is from before the selected date.
+    """
+    if prev is not None:
+        merged = pd.merge(latest, prev, on=MATRIX_KEYS, how="left")
+    elif "price_prev" not in latest.columns:
+        merged = latest.assign(price_prev=np.nan)
+    else:
+        merged = latest
+
+    now = merged["price_now"].to_numpy(dtype="float64", na_value=np.nan)
+    before = merged["price_prev"].to_numpy(dtype="float64", na_value=np.nan)
+
+    # Rows without a current price produce no cell at all
+    valid = ~np.isnan(now)
+    merged = merged.loc[valid]
+    now, before = now[valid], before[valid]
+    if stale is not None:
+        stale = np.asarray(stale, dtype=bool)[valid]
+
+    codes = direction_codes(now, before)
+
+    if not len(merged):
+        empty = pd.MultiIndex.from_arrays([[], []])
+        return PriceMatrix(empty.set_names(["tuote", "ean"]), empty.set_names(["Ketju", "kauppa"]),
+                           np.empty((0, 0)), np.empty((0, 0), dtype=np.int8))
+
+    # Row labels sorted by (tuote, ean), like pivot_table
+    t_codes, t_uniq = _sorted_codes(merged["tuote"])
+    e_codes, e_uniq = _sorted_codes(merged["ean"])
+    n_e = len(e_uniq)
+    row_keys, row_pos = np.unique(t_codes * n_e + e_codes, return_inverse=True)
+    row_index = pd.MultiIndex.from_arrays(
+        [t_uniq[row_keys // n_e], e_uniq[row_keys % n_e]],
+        names=["tuote", "ean"],
+    )
+
+    # Columns (Ketju, kauppa): chains in `chain_order`, then by store name
+    k_codes, k_uniq = _sorted_codes(merged["Ketju"])
+    s_codes, s_uniq = _sorted_codes(merged["kauppa"])
+    n_s = len(s_uniq)
+    pair_keys, col_pos = np.unique(k_codes * n_s + s_codes, return_inverse=True)
+    pairs = [(k_uniq[k // n_s], s_uniq[k % n_s]) for k in pair_keys]
+
+    order_map = {c: i for i, c in enumerate(chain_order)}
+    col_order = sorted(range(len(pairs)), key=lambda i: (order_map.get(pairs[i][0], 999), str(pairs[i][1])))
+    col_rank = np.empty(len(pairs), dtype=np.int64)
+    col_rank[col_order] = np.arange(len(pairs))
+    col_pos = col_rank[col_pos]
+    col_index = pd.MultiIndex.from_tuples([pairs[i] for i in col_order], names=["Ketju", "kauppa"])
+
+    # First row wins when a (tuote, ean, kauppa) appears more than once
+    n_cols = len(col_index)
+    _, first = np.unique(row_pos * n_cols + col_pos, return_index=True)
+    at = (row_pos[first], col_pos[first])
+
+    price_grid = np.full((len(row_index), n_cols), np.nan)
+    code_grid = np.full((len(row_index), n_cols), NO_PREV, dtype=np.int8)
+    price_grid[at] = now[first]
+    code_grid[at] = codes[first]
+    stale_grid = None
+    if stale is not None:
+        stale_grid = np.zeros((len(row_index), n_cols), dtype=bool)
+        stale_grid[at] = stale[first]
+    return PriceMatrix(row_index, col_index, price_grid, code_grid, stale_grid)
+
+
+# =========================================================
+#   AS-OF PRICES
+#   Last known price of every (kauppa, tuote, ean) series as of any date.
+#   Observations are sorted by (series, day) and packed into one int64 key
+#   per row, so the price of n series as of a date is n binary searches on
+#   one array; no merges over the history. Built once per data version.
+# =========================================================
+_DAY_KEY = 1 << 20  # more days than any pvm since 1970, so (series, day) packs into one key
+
+
+def _day_number(day) -> int:
+    return int(np.datetime64(pd.Timestamp(day).date(), "D").astype(np.int64))
+
+
+class AsOfPrices:
+    def __init__(self, df: pd.DataFrame):
+        obs = observations(df) if not df.empty else pd.DataFrame(
+            {c: pd.Series(dtype=object) for c in MATRIX_KEYS + ["Ketju", "pvm", "price", "_series"]}
+        )
+        self.starts = series_starts(obs)
+        # One row per series: kauppa, tuote, ean, Ketju
+        self.series = obs.iloc[self.starts][MATRIX_KEYS + ["Ketju"]].reset_index(drop=True)
+        days = obs["pvm"].to_numpy(dtype="datetime64[us]").astype("datetime64[D]").astype(np.int64)
+        self.days = days
+        self.keys = obs["_series"].to_numpy(dtype=np.int64) * _DAY_KEY + days
+        self.prices = obs["price"].to_numpy(dtype="float64")
+
+        chains = self.series["Ketju"].astype(str).to_numpy()
+        series_of_obs = obs["_series"].to_numpy(dtype=np.int64)
+        self._rows_of_chain = {}
+        self._days_of_chain = {}
+        for chain in np.unique(chains):
+            rows = np.flatnonzero(chains == chain)
+            self._rows_of_chain[chain] = rows
+            self._days_of_chain[chain] = np.unique(days[np.isin(series_of_obs, rows)])
+
+    def rows(self, chains) -> np.ndarray:
+        # Series positions of `chains`, ascending
+        parts = [self._rows_of_chain[c] for c in chains if c in self._rows_of_chain]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def survey_dates(self, chains) -> list[datetime.date]:
+        parts = [self._days_of_chain[c] for c in chains if c in self._days_of_chain]
+        if not parts:
+            return []
+        days = np.unique(np.concatenate(parts))
+        return [d.item() for d in days.astype("datetime64[D]")]
+
+    def at(self, day, rows: np.ndarray, max_age_days: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """(price, day number of that price) per series in `rows`; NaN / -1 if none."""
+        d = _day_number(day)
+        pos = np.searchsorted(self.keys, rows * _DAY_KEY + d, side="right") - 1
+        found = pos >= self.starts[rows]
+        if max_age_days is not None:
+            found &= self.days[pos] >= d - max_age_days
+        return (
+            np.where(found, self.prices[pos], np.nan),
+            np.where(found, self.days[pos], -1),
+        )
+
+    def matrix(self, day_now, day_prev, chains: list[str], max_age_days: int | None = None) -> PriceMatrix | None:
+        """Matrix of the prices as of `day_now` against those as of `day_prev`."""
+        rows = self.rows(chains)
+        if not len(rows):
+            return None
+        now, seen = self.at(day_now, rows, max_age_days)
+        if day_prev is not None:
+            prev, _ = self.at(day_prev, rows, max_age_days)
+        else:
+            prev = np.full(len(rows), np.nan)
+        table = self.series.iloc[rows].assign(price_now=now, price_prev=prev)
+        stale = (seen >= 0) & (seen < _day_number(day_now))
+        return build_price_matrix(table, None, chain_order=chains, stale=stale)
@@ -0,0 +1,200 @@
+import datetime
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from dataset import compact_frame
+from stores import classify_store, normalize_store_name
+
+# =========================================================
+#   SHEET ROWS -> PRICE ROWS
+#   Input is the column-built string frame from sheet_sync.rows_to_frame.
+#   Dates, prices and names repeat a lot, so each column is factorized and
+#   only the distinct strings are parsed (dates/prices through per-process
+#   caches); categoricals are built straight from the factorized codes.
+#   Rows that can't be used are reported with the reason instead of
+#   vanishing.
+# =========================================================
+REQUIRED_COLUMNS = {"pvm", "hinta", "kauppa", "tuote"}
+
+# Tried in order; Finnish dates are day first. Slash dates (d/m/Y or
+# m/d/Y) are read only where the order is clear: see _slash_date.
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%d.%m.%Y",
+    "%d.%m.%y",
+    "%Y-%m-%d %H:%M:%S",
+    "%d.%m.%Y %H:%M:%S",
+    "%d.%m.%Y %H.%M.%S",
+    "%d.%m.%Y %H:%M",
+    "%Y/%m/%d",
+]
+SLASH_DATE = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})$")
+
+REJECT_NO_DATE = "pvm puuttuu"
+REJECT_BAD_DATE = "pvm ei kelpaa"
+REJECT_AMBIGUOUS_DATE = "pvm epäselvä (pp/kk vai kk/pp)"
+BAD_PRICE = "hinta ei kelpaa (jätetty tyhjäksi)"
+
+
+class ParseResult(NamedTuple):
+    frame: pd.DataFrame
+    # One row per problem: sheet row, reason and the raw values
+    rejected: pd.DataFrame
+
+
+def empty_rejected() -> pd.DataFrame:
+    return pd.DataFrame({"rivi": pd.Series(dtype="int64"), "syy": pd.Series(dtype=object)})
+
+
+def ambiguous_date(text: str) -> bool:
+    # 03/04/2024: 3 April or March 4? Both parts are months and differ
+    m = SLASH_DATE.match(str(text).strip())
+    return m is not None and int(m.group(1)) <= 12 and int(m.group(2)) <= 12 and m.group(1) != m.group(2)
+
+
+def _slash_date(s: str):
+    # The part over 12 is the day (pandas read these month first, the
+    # sheet's Finnish dates are day first); ambiguous ones are not guessed
+    m = SLASH_DATE.match(s)
+    if m is None or ambiguous_date(s):
+        return None
+    a, b, year = map(int, m.groups())
+    day, month = (a, b) if a > 12 else (b, a)
+    try:
+        return datetime.datetime(year, month, day)
+    except ValueError:
+        return None
+
+
+# Bounded: distinct dates/prices are few, but the processes run for weeks
+@lru_cache(maxsize=65536)
+def parse_date(text: str):
+    s = str(text).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return np.datetime64(datetime.datetime.strptime(s, fmt), "us")
+        except ValueError:
+            continue
+    slash = _slash_date(s)
+    return np.datetime64("NaT", "us") if slash is None else np.datetime64(slash, "us")
+
+
+@lru_cache(maxsize=65536)
+def parse_price(text: str) -> float:
+    s = str(text).strip().replace("\xa0", "").replace(" ", "").replace("€", "").replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return np.nan
+
+
+def _factorize(values) -> tuple[np.ndarray, np.ndarray]:
+    # Sheet cells are strings; a stray None counts as an empty cell
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    missing = codes < 0
+    if missing.any():
+        uniques = np.append(np.asarray(uniques, dtype=object), "")
+        codes[missing] = len(uniques) - 1
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def _per_unique(values, fn, dtype) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # -> (fn of each distinct value, codes, distinct values)
+    codes, uniques = _factorize(values)
+    return np.array([fn(u) for u in uniques], dtype=dtype), codes, uniques
+
+
+def _from_labels(codes: np.ndarray, labels: np.ndarray) -> pd.Categorical:
+    # codes index `labels`; equal labels merge into one sorted category
+    categories, inverse = np.unique(labels.astype(str), return_inverse=True)
+    return pd.Categorical.from_codes(inverse[codes].astype(np.int32), categories)
+
+
+def _categorical(values, keep, fn=None) -> pd.Categorical:
+    # `fn` maps each distinct raw value to its label (e.g. normalized name)
+    codes, uniques = _factorize(np.asarray(values, dtype=object)[keep])
+    labels = np.array([fn(u) for u in uniques] if fn else uniques, dtype=object)
+    return _from_labels(codes, labels)
+
+
+def parse_sheet(df: pd.DataFrame) -> ParseResult:
+    """Raw sheet rows (strings) -> normalized price rows + rejected rows.
+
+    Works on any slice of the sheet, so incremental syncs only parse the
+    newly appended rows. The index of `df` is taken as the sheet row number.
+    """
+    if df.empty:
+        return ParseResult(df, empty_rejected())
+
+    missing = REQUIRED_COLUMNS - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing required columns in sheet: {missing}")
+
+    # Normalize EAN column name (EAN/Ean/ean); if not present create empty
+    ean_candidates = [c for c in df.columns if str(c).strip().lower() == "ean"]
+    if ean_candidates:
+        df = df.rename(columns={ean_candidates[0]: "ean"})
+    else:
+        df = df.assign(ean="")
+
+    dates, date_codes, date_uniques = _per_unique(df["pvm"].to_numpy(), parse_date, "datetime64[us]")
+    pvm = dates[date_codes]
+    keep = ~np.isnat(pvm)
+    prices, price_codes, price_uniques = _per_unique(df["hinta"].to_numpy(), parse_price, "float64")
+    hinta = prices[price_codes]
+
+    # Report instead of silently dropping
+    problems = []
+    if not keep.all():
+        blank = np.array([str(v).strip() == "" for v in df["pvm"].to_numpy()[~keep]])
+        ambiguous = np.array([ambiguous_date(u) for u in date_uniques], dtype=bool)[date_codes][~keep]
+        rows = df.index.to_numpy()[~keep]
+        problems.append(pd.DataFrame({
+            "rivi": rows,
+            "syy": np.select([blank, ambiguous], [REJECT_NO_DATE, REJECT_AMBIGUOUS_DATE], REJECT_BAD_DATE),
+        }))
+    # Blank price is just a missing observation; anything else unparseable is reported
+    bad_unique = np.isnan(prices) & np.array([str(u).strip() != "" for u in price_uniques], dtype=bool)
+    bad_price = keep & bad_unique[price_codes]
+    if bad_price.any():
+        problems.append(pd.DataFrame({"rivi": df.index.to_numpy()[bad_price], "syy": BAD_PRICE}))
+    if problems:
+        rejected = pd.concat(problems, ignore_index=True).sort_values("rivi", kind="stable")
+        raw = df.loc[rejected["rivi"].to_numpy(), ["pvm", "kauppa", "tuote", "hinta"]]
+        rejected = pd.concat([rejected.reset_index(drop=True), raw.reset_index(drop=True)], axis=1)
+    else:
+        rejected = empty_rejected()
+
+    # Store names normalized and classified once per distinct raw name
+    kauppa = _categorical(df["kauppa"].to_numpy(), keep, normalize_store_name)
+    names = np.asarray(kauppa.categories, dtype=object)
+    classes = [classify_store(n) for n in names]
+    chain_of = np.array([c for c, _ in classes], dtype=object)
+    group_of = np.array([g for _, g in classes], dtype=object)
+
+    out = {}
+    for col in df.columns:
+        if col == "pvm":
+            out[col] = pvm[keep]
+        elif col == "hinta":
+            out[col] = hinta[keep].astype("float32")
+        elif col == "kauppa":
+            out[col] = kauppa
+        elif col in ("tuote", "ean"):
+            out[col] = _categorical(df[col].to_numpy(), keep)
+        else:
+            out[col] = df[col].to_numpy()[keep]
+    out["Ketju"] = _from_labels(kauppa.codes, chain_of)
+    out["Ryhmä"] = _from_labels(kauppa.codes, group_of)
+
+    frame = pd.DataFrame(out, index=df.index[keep])
+    return ParseResult(compact_frame(frame), rejected)
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # Just the price rows, for callers that don't collect rejected rows
+    return parse_sheet(df).frame
@@ -0,0 +1,275 @@
+import datetime
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import pandas as pd
+
+from sheet_sync import SheetSync, SyncSnapshot
+
+# =========================================================
+#   PARTITIONED PRICE HISTORY
+#   The history can be split over several worksheets / spreadsheets:
+#     - main spreadsheet, first worksheet      -> current partition (open)
+#     - main spreadsheet, worksheets with a year in the title ("2023",
+#       "K-Ryhmä 2024")                        -> one partition each
+#     - archive spreadsheets, every worksheet  -> one partition each
+#   A partition whose year (from the worksheet or spreadsheet title) is
+#   before the current year is closed: it is read once and then kept for
+#   good. Open partitions are synced incrementally (SheetSync).
+#
+#   Each refresh reads the partitions concurrently on a bounded thread
+#   pool, so it takes about as long as the slowest one. The published
+#   frame is closed partitions (oldest first) followed by open ones, the
+#   main worksheet last. Rows appended to the last partition are appended
+#   to the published frame as a delta; any other change rebuilds it, so
+#   the row order is always the same as a rebuild's.
+# =========================================================
+YEAR_PATTERN = re.compile(r"(?<!\d)(20\d{2})(?!\d)")
+
+
+def partition_year(*titles) -> int | None:
+    # First title that carries a year wins (worksheet before spreadsheet)
+    for title in titles:
+        m = YEAR_PATTERN.search(str(title or ""))
+        if m:
+            return int(m.group(1))
+    return None
+
+
+class Partition(NamedTuple):
+    key: str
+    title: str
+    year: int | None
+    closed: bool
+    worksheet: object
+
+
+def discover_partitions(spreadsheets: list, current_year: int) -> list[Partition]:
+    """Partitions of `spreadsheets` (main first, then archives), oldest first."""
+    found, main = [], []
+    for i, spreadsheet in enumerate(spreadsheets):
+        for j, ws in enumerate(spreadsheet.worksheets()):
+            year = partition_year(ws.title, spreadsheet.title if i else None)
+            key = f"{spreadsheet.id}:{ws.id}"
+            title = f"{spreadsheet.title} / {ws.title}"
+            if i == 0 and j == 0:
+                main.append(Partition(key, title, year, False, ws))
+            elif year is not None:
+                found.append(Partition(key, title, year, year < current_year, ws))
+            elif i > 0:
+                # Undated worksheet of an archive spreadsheet
+                found.append(Partition(key, title, None, True, ws))
+    # Closed partitions oldest first, then the open ones; the main worksheet
+    # (where rows are usually appended) last
+    closed = sorted((p for p in found if p.closed), key=lambda p: (p.year or 0, p.title))
+    return closed + [p for p in found if not p.closed] + main
+
+
+def _combined_version(versions: list[tuple[str, str]]) -> str:
+    h = hashlib.sha1()
+    for key, version in versions:
+        h.update(f"{key}={version};".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+class PartitionedSync:
+    """Same surface as SheetSync (refresh/current/state/restore), over many worksheets.
+
+    `open_spreadsheets()` returns the main spreadsheet followed by any
+    archive spreadsheets; it is called again after errors so credentials
+    are renewed. Partitions are rediscovered every `full_reload_interval`.
+    """
+
+    def __init__(self, open_spreadsheets, parse, concat=None, probe=None,
+                 full_reload_interval: float = 900.0, max_workers: int = 4, today=datetime.date.today):
+        self._open_spreadsheets = open_spreadsheets
+        self._parse = parse
+        self._concat = concat or (lambda frames: pd.concat(frames, ignore_index=True))
+        self._probe = probe
+        self.full_reload_interval = full_reload_interval
+        self.max_workers = max_workers
+        self._today = today
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+
+        self.syncs: dict[str, SheetSync] = {}
+        self.titles: dict[str, str] = {}
+        self.closed: set[str] = set()
+        self.order: list[str] = []
+        self._worksheets = {}
+        self._discovered_at = None
+        self._published: list[tuple[str, str]] = []
+
+        self.frame = pd.DataFrame()
+        self.version: str | None = None
+        self.parent_version: str | None = None
+        self.last_delta: pd.DataFrame | None = None
+        self.last_mode = None
+        self.last_fetched_rows = 0
+        self.last_error: str | None = None
+        self.last_partition_seconds: dict[str, float] = {}
+
+    @property
+    def has_data(self) -> bool:
+        return self.version is not None
+
+    def current(self) -> SyncSnapshot:
+        with self._publish_lock:
+            return SyncSnapshot(self.frame, self.version, self.parent_version, self.last_delta)
+
+    def frames(self) -> dict[str, pd.DataFrame]:
+        return {key: self.syncs[key].frame for key in self.order if key in self.syncs}
+
+    def rejected(self) -> pd.DataFrame:
+        # Rows the parser could not use, tagged with their worksheet
+        parts = [
+            self.syncs[key].rejected.assign(taulukko=self.titles.get(key, key))
+            for key in self.order
+            if key in self.syncs and not self.syncs[key].rejected.empty
+        ]
+        if not parts:
+            return pd.DataFrame()
+        out = pd.concat(parts, ignore_index=True)
+        return out[["taulukko"] + [c for c in out.columns if c != "taulukko"]]
+
+    def state(self) -> dict:
+        return {
+            "version": self.version,
+            "order": list(self.order),
+            "partitions": {
+                key: {
+                    "title": self.titles.get(key, key),
+                    "closed": key in self.closed,
+                    "sync": self.syncs[key].state(),
+                }
+                for key in self.order
+                if key in self.syncs and self.syncs[key].has_data
+            },
+        }
+
+    def restore(self, frames: dict[str, pd.DataFrame], state: dict):
+        with self._lock:
+            for key, info in state["partitions"].items():
+                if key not in frames:
+                    continue
+                sync = self._new_sync(key)
+                sync.restore(frames[key], info["sync"])
+                self.syncs[key] = sync
+                self.titles[key] = info.get("title", key)
+                if info.get("closed"):
+                    self.closed.add(key)
+            self.order = [key for key in state.get("order", []) if key in self.syncs]
+            self._assemble()
+            self.last_mode = "restored"
+
+    # ---------- sync ----------
+    def refresh(self) -> pd.DataFrame:
+        with self._lock:
+            try:
+                stale = self._discovered_at is None or time.time() - self._discovered_at > self.full_reload_interval
+                if stale:
+                    self._discover()
+                errors = self._refresh_partitions()
+                # Publish what did load; the failures are retried next time
+                self._assemble()
+                if errors:
+                    raise errors[0]
+            except Exception:
+                # Reopen the spreadsheets (and credentials) next time
+                self._discovered_at = None
+                raise
+            return self.frame
+
+    def _new_sync(self, key: str) -> SheetSync:
+        return SheetSync(
+            lambda: self._worksheets[key], parse=self._parse, concat=self._concat,
+            probe=self._probe, full_reload_interval=self.full_reload_interval,
+        )
+
+    def _discover(self):
+        partitions = discover_partitions(self._open_spreadsheets(), self._today().year)
+        self._worksheets = {p.key: p.worksheet for p in partitions}
+        self.titles = {p.key: p.title for p in partitions}
+        self.order = [p.key for p in partitions]
+        # A partition turns closed at the turn of the year; keep what we have
+        self.closed = {p.key for p in partitions if p.closed}
+        for key in list(self.syncs):
+            if key not in self._worksheets:
+                del self.syncs[key]
+        for key in self.order:
+            if key not in self.syncs:
+                self.syncs[key] = self._new_sync(key)
+        self._discovered_at = time.time()
+
+    def _refresh_partitions(self) -> list[Exception]:
+        # Open partitions every time, closed ones until they have loaded once
+        todo = [
+            key for key in self.order
+            if key in self._worksheets and (key not in self.closed or not self.syncs[key].has_data)
+        ]
+
+        def run(key):
+            t0 = time.perf_counter()
+            try:
+                self.syncs[key].refresh()
+                return None
+            except Exception as exc:
+                return exc
+            finally:
+                self.last_partition_seconds[key] = time.perf_counter() - t0
+
+        if len(todo) <= 1:
+            results = [run(key) for key in todo]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(todo)),
+                                    thread_name_prefix="sheet-partition") as pool:
+                results = list(pool.map(run, todo))
+
+        self.last_fetched_rows = sum(self.syncs[key].last_fetched_rows for key in todo)
+        return [exc for exc in results if exc is not None]
+
+    def _assemble(self):
+        versions = [
+            (key, self.syncs[key].version)
+            for key in self.order
+            if key in self.syncs and self.syncs[key].has_data
+        ]
+        if not versions:
+            # Nothing loaded yet; keep has_data False
+            return
+        if versions == self._published and self.version is not None:
+            self.last_mode = "unchanged"
+            return
+
+        # Appends to the last partition only -> keep the delta for the cube.
+        # Rows of an earlier partition would land after the later ones here
+        # but not in a rebuild, so those rebuild.
+        appended = (
+            self.version is not None
+            and [k for k, _ in versions] == [k for k, _ in self._published]
+            and versions[:-1] == self._published[:-1]
+        )
+        if appended:
+            key = versions[-1][0]
+            snap = self.syncs[key].current()
+            appended = snap.delta is not None and snap.parent_version == self._published[-1][1]
+
+        parts = [self.syncs[key].frame for key, _ in versions]
+        if appended:
+            delta = snap.delta
+            frame = self._concat([self.frame, delta]) if not delta.empty else self.frame
+            parent, self.last_mode = self.version, "delta"
+        else:
+            frame = self._concat(parts) if len(parts) > 1 else (parts[0] if parts else pd.DataFrame())
+            delta, parent, self.last_mode = None, None, "full"
+
+        with self._publish_lock:
+            self.frame = frame
+            self.version = _combined_version(versions)
+            self.parent_version = parent
+            self.last_delta = delta
+        self._published = versions
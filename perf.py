@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# =========================================================
+#   RERUN TIMINGS
+#   Opt-in (POTWELL_PERF=1 or ?perf=1). Each rerun records, per stage,
+#   wall time, rows in/out and whether a cached artifact was hit. The
+#   process keeps the last WINDOW samples per stage for p50/p95, logs one
+#   JSON line per rerun to the "potwell.perf" logger and, if
+#   POTWELL_METRICS_FILE is set, rewrites a Prometheus text file from time
+#   to time. Disabled reruns get a no-op timer.
+# =========================================================
+WINDOW = 500
+METRICS_WRITE_INTERVAL = 10.0  # seconds
+
+log = logging.getLogger("potwell.perf")
+
+_local = threading.local()
+
+
+def enabled_by_env() -> bool:
+    return os.environ.get("POTWELL_PERF", "").lower() in ("1", "true", "yes")
+
+
+def note_miss():
+    # Called from inside a cached function body: it only runs on a miss
+    stage = getattr(_local, "stage", None)
+    if stage is not None:
+        stage.cache = "miss"
+
+
+class Stage:
+    __slots__ = ("name", "rows_in", "rows_out", "cache", "seconds", "_t0", "_outer")
+
+    def __init__(self, name: str, rows_in=None, cached: bool = False):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        # Cached stages count as hits unless the body calls note_miss()
+        self.cache = "hit" if cached else None
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self._outer = getattr(_local, "stage", None)
+        _local.stage = self
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._t0
+        _local.stage = self._outer
+        return False
+
+    def as_dict(self) -> dict:
+        out = {"stage": self.name, "ms": round(self.seconds * 1000, 3)}
+        for key in ("rows_in", "rows_out", "cache"):
+            value = getattr(self, key)
+            if value is not None:
+                out[key] = value
+        return out
+
+
+class _NullStage:
+    rows_in = rows_out = cache = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class RerunTimer:
+    def __init__(self, recorder: "PerfRecorder | None"):
+        self.recorder = recorder
+        self.stages: list[Stage] = []
+        self._t0 = time.perf_counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.recorder is not None
+
+    def stage(self, name: str, rows_in=None, cached: bool = False):
+        if self.recorder is None:
+            return _NULL_STAGE
+        stage = Stage(name, rows_in, cached)
+        self.stages.append(stage)
+        return stage
+
+    def finish(self):
+        if self.recorder is not None:
+            self.recorder.record(self, time.perf_counter() - self._t0)
+
+
+class StageStats:
+    def __init__(self):
+        self.samples = deque(maxlen=WINDOW)
+        self.count = 0
+        self.total = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.rows_in = None
+        self.rows_out = None
+
+    def add(self, seconds: float, cache=None, rows_in=None, rows_out=None):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if cache == "hit":
+            self.hits += 1
+        elif cache == "miss":
+            self.misses += 1
+        self.rows_in, self.rows_out = rows_in, rows_out
+
+    def quantiles(self) -> tuple[float, float]:
+        return tuple(np.percentile(np.fromiter(self.samples, float), [50, 95]))
+
+
+class PerfRecorder:
+    """Per-process rolling stage timings; shared by every session."""
+
+    def __init__(self, metrics_file: str | None = None):
+        self.metrics_file = metrics_file
+        self._lock = threading.Lock()
+        self.stats: dict[str, StageStats] = {}
+        self.reruns = 0
+        self._last_write = 0.0
+
+    def record(self, timer: RerunTimer, total: float):
+        with self._lock:
+            self.reruns += 1
+            for stage in timer.stages:
+                self.stats.setdefault(stage.name, StageStats()).add(
+                    stage.seconds, stage.cache, stage.rows_in, stage.rows_out
+                )
+            self.stats.setdefault("rerun", StageStats()).add(total)
+            write = self.metrics_file and time.time() - self._last_write > METRICS_WRITE_INTERVAL
+            if write:
+                self._last_write = time.time()
+
+        log.info(json.dumps({
+            "event": "rerun",
+            "ms": round(total * 1000, 3),
+            "stages": [s.as_dict() for s in timer.stages],
+        }, ensure_ascii=False))
+        if write:
+            self.write_metrics()
+
+    def table(self) -> list[dict]:
+        # One row per stage for the debug panel
+        with self._lock:
+            items = [(name, s, s.quantiles()) for name, s in self.stats.items()]
+        return [
+            {
+                "stage": name,
+                "p50 ms": round(p50 * 1000, 2),
+                "p95 ms": round(p95 * 1000, 2),
+                "n": s.count,
+                "hit": s.hits,
+                "miss": s.misses,
+                "rows in": s.rows_in,
+                "rows out": s.rows_out,
+            }
+            for name, s, (p50, p95) in items
+        ]
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP potwell_stage_seconds Dashboard rerun stage wall time.",
+            "# TYPE potwell_stage_seconds summary",
+        ]
+        counters = []
+        with self._lock:
+            for name, s in self.stats.items():
+                p50, p95 = s.quantiles()
+                lines.append(f'potwell_stage_seconds{{stage="{name}",quantile="0.5"}} {p50:.6f}')
+                lines.append(f'potwell_stage_seconds{{stage="{name}",quantile="0.95"}} {p95:.6f}')
+                lines.append(f'potwell_stage_seconds_sum{{stage="{name}"}} {s.total:.6f}')
+                lines.append(f'potwell_stage_seconds_count{{stage="{name}"}} {s.count}')
+                if s.hits or s.misses:
+                    counters.append(f'potwell_stage_cache_total{{stage="{name}",result="hit"}} {s.hits}')
+                    counters.append(f'potwell_stage_cache_total{{stage="{name}",result="miss"}} {s.misses}')
+        if counters:
+            lines += ["# HELP potwell_stage_cache_total Cached stage lookups.",
+                      "# TYPE potwell_stage_cache_total counter"] + counters
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self):
+        # Replace atomically so a scraper never reads half a file
+        tmp = f"{self.metrics_file}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp, self.metrics_file)
+        except OSError:
+            log.exception("Could not write %s", self.metrics_file)
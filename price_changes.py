@@ -0,0 +1,183 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dataset import concat_frames, price64
+
+# =========================================================
+#   PRICE CHANGE POINTS
+#   One event per (kauppa, tuote, ean) series and date where the price
+#   differs from the series' previous observed price (the first sighting
+#   is an event with no old price). Events are kept sorted by pvm, so
+#   "what changed since X" reads only the events after X:
+#     - price as of X = old price of the first event after X
+#     - current price = new price of the last event
+#   New survey rows only add events: each series' last (pvm, price) is
+#   kept, so a delta is compared against it instead of the history.
+#   Missing prices are not observations; when a (series, pvm) appears
+#   more than once the first row wins, like in the matrix.
+# =========================================================
+SERIES_KEYS = ["kauppa", "tuote", "ean"]
+EVENT_COLUMNS = ["pvm", "kauppa", "tuote", "ean", "Ketju", "Ryhmä", "old", "new"]
+CHANGE_COLUMNS = ["Ketju", "kauppa", "tuote", "ean", "Vanha", "Uusi", "Muutos €", "Muutos %", "Muutettu", "Muutoksia"]
+
+
+def observations(df: pd.DataFrame) -> pd.DataFrame:
+    # One price per (series, pvm), sorted by series then pvm; `_series`
+    # numbers the series 0..n-1 in that order
+    cols = SERIES_KEYS + ["Ketju", "Ryhmä", "pvm"]
+    obs = df[cols].assign(price=price64(df["hinta"]))
+    obs = obs[obs["price"].notna()]
+    series = obs.groupby(SERIES_KEYS, observed=True, sort=False).ngroup().to_numpy()
+    order = np.lexsort((obs["pvm"].to_numpy(), series))
+    obs = obs.iloc[order].assign(_series=series[order]).reset_index(drop=True)
+    return obs[~obs.duplicated(["_series", "pvm"])].reset_index(drop=True)
+
+
+def series_starts(obs: pd.DataFrame) -> np.ndarray:
+    # Positions where a new series begins in `obs`
+    series = obs["_series"].to_numpy()
+    if not len(series):
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, series[1:] != series[:-1]])
+
+
+def _series_keys(obs: pd.DataFrame, positions: np.ndarray) -> list[tuple]:
+    sub = obs.iloc[positions]
+    return list(zip(*(sub[c].astype(str).tolist() for c in SERIES_KEYS)))
+
+
+class ChangeIndex:
+    def __init__(self, events: pd.DataFrame, last: dict):
+        self.events = events
+        # (kauppa, tuote, ean) -> (last pvm, last price)
+        self.last = last
+        self.dates = events["pvm"].to_numpy() if not events.empty else np.empty(0, "datetime64[us]")
+
+    def __len__(self):
+        return len(self.events)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ChangeIndex":
+        if df.empty:
+            return cls(pd.DataFrame(columns=EVENT_COLUMNS), {})
+        return cls._add(observations(df), {}, None)
+
+    @classmethod
+    def _add(cls, obs: pd.DataFrame, last: dict, events: pd.DataFrame | None) -> "ChangeIndex":
+        # Every observation is newer than what `last` holds for its series
+        starts = series_starts(obs)
+        keys = _series_keys(obs, starts)
+        ends = np.r_[starts[1:] - 1, len(obs) - 1] if len(starts) else starts
+        price = obs["price"].to_numpy()
+        dates = obs["pvm"].to_numpy()
+
+        prev = np.r_[np.nan, price[:-1]] if len(obs) else price.copy()
+        known = np.ones(len(obs), dtype=bool)
+        known[starts] = False
+        for pos, key in zip(starts, keys):
+            held = last.get(key)
+            if held is not None:
+                prev[pos] = held[1]
+                known[pos] = True
+        changed = ~known | (price != prev)
+
+        new_events = obs.loc[changed, EVENT_COLUMNS[:6]].assign(
+            old=np.where(known, prev, np.nan)[changed], new=price[changed]
+        )
+        last = dict(last)
+        for end, key in zip(ends, keys):
+            last[key] = (dates[end], price[end])
+
+        if events is None or events.empty:
+            merged = new_events.sort_values("pvm", kind="stable")
+        elif new_events.empty:
+            merged = events
+        else:
+            in_order = new_events["pvm"].min() >= events["pvm"].iloc[-1]
+            merged = concat_frames([events, new_events])
+            if not in_order or not new_events["pvm"].is_monotonic_increasing:
+                merged = merged.sort_values("pvm", kind="stable")
+        return cls(merged.reset_index(drop=True), last)
+
+    def extend(self, new_rows: pd.DataFrame) -> "ChangeIndex | None":
+        """Index with `new_rows` added, or None if they reach back before a series' last date."""
+        if new_rows.empty:
+            return self
+        obs = observations(new_rows)
+        starts = series_starts(obs)
+        dates = obs["pvm"].to_numpy()
+        same_day = []
+        for pos, key in zip(starts, _series_keys(obs, starts)):
+            held = self.last.get(key)
+            if held is None:
+                continue
+            if dates[pos] < held[0]:
+                # Backfilled history: later events would change
+                return None
+            if dates[pos] == held[0]:
+                # Same day as the held price: the earlier row wins
+                same_day.append(pos)
+        if same_day:
+            obs = obs.drop(index=same_day).reset_index(drop=True)
+        if obs.empty:
+            return self
+        return ChangeIndex._add(obs, self.last, self.events)
+
+    # ---------- queries ----------
+    def since(self, day, chains=None) -> pd.DataFrame:
+        """Net change per series from the end of `day` to its latest price.
+
+        Only series with a price on or before `day` and a different price
+        now are listed; `chains` limits the result to those Ketju values.
+        """
+        lo = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(day) + pd.Timedelta(days=1)), side="left")
+        tail = self.events.iloc[lo:]
+        if chains is not None:
+            tail = tail[tail["Ketju"].isin(list(chains))]
+        if tail.empty:
+            return pd.DataFrame(columns=CHANGE_COLUMNS)
+
+        # "first" skips NaN, so a first sighting after `day` is marked with -1
+        per = (
+            tail.assign(old=tail["old"].fillna(-1.0))
+            .groupby(SERIES_KEYS, observed=True, sort=False)
+            .agg(Ketju=("Ketju", "first"), Vanha=("old", "first"), Uusi=("new", "last"),
+                 Muutettu=("pvm", "last"), Muutoksia=("new", "size"))
+            .reset_index()
+        )
+        per = per[(per["Vanha"] >= 0) & (per["Uusi"] != per["Vanha"])]
+        per["Muutos €"] = (per["Uusi"] - per["Vanha"]).round(2)
+        per["Muutos %"] = ((per["Uusi"] / per["Vanha"] - 1) * 100).round(1)
+        return per[CHANGE_COLUMNS]
+
+    def largest(self, day, chains=None, n: int = 20) -> tuple[pd.DataFrame, pd.DataFrame]:
+        # (largest increases, largest decreases) by percentage
+        changes = self.since(day, chains)
+        if changes.empty:
+            return changes, changes
+        ups = changes[changes["Muutos %"] > 0].nlargest(n, "Muutos %")
+        downs = changes[changes["Muutos %"] < 0].nsmallest(n, "Muutos %")
+        return ups.reset_index(drop=True), downs.reset_index(drop=True)
+
+
+class ChangeStore:
+    """Latest change index per process; extended on delta syncs, like CubeStore."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.index = None
+
+    def get(self, version: str, frame: pd.DataFrame, parent_version: str | None = None,
+            delta: pd.DataFrame | None = None) -> ChangeIndex:
+        with self._lock:
+            if self.version == version and self.index is not None:
+                return self.index
+            index = None
+            if self.index is not None and delta is not None and self.version == parent_version:
+                index = self.index.extend(delta)
+            self.index = index if index is not None else ChangeIndex.from_frame(frame)
+            self.version = version
+            return self.index
@@ -0,0 +1,190 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dataset import PRICE_DECIMALS, concat_frames, price64
+
+# =========================================================
+#   DAILY PRICE CUBE
+#   Aggregates per (pvm, tuote, kauppa), rolled up to Ketju, Ryhmä and
+#   "all stores". Every level keeps rows / count / sum / min / max, which
+#   merge without the raw rows, so new survey rows only touch the tail of
+#   each table (dates >= the first new date). Sums are exact integers in
+#   units of 10^-PRICE_DECIMALS €, so means don't depend on summing order.
+#
+#   KPI and chart queries read the coarsest level whose members exactly
+#   match the selected stores (the default "all stores" selection hits the
+#   per (pvm, tuote) table).
+# =========================================================
+MEASURES = ["rows", "count", "sum", "min", "max"]
+SUM_SCALE = 10 ** PRICE_DECIMALS
+LEVEL_KEYS = {
+    "kauppa": ["pvm", "tuote", "kauppa"],
+    "Ketju": ["pvm", "tuote", "Ketju"],
+    "Ryhmä": ["pvm", "tuote", "Ryhmä"],
+    "all": ["pvm", "tuote"],
+}
+
+
+def _aggregate_rows(df: pd.DataFrame) -> pd.DataFrame:
+    # Raw price rows -> store level cells
+    hinta = price64(df["hinta"])
+    units = (hinta * SUM_SCALE).round().fillna(0).astype("int64")
+    cells = (
+        df.assign(hinta=hinta, _valid=hinta.notna(), _units=units)
+        .groupby(["pvm", "tuote", "kauppa", "Ketju", "Ryhmä"], observed=True, sort=False)
+        .agg(
+            rows=("hinta", "size"),
+            count=("_valid", "sum"),
+            sum=("_units", "sum"),
+            min=("hinta", "min"),
+            max=("hinta", "max"),
+        )
+        .reset_index()
+    )
+    return cells
+
+
+def _combine(cells: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    # Merge partial aggregates that share a key
+    return (
+        cells.groupby(keys, observed=True)
+        .agg(rows=("rows", "sum"), count=("count", "sum"), sum=("sum", "sum"),
+             min=("min", "min"), max=("max", "max"))
+        .reset_index()
+    )
+
+
+def _store_level(cells: pd.DataFrame) -> pd.DataFrame:
+    return _combine(cells, ["pvm", "tuote", "kauppa", "Ketju", "Ryhmä"])
+
+
+def _mean(units: pd.Series, count: pd.Series) -> pd.Series:
+    return units / (count.replace(0, np.nan) * SUM_SCALE)
+
+
+def _replace_tail(table: pd.DataFrame, tail: pd.DataFrame, since) -> pd.DataFrame:
+    head = table[table["pvm"] < since]
+    return concat_frames([head, tail])
+
+
+class PriceCube:
+    def __init__(self, levels: dict):
+        self.levels = levels
+        cells = levels["kauppa"]
+        self._chain_of_store = dict(
+            cells[["kauppa", "Ketju"]].drop_duplicates().astype(str).itertuples(index=False)
+        )
+        self._group_of_chain = dict(
+            cells[["Ketju", "Ryhmä"]].drop_duplicates().astype(str).itertuples(index=False)
+        )
+        self._stores_of_chain = {}
+        for store, chain in self._chain_of_store.items():
+            self._stores_of_chain.setdefault(chain, set()).add(store)
+        self._chains_of_group = {}
+        for chain, group in self._group_of_chain.items():
+            self._chains_of_group.setdefault(group, set()).add(chain)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "PriceCube":
+        cells = _store_level(_aggregate_rows(df))
+        return cls(cls._rollups(cells))
+
+    @staticmethod
+    def _rollups(cells: pd.DataFrame) -> dict:
+        levels = {"kauppa": cells.sort_values("pvm", kind="stable").reset_index(drop=True)}
+        for level in ("Ketju", "Ryhmä", "all"):
+            levels[level] = _combine(cells, LEVEL_KEYS[level])
+        return levels
+
+    def extend(self, new_rows: pd.DataFrame) -> "PriceCube":
+        """New cube with `new_rows` added; only dates >= their first pvm are redone."""
+        if new_rows.empty:
+            return self
+        since = new_rows["pvm"].min()
+        old_cells = self.levels["kauppa"]
+        tail = _store_level(concat_frames([old_cells[old_cells["pvm"] >= since], _aggregate_rows(new_rows)]))
+
+        levels = {"kauppa": _replace_tail(old_cells, tail, since)}
+        for level in ("Ketju", "Ryhmä", "all"):
+            levels[level] = _replace_tail(self.levels[level], _combine(tail, LEVEL_KEYS[level]), since)
+        return PriceCube(levels)
+
+    # ---------- queries ----------
+    def _level_for(self, stores) -> tuple[str, list | None]:
+        # Coarsest level whose members are exactly the selected stores
+        sel = {str(s) for s in stores} & self._chain_of_store.keys()
+        if sel == self._chain_of_store.keys():
+            return "all", None
+
+        chains = {self._chain_of_store[s] for s in sel}
+        if set().union(*(self._stores_of_chain[c] for c in chains)) != sel:
+            return "kauppa", sorted(sel)
+
+        groups = {self._group_of_chain[c] for c in chains}
+        if set().union(*(self._chains_of_group[g] for g in groups)) == chains:
+            return "Ryhmä", sorted(groups)
+        return "Ketju", sorted(chains)
+
+    def select(self, start_date, end_date, products, stores) -> pd.DataFrame:
+        level, members = self._level_for(stores)
+        table = self.levels[level]
+
+        dates = table["pvm"].to_numpy()
+        lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), side="left")
+        hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date) + pd.Timedelta(days=1)), side="left")
+        sub = table.iloc[lo:hi]
+
+        keep = sub["tuote"].isin(products)
+        if members is not None:
+            keep &= sub[level].isin(members)
+        return sub[keep]
+
+    def kpis(self, sub: pd.DataFrame) -> dict:
+        """Latest mean, delta vs the previous date, min and max of a selection."""
+        per_date = sub.groupby("pvm")[["count", "sum"]].sum()
+        means = _mean(per_date["sum"], per_date["count"])
+        latest_avg = means.iloc[-1]
+        delta = latest_avg - means.iloc[-2] if len(means) > 1 else 0
+        return {
+            "latest_avg": latest_avg,
+            "delta": delta,
+            "min": sub["min"].min(),
+            "max": sub["max"].max(),
+        }
+
+    def stats(self, sub: pd.DataFrame, freq: str = "D") -> pd.DataFrame:
+        """Keskiarvo / Minimi / Maksimi per (pvm, tuote); `freq` W or M buckets pvm."""
+        if freq != "D":
+            sub = sub.assign(pvm=sub["pvm"].dt.to_period(freq).dt.start_time)
+        stats = _combine(sub, ["pvm", "tuote"])
+        return pd.DataFrame({
+            "pvm": stats["pvm"],
+            "tuote": stats["tuote"],
+            "Keskiarvo": _mean(stats["sum"], stats["count"]),
+            "Minimi": stats["min"],
+            "Maksimi": stats["max"],
+        })
+
+
+class CubeStore:
+    """Latest cube per process; extended in place of a rebuild on delta syncs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.cube = None
+
+    def get(self, version: str, frame: pd.DataFrame, parent_version: str | None = None,
+            delta: pd.DataFrame | None = None) -> PriceCube:
+        """Cube for `version`; extends the held cube if `frame` is parent + delta."""
+        with self._lock:
+            if self.version == version and self.cube is not None:
+                return self.cube
+            if self.cube is not None and delta is not None and self.version == parent_version:
+                self.cube = self.cube.extend(delta)
+            else:
+                self.cube = PriceCube.from_frame(frame)
+            self.version = version
+            return self.cube
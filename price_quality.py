@@ -0,0 +1,349 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dataset import PRICE_DECIMALS, price64
+from sheet_sync import SyncSnapshot
+
+# =========================================================
+#   PRICE QUALITY
+#   Every price is checked against robust references, all groups at once
+#   (one sort per statistic, no per-product loops):
+#     - peers:   the product's median and MAD across stores on the same
+#                date (when at least MIN_PEERS stores have a price)
+#     - history: the series' (kauppa, tuote, ean) previous price that
+#                was not a same-day outlier
+#     - product: the product's latest earlier same-day median, when there
+#                are neither peers nor history (a first sighting on a
+#                thin date)
+#     - none:    with no reference at all, a price over MAX_PRICE is
+#                taken as cents (the old "hinta > 40" rule), so a series
+#                that starts with a cents typo doesn't anchor on it
+#   A price far from its reference is flagged. If price / 100 passes the
+#   same check, it was typed in cents and is corrected; other flags are
+#   only reported.
+#
+#   A verdict depends only on its own date and the past, so new survey
+#   rows re-check just the rows from their first date on. The report keeps
+#   each series' and product's last two dates to seed that window.
+# =========================================================
+MIN_PEERS = 3       # stores needed for a same-day median
+Z_LIMIT = 3.5       # modified z-score limit (0.6745 * |x - median| / MAD)
+MIN_SPREAD = 0.10   # MAD floor as a share of the median (ties are common)
+JUMP_LIMIT = 3.0    # max ratio to the previous price / product median
+MAX_PRICE = 40.0    # euros; only used for prices without any reference
+CENTS = 100.0
+# Medians are taken over integer units: half of the smallest price step,
+# so a median of two prices and the deviations from it stay exact
+UNITS = 2 * 10 ** PRICE_DECIMALS
+VALUE_BITS = 34
+
+REASON_CENTS = "senttejä"
+REASON_PEERS = "poikkeaa muista kaupoista"
+REASON_HISTORY = "poikkeaa aiemmasta hinnasta"
+REASON_PRODUCT = "poikkeaa tuotteen mediaanista"
+REASONS = [REASON_CENTS, REASON_PEERS, REASON_HISTORY, REASON_PRODUCT]
+
+FLAG_COLUMNS = ["pvm", "Ketju", "kauppa", "tuote", "ean", "hinta", "korjattu", "syy", "mediaani", "edellinen"]
+# Window seeds, (key, pvm, price) for each key's last two dates: series
+# prices as each history pass sees them, and same-day product medians
+HISTORY_TAILS = ["peers", "cents", "accepted"]
+TAILS = HISTORY_TAILS + ["product"]
+
+
+def _group_median(groups: np.ndarray, values: np.ndarray, n_groups: int) -> tuple[np.ndarray, np.ndarray]:
+    # (median per group id, size per group); NaN for empty groups. One sort
+    # of (group, value) packed into an int64
+    units = np.rint(values * UNITS).astype(np.int64)
+    v = np.sort((groups.astype(np.int64) << VALUE_BITS) | units) & ((1 << VALUE_BITS) - 1)
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    median = np.full(n_groups, np.nan)
+    has = counts > 0
+    lo = starts[has] + (counts[has] - 1) // 2
+    hi = starts[has] + counts[has] // 2
+    median[has] = (v[lo] + v[hi]) / (2 * UNITS)
+    return median, counts
+
+
+def _labels(column: pd.Series, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # (codes at `rows`, label of each code); a missing value is ""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()[rows].astype(np.int64)
+        labels = np.asarray(column.cat.categories.astype(str), dtype=object)
+    else:
+        codes, uniques = pd.factorize(column.to_numpy()[rows])
+        labels = np.array([str(v) for v in uniques], dtype=object)
+    return np.where(codes < 0, len(labels), codes), np.append(labels, "")
+
+
+def _ratio_ok(price: np.ndarray, ref: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = price / ref
+    return (ratio <= JUMP_LIMIT) & (ratio >= 1 / JUMP_LIMIT)
+
+
+def _empty_tail() -> pd.DataFrame:
+    # Keys stay plain objects: arrow strings would be converted on every lookup
+    return pd.DataFrame({
+        "key": pd.Series(dtype=object), "pvm": pd.Series(dtype="datetime64[us]"), "price": pd.Series(dtype="float64"),
+    })
+
+
+def _last_two(ids: np.ndarray, days: np.ndarray, values: np.ndarray, keys: np.ndarray) -> pd.DataFrame:
+    # Per id, the last value of each of its last two dates (input sorted by id, day)
+    if not len(ids):
+        return _empty_tail()
+    day_end = np.r_[(ids[1:] != ids[:-1]) | (days[1:] != days[:-1]), True]
+    ids, days, values = ids[day_end], days[day_end], values[day_end]
+    last = np.r_[ids[1:] != ids[:-1], True]
+    keep = last | np.r_[last[1:] & (ids[:-1] == ids[1:]), False]
+    return pd.DataFrame({"key": pd.Series(keys[ids[keep]], dtype=object), "pvm": days[keep], "price": values[keep]})
+
+
+def _previous(values: np.ndarray, starts: np.ndarray, seed_ids: np.ndarray, seed: pd.DataFrame,
+              series: np.ndarray) -> np.ndarray:
+    # Last non-NaN value before each position of its series (input sorted
+    # by series, day); a series starts from its seed
+    seeded = np.full(int(series.max()) + 1 if len(series) else 0, np.nan)
+    seeded[seed_ids] = seed["price"].to_numpy(np.float64)
+    prev = np.r_[np.nan, values[:-1]] if len(values) else values.copy()
+    prev[starts] = seeded[series[starts]]
+    anchor = starts | ~np.isnan(prev)
+    return prev[np.maximum.accumulate(np.where(anchor, np.arange(len(prev)), 0))]
+
+
+def _merge_tails(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    # Keys outside the window keep their entries
+    untouched = old[pd.Index(new["key"].unique()).get_indexer(old["key"]) < 0]
+    return pd.concat([untouched, new], ignore_index=True) if len(untouched) else new
+
+
+class QualityReport:
+    """Flagged rows of one frame and the cents corrections to apply."""
+
+    def __init__(self, flags: pd.DataFrame, tails: dict[str, pd.DataFrame], last_day=None):
+        # One row per flagged price; the index is the row position in the frame
+        self.flags = flags
+        # Window seeds (see TAILS)
+        self.tails = tails
+        self.last_day = last_day
+        fixed = flags["korjattu"].notna().to_numpy()
+        self.positions = flags.index.to_numpy(dtype=np.int64)[fixed]
+        self.corrected = flags["korjattu"].to_numpy(dtype=np.float64)[fixed].astype(np.float32)
+
+    def __len__(self):
+        return len(self.flags)
+
+    @classmethod
+    def empty(cls) -> "QualityReport":
+        return cls(pd.DataFrame(columns=FLAG_COLUMNS, index=pd.Index([], dtype=np.int64)),
+                   {name: _empty_tail() for name in TAILS})
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "QualityReport":
+        if df.empty:
+            return cls.empty()
+        return cls.empty()._check(df, np.arange(len(df)))
+
+    def extend(self, frame: pd.DataFrame, start: int) -> "QualityReport | None":
+        """Report for `frame` whose rows start.. are new, or None if they reach back before the last date."""
+        if start >= len(frame):
+            return self
+        first = frame["pvm"].to_numpy()[start:].min()
+        if self.last_day is not None and first < self.last_day:
+            # Backfilled history: later verdicts would change
+            return None
+        return self._check(frame, np.flatnonzero(frame["pvm"].to_numpy() >= first))
+
+    def _seed(self, name: str, keys: np.ndarray, before) -> tuple[np.ndarray, pd.DataFrame]:
+        # (key id, entry) of each of `keys`' last entry dated before `before`
+        tail = self.tails[name]
+        tail = tail[tail["pvm"].to_numpy() < before].drop_duplicates("key", keep="last")
+        ids = pd.Index(keys).get_indexer(tail["key"].to_numpy(object))
+        return ids[ids >= 0], tail[ids >= 0]
+
+    def _check(self, df: pd.DataFrame, window: np.ndarray) -> "QualityReport":
+        # Checks the rows at `window` (every row dated from its first date
+        # on); verdicts of earlier rows are kept from this report
+        dates = df["pvm"].to_numpy()
+        first = dates[window].min()
+        price_all = price64(df["hinta"].iloc[window]).to_numpy()
+        valid = ~np.isnan(price_all)
+        rows, price = window[valid], price_all[valid]
+        day_values = dates[rows]
+
+        kauppa, kauppa_labels = _labels(df["kauppa"], rows)
+        product, product_labels = _labels(df["tuote"], rows)
+        ean, ean_labels = _labels(df["ean"], rows)
+        series, combos = pd.factorize((kauppa * len(product_labels) + product) * len(ean_labels) + ean)
+        k, rest = np.divmod(combos, len(product_labels) * len(ean_labels))
+        t, e = np.divmod(rest, len(ean_labels))
+        series_keys = kauppa_labels[k] + "\x1f" + product_labels[t] + "\x1f" + ean_labels[e]
+
+        seed_product, product_seed = self._seed("product", product_labels, first)
+        days = np.unique(np.r_[day_values, product_seed["pvm"].to_numpy(dates.dtype)])
+        day = np.searchsorted(days, day_values)
+        n_days = len(days) + 1
+
+        # ---- peers: median / MAD per (tuote, pvm) ----
+        cell, cell_key = pd.factorize(product * n_days + day)
+        median, peers = _group_median(cell, price, len(cell_key))
+        mad, _ = _group_median(cell, np.abs(price - median[cell]), len(cell_key))
+        scale = np.maximum(mad / 0.6745, MIN_SPREAD * median)[cell]
+        has_peers = peers[cell] >= MIN_PEERS
+        ref_day = median[cell]
+        peer_out = has_peers & (np.abs(price - ref_day) > Z_LIMIT * scale)
+        peer_cents = peer_out & (np.abs(price / CENTS - ref_day) <= Z_LIMIT * scale)
+
+        # ---- product: latest earlier same-day median with enough peers ----
+        known = peers >= MIN_PEERS
+        seed_day = np.searchsorted(days, product_seed["pvm"].to_numpy(dates.dtype))
+        cand_key = np.r_[cell_key[known], seed_product * n_days + seed_day]
+        cand_median = np.r_[median[known], product_seed["price"].to_numpy(np.float64)]
+        order = np.argsort(cand_key, kind="stable")
+        cand_key, cand_median = cand_key[order], cand_median[order]
+        j = np.searchsorted(cand_key, product * n_days + day) - 1
+        ref_product = np.full(len(rows), np.nan)
+        if len(cand_key):
+            hit = (j >= 0) & (cand_key[np.maximum(j, 0)] // n_days == product)
+            ref_product[hit] = cand_median[j[hit]]
+
+        # ---- history: the series' previous accepted price ----
+        # A price without peers is judged by the one before it, which may be
+        # wrong too. Before the final comparison, pass 1 fixes cents prices
+        # and pass 2 also drops the jumps, each against the previous pass
+        order = np.argsort(series.astype(np.int64) * n_days + day, kind="stable")
+        s = series[order]
+        starts = np.r_[True, s[1:] != s[:-1]] if len(s) else np.zeros(0, dtype=bool)
+        p, alone = price[order], ~has_peers[order]
+        # Fixed before it becomes the anchor of the prices after it
+        unref_cents = ~has_peers & np.isnan(ref_product) & (price > MAX_PRICE) & (price / CENTS <= MAX_PRICE)
+        values = np.where(peer_cents | unref_cents, price / CENTS, np.where(peer_out, np.nan, price))[order]
+        seeds = {name: self._seed(name, series_keys, first) for name in HISTORY_TAILS}
+        fixed = {}
+        for k, name in enumerate(HISTORY_TAILS):
+            fixed[name] = values
+            prev_sorted = _previous(values, starts, *seeds[name], s)
+            jump = alone & ~np.isnan(prev_sorted) & ~_ratio_ok(p, prev_sorted)
+            values = np.where(jump & _ratio_ok(p / CENTS, prev_sorted), p / CENTS,
+                              np.where(jump & (k > 0), np.nan, values))
+        prev = np.empty(len(rows))
+        prev[order] = prev_sorted
+        has_prev = ~np.isnan(prev)
+        hist_out = has_prev & ~_ratio_ok(price, prev)
+
+        product_out = ~has_peers & ~has_prev & ~np.isnan(ref_product) & ~_ratio_ok(price, ref_product)
+        unref_cents &= ~has_prev
+
+        # Cents: the price fails its primary reference, price / 100 passes it
+        cents = peer_cents | (~has_peers & hist_out & _ratio_ok(price / CENTS, prev)) | (
+            product_out & _ratio_ok(price / CENTS, ref_product)
+        ) | unref_cents
+        flagged = peer_out | hist_out | product_out | unref_cents
+        reason = np.select([cents, peer_out, hist_out], [0, 1, 2], default=3)[flagged]
+        pos = rows[flagged]
+        flags = df.iloc[pos][["pvm", "Ketju", "kauppa", "tuote", "ean"]].assign(
+            hinta=price[flagged],
+            korjattu=np.where(cents, price / CENTS, np.nan)[flagged],
+            syy=pd.Categorical.from_codes(reason, categories=REASONS),
+            mediaani=np.where(has_peers, ref_day, ref_product)[flagged],
+            edellinen=prev[flagged],
+        )[FLAG_COLUMNS]
+        flags.index = pos
+        if len(self.flags):
+            kept = self.flags[~np.isin(self.flags.index.to_numpy(), window)]
+            flags = pd.concat([kept, flags]).sort_index(kind="stable") if len(flags) else kept
+
+        # ---- seeds for the next window ----
+        tails = {}
+        for name, values in fixed.items():
+            seed_ids, seed = seeds[name]
+            keep = ~np.isnan(values)
+            ids = np.r_[seed_ids, s[keep]]
+            o = np.argsort(ids, kind="stable")  # seeds are older than the window
+            tails[name] = _last_two(
+                ids[o],
+                np.r_[seed["pvm"].to_numpy(dates.dtype), day_values[order][keep]][o],
+                np.r_[seed["price"].to_numpy(np.float64), values[keep]][o],
+                series_keys,
+            )
+        cell_product, cell_day = np.divmod(cell_key[known], n_days)
+        ids = np.r_[seed_product, cell_product]
+        p_days = np.r_[product_seed["pvm"].to_numpy(dates.dtype), days[cell_day]]
+        o = np.lexsort((p_days, ids))
+        tails["product"] = _last_two(
+            ids[o], p_days[o], np.r_[product_seed["price"].to_numpy(np.float64), median[known]][o], product_labels,
+        )
+
+        last_day = day_values.max() if len(rows) else first
+        if self.last_day is not None:
+            last_day = max(last_day, self.last_day)
+        return QualityReport(
+            flags, {name: _merge_tails(self.tails[name], tail) for name, tail in tails.items()}, last_day,
+        )
+
+    # ---------- corrections ----------
+    def apply(self, frame: pd.DataFrame, start: int = 0) -> pd.DataFrame:
+        """`frame` (rows start.. of the checked frame) with the cents prices corrected."""
+        lo, hi = np.searchsorted(self.positions, [start, start + len(frame)])
+        if lo == hi:
+            return frame
+        hinta = frame["hinta"].to_numpy().copy()
+        hinta[self.positions[lo:hi] - start] = self.corrected[lo:hi]
+        return frame.assign(hinta=hinta)
+
+    def corrections_before(self, end: int) -> tuple[np.ndarray, np.ndarray]:
+        n = np.searchsorted(self.positions, end)
+        return self.positions[:n], self.corrected[:n]
+
+    # ---------- review ----------
+    def review(self, reasons=None, chains=None) -> pd.DataFrame:
+        flags = self.flags
+        if reasons:
+            flags = flags[flags["syy"].isin(list(reasons))]
+        if chains is not None:
+            flags = flags[flags["Ketju"].isin(list(chains))]
+        return flags.sort_values(["pvm", "kauppa"], ascending=[False, True], kind="stable").reset_index(drop=True)
+
+
+class QualityStore:
+    """Latest quality report per process, and the corrected snapshot.
+
+    Extended on delta syncs, like CubeStore. The corrected delta is passed
+    on only when the rows before it keep exactly the corrections they had,
+    so the cube etc. may still extend instead of rebuilding.
+    """
+
+    def __init__(self, correct: bool = True):
+        self.correct = correct
+        self._lock = threading.Lock()
+        self.version = None
+        self.report = None
+        self.snapshot = None
+
+    def get(self, snapshot: SyncSnapshot) -> tuple[SyncSnapshot, QualityReport]:
+        with self._lock:
+            if self.version == snapshot.version and self.snapshot is not None:
+                return self.snapshot, self.report
+            frame, delta = snapshot.frame, snapshot.delta
+            extends = delta is not None and self.report is not None and self.version == snapshot.parent_version
+            start = len(frame) - len(delta) if extends else 0
+            report = self.report.extend(frame, start) if extends else None
+            if report is None:
+                report, extends = QualityReport.from_frame(frame), False
+
+            if not self.correct:
+                clean = snapshot
+            else:
+                if extends:
+                    old, new = self.report.corrections_before(start), report.corrections_before(start)
+                    extends = np.array_equal(old[0], new[0]) and np.array_equal(old[1], new[1])
+                clean = SyncSnapshot(
+                    report.apply(frame), snapshot.version,
+                    snapshot.parent_version if extends else None,
+                    report.apply(delta, start) if extends else None,
+                )
+            self.version, self.report, self.snapshot = snapshot.version, report, clean
+            return clean, report
@@ -0,0 +1,41 @@
+"""Run the dashboard with the data loaded while the server starts.
+
+    python serve.py                              # instead of: streamlit run dashboard.py
+    python serve.py --server.port 8080           # any `streamlit run` options
+
+`streamlit run dashboard.py` runs nothing before the first session, so the
+first visitor's login pays for importing pandas/pyarrow, opening the shared
+dataset and the price check. Here a thread does all that (app_data.preload)
+while Streamlit starts, and dashboard.py takes the loaded AppData over.
+"""
+import contextlib
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def preload():
+    # Streamlit's emoji table: set_page_config checks the page icon against
+    # it, on the first run only
+    with contextlib.suppress(ImportError):
+        import streamlit.emojis  # noqa: F401
+    import app_data
+
+    app_data.preload()
+
+
+def main():
+    # A session that comes before the preload is done builds its own AppData
+    # and the preload does nothing
+    threading.Thread(target=preload, name="preload", daemon=True).start()
+
+    from streamlit.web import cli
+
+    sys.argv = ["streamlit", "run", os.path.join(ROOT, "dashboard.py"), *sys.argv[1:]]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import glob
+import json
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+from sheet_sync import SyncSnapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process leader, see SharedSync
+    fcntl = None
+
+# =========================================================
+#   SHARED DATASET (one copy per machine)
+#   One process - the one holding <root>/leader.lock - syncs the sheets
+#   and publishes every data version as an immutable Arrow IPC file:
+#
+#   <root>/data-<version>.arrow -> the normalized frame, written once
+#   <root>/CURRENT              -> {"version", "file", "parent_version",
+#                                   "delta_rows", "rejected"}
+#
+#   The data file is written under a temporary name and renamed, then
+#   CURRENT is replaced the same way, so a reader sees the old or the new
+#   version, never a mix. Every process (the leader too) memory-maps the
+#   current file read-only: dates, prices and categorical codes are views
+#   of the page cache, so all sessions of all processes share one copy and
+#   a rerun never copies the frame. If the leader goes away, the next
+#   process to poll takes the lock over.
+# =========================================================
+CURRENT = "CURRENT"
+LOCK_FILE = "leader.lock"
+KEEP_VERSIONS = 3  # older files may still be mapped by slow readers
+
+
+def _atomic_write(path: str, write):
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _to_arrow(frame: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    # from_pandas turns NaN into nulls, which can't be mapped back without a
+    # copy; a missing price stays a NaN
+    for i, field in enumerate(table.schema):
+        if pa.types.is_floating(field.type):
+            values = frame[field.name].to_numpy()
+            table = table.set_column(i, field, pa.array(values, type=field.type, from_pandas=False))
+    return table
+
+
+def write_dataset(root: str, frame: pd.DataFrame, version: str) -> str:
+    """Write `frame` as <root>/data-<version>.arrow (once); returns the file name."""
+    name = f"data-{version}.arrow"
+    path = os.path.join(root, name)
+    if not os.path.exists(path):
+        table = _to_arrow(frame)
+
+        def write(f):
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+
+        _atomic_write(path, write)
+    return name
+
+
+def read_current(root: str) -> dict | None:
+    try:
+        with open(os.path.join(root, CURRENT), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def publish(root: str, frame: pd.DataFrame, version: str, parent_version=None, delta_rows=None,
+            rejected: pd.DataFrame | None = None) -> dict:
+    pointer = {
+        "version": version,
+        "file": write_dataset(root, frame, version),
+        "parent_version": parent_version,
+        "delta_rows": delta_rows,
+        "rejected": rejected.to_dict("records") if rejected is not None else [],
+    }
+    data = json.dumps(pointer, ensure_ascii=False, default=str).encode("utf-8")
+    _atomic_write(os.path.join(root, CURRENT), lambda f: f.write(data))
+    _remove_old(root, keep=pointer["file"])
+    return pointer
+
+
+def open_dataset(root: str, name: str) -> pd.DataFrame:
+    """Read-only frame over a memory-mapped data file (no copy of the columns)."""
+    source = pa.memory_map(os.path.join(root, name), "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _remove_old(root: str, keep: str):
+    files = sorted(glob.glob(os.path.join(root, "data-*.arrow")), key=os.path.getmtime, reverse=True)
+    old = [p for p in files if os.path.basename(p) != keep][KEEP_VERSIONS - 1:]
+    for path in old:
+        try:
+            # Mapped copies stay readable on POSIX; Windows refuses, try later
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class SharedSync:
+    """Sync surface (refresh/current/has_data/rejected) over the shared dataset.
+
+    `make_sync()` builds the real sheet sync (PartitionedSync); only the
+    leader process calls it. Other processes just follow CURRENT. Without
+    fcntl (Windows) every process leads, i.e. syncs for itself, and
+    publishes to the same directory.
+    """
+
+    def __init__(self, root: str, make_sync):
+        self.root = root
+        self._make_sync = make_sync
+        self.source = None  # the sheet sync, in the leader process
+        self._lock_file = None
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+
+        self.frame = pd.DataFrame()
+        self.version: str | None = None
+        self.parent_version: str | None = None
+        self.last_delta: pd.DataFrame | None = None
+        self.last_mode = None
+        self.last_error: str | None = None
+        self._rejected = pd.DataFrame()
+
+        os.makedirs(root, exist_ok=True)
+        # Serve the last published version right away, like a snapshot
+        self._follow()
+
+    @property
+    def has_data(self) -> bool:
+        return self.version is not None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.source is not None
+
+    def current(self) -> SyncSnapshot:
+        with self._publish_lock:
+            return SyncSnapshot(self.frame, self.version, self.parent_version, self.last_delta)
+
+    def rejected(self) -> pd.DataFrame:
+        return self._rejected
+
+    def refresh(self) -> pd.DataFrame:
+        with self._lock:
+            if self.source is None and self._try_lead():
+                self.source = self._make_sync()
+            try:
+                if self.source is not None:
+                    # A restored snapshot goes out before the sheets are read
+                    self._publish_source()
+                    self.source.refresh()
+            finally:
+                if self.source is not None:
+                    self._publish_source()
+                self._follow()
+            return self.frame
+
+    def _try_lead(self) -> bool:
+        if fcntl is None:
+            return True
+        f = open(os.path.join(self.root, LOCK_FILE), "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        # Held (by keeping the file open) for the life of the process
+        self._lock_file = f
+        return True
+
+    def _publish_source(self):
+        snap = self.source.current()
+        if snap.version is None:
+            return
+        pointer = read_current(self.root)
+        if pointer is not None and pointer.get("version") == snap.version:
+            return
+        delta_rows = len(snap.delta) if snap.delta is not None else None
+        publish(self.root, snap.frame, snap.version, snap.parent_version, delta_rows, self.source.rejected())
+
+    def _follow(self):
+        pointer = read_current(self.root)
+        while True:
+            if pointer is None or pointer["version"] == self.version:
+                self.last_mode = "unchanged"
+                return
+            try:
+                frame = open_dataset(self.root, pointer["file"])
+                break
+            except FileNotFoundError:
+                # The leader published again and removed this version between
+                # our read of CURRENT and the open: follow the newer pointer.
+                # Same pointer again = the file is really gone, keep ours
+                newer = read_current(self.root)
+                if newer == pointer:
+                    self.last_mode = "unchanged"
+                    return
+                pointer = newer
+        delta = None
+        n = pointer.get("delta_rows")
+        if pointer.get("parent_version") == self.version and self.version is not None and n is not None:
+            # The new rows are the tail of the file: the cube etc. extend
+            # instead of rebuilding
+            delta = frame.iloc[len(frame) - n:]
+        with self._publish_lock:
+            self.frame = frame
+            self.version = pointer["version"]
+            self.parent_version = pointer.get("parent_version") if delta is not None else None
+            self.last_delta = delta
+        self._rejected = pd.DataFrame(pointer.get("rejected") or [])
+        self.last_mode = "delta" if delta is not None else "full"
@@ -0,0 +1,351 @@
+import hashlib
+import threading
+import time
+import traceback
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from dataset import frame_digest
+
+# =========================================================
+#   INCREMENTAL SHEET SYNC
+#   The survey sheet only grows by appending rows, so after the first
+#   full read we remember a high-water mark (rows consumed + hash of the
+#   last row) and afterwards fetch only the rows below it.
+#   Anything that looks like an in-place edit -> full reload. Edits further
+#   up the sheet can't be seen from the mark, so once `full_reload_interval`
+#   seconds have passed the next change reloads in full. With a probe, an
+#   unchanged token means no edits either, so nothing is downloaded; the
+#   interval is the safety net for changes that come with an append, and
+#   for syncs without a (working) probe.
+#
+#   The worksheet only needs gspread's `get_all_values()` and
+#   `batch_get(ranges)`, so a small fake object works offline.
+#
+#   BackgroundRefresher runs the sync on one thread per process; sessions
+#   only read the last published (frame, version) and never wait for the
+#   network (except on the very first load without a snapshot).
+# =========================================================
+def _trim_row(row) -> list[str]:
+    row = ["" if v is None else str(v) for v in row]
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def row_hash(row) -> str:
+    # Trailing blanks are trimmed by the Sheets API, so ignore them here too
+    return hashlib.sha1("\x1f".join(_trim_row(row)).encode("utf-8")).hexdigest()
+
+
+def column_letter(n: int) -> str:
+    # 1 -> A, 26 -> Z, 27 -> AA
+    letters = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def rows_to_frame(header: list[str], rows: list[list[str]], first_row: int = 2) -> pd.DataFrame:
+    """String frame of sheet rows, built column by column; index = sheet row number."""
+    width = len(header)
+    # The API trims trailing blank cells, so pad the short rows only
+    rows = [r if len(r) >= width else list(r) + [""] * (width - len(r)) for r in rows]
+    columns = {i: np.array([r[i] for r in rows], dtype=object) for i in range(width)}
+    # dtype=object: plain strings, no per-column string dtype conversion
+    frame = pd.DataFrame(columns, index=pd.RangeIndex(first_row, first_row + len(rows)), dtype=object)
+    frame.columns = header
+    return frame
+
+
+class SyncSnapshot(NamedTuple):
+    frame: pd.DataFrame
+    version: str | None
+    # Set when `frame` is `delta` appended to the frame of `parent_version`
+    parent_version: str | None = None
+    delta: pd.DataFrame | None = None
+
+
+class SheetSync:
+    """Keeps a parsed copy of one worksheet and extends it with appended rows.
+
+    `open_worksheet` is called lazily (and again after errors) so credentials
+    are only needed when the sheet is actually read. `parse` turns a raw
+    string frame (header columns, indexed by sheet row number) into
+    `(frame, rejected)` - the normalized rows and a table of rows it could
+    not use - and must work on any slice of rows; `concat` appends parsed slices
+    (defaults to pd.concat). `probe(worksheet)`, if given, returns a cheap
+    change token (e.g. the spreadsheet's modified time); while it stays the
+    same the rows are not fetched at all.
+    """
+
+    def __init__(self, open_worksheet, parse, concat=None, probe=None, full_reload_interval: float = 900.0):
+        self._open_worksheet = open_worksheet
+        self._parse = parse
+        self._concat = concat or (lambda frames: pd.concat(frames, ignore_index=True))
+        self._probe = probe
+        self.full_reload_interval = full_reload_interval
+        self._worksheet = None
+        self._lock = threading.Lock()          # one sync at a time
+        self._publish_lock = threading.Lock()  # frame/version swap
+
+        self.frame = pd.DataFrame()
+        self.header: list[str] | None = None
+        self.header_hash: str | None = None
+        self.rows_synced = 0          # sheet rows consumed, header included
+        self.last_row_hash: str | None = None
+        self.last_full_reload = 0.0
+        self.last_mode = None         # "full" / "delta" / "unchanged" / "restored"
+        self.last_fetched_rows = 0
+        self.last_error: str | None = None
+        self.version: str | None = None   # content token, changes with `frame`
+        # After a delta sync: the version it was appended to and the parsed rows
+        self.parent_version: str | None = None
+        self.last_delta: pd.DataFrame | None = None
+        self.probe_token = None
+        self.rejected = pd.DataFrame()  # rows `parse` could not use, all synced rows
+
+    @property
+    def has_data(self) -> bool:
+        # Published, not just fetched: the header is set before parsing
+        return self.version is not None
+
+    def state(self) -> dict:
+        # High-water mark, persisted next to the snapshot for warm starts
+        return {
+            "header": self.header,
+            "header_hash": self.header_hash,
+            "rows_synced": self.rows_synced,
+            "last_row_hash": self.last_row_hash,
+            "last_full_reload": self.last_full_reload,
+            "version": self.version,
+            "rejected": self.rejected.to_dict("records"),
+        }
+
+    def restore(self, frame: pd.DataFrame, state: dict):
+        with self._lock:
+            self.header = state["header"]
+            self.header_hash = state["header_hash"]
+            self.rows_synced = state["rows_synced"]
+            self.last_row_hash = state["last_row_hash"]
+            self.last_full_reload = state.get("last_full_reload", 0.0)
+            self.last_mode = "restored"
+            self.rejected = pd.DataFrame(state.get("rejected") or [])
+            self._publish(frame, state.get("version") or frame_digest(frame))
+
+    def current(self) -> SyncSnapshot:
+        with self._publish_lock:
+            return SyncSnapshot(self.frame, self.version, self.parent_version, self.last_delta)
+
+    def _publish(self, frame: pd.DataFrame, version: str, parent_version=None, delta=None):
+        # Readers see the old or the new frame, never a half-updated pair
+        with self._publish_lock:
+            self.frame = frame
+            self.version = version
+            self.parent_version = parent_version
+            self.last_delta = delta
+
+    @property
+    def worksheet(self):
+        if self._worksheet is None:
+            self._worksheet = self._open_worksheet()
+        return self._worksheet
+
+    def refresh(self) -> pd.DataFrame:
+        with self._lock:
+            try:
+                stale = time.time() - self.last_full_reload > self.full_reload_interval
+                token = self._probe_token()
+                if self.header is None:
+                    self._full_reload()
+                elif token is not None and token == self.probe_token:
+                    # Nothing changed upstream: no values fetched, and the
+                    # copy counts as verified for the full reload interval
+                    self.last_mode = "unchanged"
+                    self.last_fetched_rows = 0
+                    if stale:
+                        self.last_full_reload = time.time()
+                elif stale:
+                    self._full_reload()
+                else:
+                    self._delta_sync()
+                self.probe_token = token
+            except Exception:
+                # Drop the handle so the next attempt re-authorizes
+                self._worksheet = None
+                raise
+            return self.frame
+
+    def _probe_token(self):
+        if self._probe is None:
+            return None
+        try:
+            return self._probe(self.worksheet)
+        except Exception:
+            # No cheap signal -> fall back to the delta fetch
+            return None
+
+    def _full_reload(self):
+        values = self.worksheet.get_all_values()
+        self.last_mode = "full"
+        self.last_full_reload = time.time()
+        self.last_fetched_rows = len(values)
+
+        if not values:
+            self.header = []
+            self.header_hash = row_hash([])
+            self.rows_synced = 0
+            self.last_row_hash = None
+            self.rejected = pd.DataFrame()
+            self._publish(pd.DataFrame(), frame_digest(pd.DataFrame()))
+            return
+
+        self.header = _trim_row(values[0])
+        self.header_hash = row_hash(self.header)
+        self.rows_synced = len(values)
+        # Only the header's columns, like the delta sync reads it back
+        self.last_row_hash = row_hash(values[-1][:len(self.header)])
+        frame, self.rejected = self._parse_rows(values[1:], first_row=2)
+        self._publish(frame, frame_digest(frame))
+
+    def _delta_sync(self):
+        if not self.header:
+            # Sheet was empty last time, nothing to anchor a delta on
+            self._full_reload()
+            return
+
+        last_col = column_letter(len(self.header))
+        n = self.rows_synced
+        header_vals, last_vals, new_vals = self.worksheet.batch_get([
+            f"A1:{last_col}1",
+            f"A{n}:{last_col}{n}",
+            f"A{n + 1}:{last_col}",
+        ])
+
+        header_row = header_vals[0] if header_vals else []
+        last_row = last_vals[0] if last_vals else []
+        if row_hash(header_row) != self.header_hash or row_hash(last_row) != self.last_row_hash:
+            # Rows edited, deleted or reordered above the mark
+            self._full_reload()
+            return
+
+        new_rows = list(new_vals)
+        # Trailing blank rows are not returned, but blank rows in between are
+        while new_rows and not _trim_row(new_rows[-1]):
+            new_rows.pop()
+
+        self.last_fetched_rows = len(new_rows)
+        if not new_rows:
+            self.last_mode = "unchanged"
+            return
+
+        self.last_mode = "delta"
+        new_df, rejected = self._parse_rows(new_rows, first_row=n + 1)
+        if not rejected.empty:
+            self.rejected = pd.concat([self.rejected, rejected], ignore_index=True)
+        if self.frame.empty:
+            frame = new_df
+        elif not new_df.empty:
+            frame = self._concat([self.frame, new_df])
+        else:
+            frame = self.frame
+        # Chained: O(new rows) instead of rehashing the whole history
+        version = frame_digest(new_df, seed=self.version or "")
+        self._publish(frame, version, parent_version=self.version, delta=new_df)
+        self.rows_synced = n + len(new_rows)
+        self.last_row_hash = row_hash(new_rows[-1])
+
+    def _parse_rows(self, rows: list[list[str]], first_row: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+        if not rows:
+            return pd.DataFrame(), pd.DataFrame()
+        frame, rejected = self._parse(rows_to_frame(self.header, rows, first_row=first_row))
+        return frame, rejected
+
+
+class BackgroundRefresher:
+    """One polling thread per process around a SheetSync.
+
+    `on_change(sync)` runs on the refresher thread whenever a new version
+    is published, the restored snapshot included (snapshot saving, cache
+    invalidation, warming derived artifacts). Errors are kept in
+    `sync.last_error` and the last good frame stays published.
+    """
+
+    def __init__(self, sync: SheetSync, interval: float = 30.0, on_change=None):
+        self.sync = sync
+        self.interval = interval
+        self.on_change = on_change
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._attempted = threading.Event()
+        # Polls started / finished (on_change included), for refresh_now()
+        self._polled = threading.Condition()
+        self._started = 0
+        self._finished = 0
+        self.last_poll = None
+        self._announced = None
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sheet-refresher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def poke(self):
+        # Check upstream now instead of at the next interval
+        self._wake.set()
+
+    def wait_for_data(self, timeout: float | None = None) -> bool:
+        """Block until there is a frame to serve or the first attempt failed."""
+        self.start()
+        if not self.sync.has_data:
+            self._attempted.wait(timeout)
+        return self.sync.has_data
+
+    def refresh_now(self, timeout: float | None = None) -> bool:
+        """Poke and block until a poll started after it has finished; False on timeout."""
+        self.start()
+        with self._polled:
+            target = self._started + 1
+            self.poke()
+            return self._polled.wait_for(lambda: self._finished >= target, timeout)
+
+    def poll_once(self):
+        with self._polled:
+            self._started += 1
+        try:
+            self.sync.refresh()
+        except Exception:
+            self.sync.last_error = traceback.format_exc()
+        else:
+            self.sync.last_error = None
+        finally:
+            self.last_poll = time.time()
+            self._attempted.set()
+
+        # Also announces a restored snapshot, even if the sheet is unreachable
+        version = self.sync.version
+        if version is not None and version != self._announced and self.on_change is not None:
+            self._announced = version
+            try:
+                self.on_change(self.sync)
+            except Exception:
+                traceback.print_exc()
+        with self._polled:
+            self._finished += 1
+            self._polled.notify_all()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll_once()
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+# =========================================================
+#   LOCAL COLUMNAR SNAPSHOT
+#   The normalized frame (kauppa/Ketju/Ryhmä/pvm/hinta already computed)
+#   is kept on disk as one Parquet file per `pvm` month plus a manifest.
+#
+#   <root>/manifest.json          -> months, file names, sync state
+#   <root>/2024-05-<hash>.parquet -> rows with pvm in May 2024
+#
+#   Partition files are named by content hash, so a save only writes the
+#   months that changed (normally just the current one). The manifest is
+#   swapped in with os.replace, so readers see either the old or the new
+#   snapshot, never a mix.
+#
+#   Partitioned history (partitions.py) keeps one such snapshot per
+#   worksheet under <root>/<key hash>/ plus <root>/partitions.json. A
+#   partition is rewritten only when its version changed, so closed years
+#   are written once.
+# =========================================================
+MANIFEST = "manifest.json"
+PARTITION_INDEX = "partitions.json"
+FORMAT_VERSION = 2  # 2: cents prices are no longer divided while parsing
+
+
+def _month_keys(df: pd.DataFrame) -> pd.Series:
+    return df["pvm"].dt.strftime("%Y-%m")
+
+
+def _partition_hash(part: pd.DataFrame) -> str:
+    h = hashlib.sha1()
+    h.update(",".join(map(str, part.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(part, index=False).values.tobytes())
+    return h.hexdigest()[:16]
+
+
+def _atomic_write_bytes(path: str, data: bytes):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def read_manifest(root: str) -> dict | None:
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get("format") != FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def save_snapshot(root: str, df: pd.DataFrame, state: dict | None = None) -> dict:
+    os.makedirs(root, exist_ok=True)
+    old = read_manifest(root) or {}
+    old_files = set(old.get("months", {}).values())
+
+    months = {}
+    if not df.empty:
+        for month, part in df.groupby(_month_keys(df), sort=True):
+            part = part.reset_index(drop=True)
+            name = f"{month}-{_partition_hash(part)}.parquet"
+            if name not in old_files or not os.path.exists(os.path.join(root, name)):
+                tmp = os.path.join(root, f"{name}.tmp-{os.getpid()}")
+                part.to_parquet(tmp, index=False)
+                os.replace(tmp, os.path.join(root, name))
+            months[month] = name
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "saved_at": time.time(),
+        "columns": [str(c) for c in df.columns],
+        "rows": int(len(df)),
+        "months": months,
+        "sync": state,
+    }
+    _atomic_write_bytes(
+        os.path.join(root, MANIFEST),
+        json.dumps(manifest, ensure_ascii=False).encode("utf-8"),
+    )
+
+    # Partitions no longer referenced by the new manifest
+    for name in old_files - set(months.values()):
+        try:
+            os.remove(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
+
+    return manifest
+
+
+def load_snapshot(root: str) -> tuple[pd.DataFrame, dict] | None:
+    manifest = read_manifest(root)
+    if manifest is None:
+        return None
+
+    parts = [
+        pd.read_parquet(os.path.join(root, name))
+        for _, name in sorted(manifest["months"].items())
+    ]
+    if parts:
+        df = pd.concat(parts, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=manifest.get("columns", []))
+    return df, manifest
+
+
+def _partition_dir(key: str) -> str:
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+def save_partitions(root: str, frames: dict[str, pd.DataFrame], state: dict) -> dict:
+    """Snapshot of a PartitionedSync: `frames` per key, `state` from .state()."""
+    os.makedirs(root, exist_ok=True)
+    old = _read_index(root) or {}
+
+    dirs = {}
+    for key, info in state["partitions"].items():
+        if key not in frames:
+            continue
+        name = _partition_dir(key)
+        version = info["sync"].get("version")
+        manifest = read_manifest(os.path.join(root, name))
+        if manifest is None or (manifest.get("sync") or {}).get("version") != version:
+            save_snapshot(os.path.join(root, name), frames[key], {"version": version})
+        dirs[key] = name
+
+    index = {"format": FORMAT_VERSION, "saved_at": time.time(), "dirs": dirs, "sync": state}
+    _atomic_write_bytes(
+        os.path.join(root, PARTITION_INDEX),
+        json.dumps(index, ensure_ascii=False).encode("utf-8"),
+    )
+
+    # Worksheets that disappeared upstream
+    for name in set(old.get("dirs", {}).values()) - set(dirs.values()):
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return index
+
+
+def _read_index(root: str) -> dict | None:
+    try:
+        with open(os.path.join(root, PARTITION_INDEX), encoding="utf-8") as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    if index.get("format") != FORMAT_VERSION:
+        return None
+    return index
+
+
+def load_partitions(root: str) -> tuple[dict[str, pd.DataFrame], dict] | None:
+    # -> (frames per key, PartitionedSync state)
+    index = _read_index(root)
+    if index is None:
+        return None
+
+    frames = {}
+    for key, name in index["dirs"].items():
+        snap = load_snapshot(os.path.join(root, name))
+        expected = index["sync"]["partitions"].get(key, {}).get("sync", {}).get("version")
+        if snap is None or (snap[1].get("sync") or {}).get("version") != expected:
+            # Partition snapshot missing or from another save; refetch it
+            continue
+        frames[key] = snap[0]
+    return frames, index["sync"]
@@ -0,0 +1,122 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# =========================================================
+#   STORE / CHAIN / GROUP MAPPING
+#   Your convention:
+#     SM = K-Supermarket
+#     KM = K-Market
+#   S-Group recognized only from explicit words (Prisma, S-Market, Sale, Alepa)
+# =========================================================
+def normalize_store_name(x: str) -> str:
+    s = str(x).strip()
+    s = re.sub(r"\s+", " ", s)
+    s = re.sub(r"\(\s*", "(", s)
+    s = re.sub(r"\s*\)", ")", s)
+    return s
+
+# Citymarkets in your data are plain location names (no "Citymarket" text)
+CITYMARKET_OVERRIDES = {
+    "Espoo (Iso Omena)",
+    "Jyväskylä (Seppälä)",
+    "Kuopio (Päiväranta)",
+    "Pirkkala",
+    "Rovaniemi",
+    "Seinäjoki (Päivölä)",
+    "Turku (Kupittaa)",
+    "Vaasa (Kivihaka)",
+}
+
+K_CHAIN_ORDER = ["Citymarket", "K-Supermarket", "K-Market"]
+S_CHAIN_ORDER = ["Prisma", "S-Market", "Sale", "Alepa"]
+
+ALLOWED_CHAINS = {
+    "K-Ryhmä": K_CHAIN_ORDER,
+    "S-Ryhmä": S_CHAIN_ORDER,
+}
+
+
+def slug(name: str) -> str:
+    # Group name -> file name part: "K-Ryhmä" -> "k-ryhma"
+    return name.lower().replace("ä", "a").replace("ö", "o").replace(" ", "-")
+
+# Chain rules in priority order, matched against the upper-cased name.
+# The first rule that matches anywhere in the name wins.
+CHAIN_RULES = [
+    # Your abbreviations (inside parentheses)
+    ("K-Supermarket", r"\(\s*SM\b"),
+    ("K-Market", r"\(\s*KM\b"),
+    # If some names contain chain text
+    ("Citymarket", r"CITYMARKET|\(\s*CM\b"),
+    ("K-Supermarket", r"K-SUPERMARKET|\bK[- ]?SUPERMARKET\b"),
+    ("K-Market", r"K-MARKET|\bK[- ]?MARKET\b"),
+    # S-Group ONLY when explicitly written (prevents conflict with your SM=K-supermarket rule)
+    ("Prisma", r"PRISMA"),
+    ("Alepa", r"ALEPA"),
+    ("Sale", r"\bSALE\b"),
+    ("S-Market", r"SM Arabia|SM Leinola|\bS[- ]?MARKET\b"),
+]
+
+# One pass over the name: every rule is an optional lookahead from the start,
+# so each group tells whether that rule matches anywhere (not just leftmost).
+_CHAIN_PATTERN = re.compile(
+    "^" + "".join(f"(?:(?=.*?(?P<r{i}>{pat})))?" for i, (_, pat) in enumerate(CHAIN_RULES)),
+    re.DOTALL,
+)
+_RULE_GROUPS = [f"r{i}" for i in range(len(CHAIN_RULES))]
+
+
+def _chain_of_normalized(n: str) -> str:
+    if n in CITYMARKET_OVERRIDES:
+        return "Citymarket"
+
+    m = _CHAIN_PATTERN.match(n.upper())
+    for group, (chain, _) in zip(_RULE_GROUPS, CHAIN_RULES):
+        if m.group(group) is not None:
+            return chain
+
+    return "Muu"
+
+
+def get_chain(store: str) -> str:
+    return classify_store(normalize_store_name(store))[0]
+
+def get_group(chain: str) -> str:
+    if chain in K_CHAIN_ORDER:
+        return "K-Ryhmä"
+    if chain in S_CHAIN_ORDER:
+        return "S-Ryhmä"
+    return "Muu"
+
+
+@lru_cache(maxsize=None)
+def classify_store(name: str) -> tuple[str, str]:
+    # Normalized store name -> (Ketju, Ryhmä), memoized per process
+    chain = _chain_of_normalized(name)
+    return chain, get_group(chain)
+
+
+def classify_stores(stores: pd.Series) -> pd.DataFrame:
+    """Normalized `kauppa`, `Ketju` and `Ryhmä` for every row of `stores`.
+
+    Only the distinct raw names are normalized and classified; the results
+    are broadcast back to the rows through the factorized codes.
+    """
+    codes, uniques = pd.factorize(stores, use_na_sentinel=False)
+
+    names = np.array([normalize_store_name(x) for x in uniques], dtype=object)
+    classes = [classify_store(n) for n in names]
+    chains = np.array([c for c, _ in classes], dtype=object)
+    groups = np.array([g for _, g in classes], dtype=object)
+
+    return pd.DataFrame(
+        {
+            "kauppa": names.take(codes),
+            "Ketju": chains.take(codes),
+            "Ryhmä": groups.take(codes),
+        },
+        index=stores.index,
+    )
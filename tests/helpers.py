@@ -0,0 +1,22 @@
+import pandas as pd
+
+from bench.synthetic import HEADER, generate_rows
+from dataset import concat_frames
+from parsing import normalize_frame
+from sheet_sync import rows_to_frame
+
+
+def frame(rows: list[list[str]]) -> pd.DataFrame:
+    # Sheet rows (without the header) -> the dashboard's frame
+    return normalize_frame(rows_to_frame(HEADER, rows)).reset_index(drop=True)
+
+
+def synthetic_frame(stores: int = 12, products: int = 8, dates: int = 10, seed: int = 1) -> pd.DataFrame:
+    return frame(generate_rows(stores, products, dates, seed=seed)[1:])
+
+
+def split_last_date(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    # (history, last survey date's rows, both concatenated like a delta sync)
+    last = df["pvm"] == df["pvm"].max()
+    history, delta = df[~last].reset_index(drop=True), df[last].reset_index(drop=True)
+    return history, delta, concat_frames([history, delta])
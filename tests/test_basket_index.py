@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from basket_index import BasketIndex, carry_forward, common_basket
+from price_cube import PriceCube
+from tests.helpers import frame
+
+PRISMA, KM = "Prisma Kaleva", "Tampere (KM Hervanta)"
+A, B, C = "Peruna 1 kg", "Porkkana 1 kg", "Sipuli 1 kg"
+DATES = ["2024-01-01", "2024-01-08", "2024-01-15", "2024-01-22"]
+
+
+def cube() -> PriceCube:
+    prices = [
+        # Prisma: B missing on the 2nd date (carried forward); C only once
+        (0, PRISMA, A, "1,00"), (0, PRISMA, B, "2,00"), (0, PRISMA, C, "0,90"),
+        (1, PRISMA, A, "1,10"),
+        (2, PRISMA, A, "1,10"), (2, PRISMA, B, "2,20"),
+        (3, PRISMA, A, "1,21"), (3, PRISMA, B, "2,20"),
+        # K-Market: B only from the 2nd date, nothing on the last one
+        (0, KM, A, "2,00"),
+        (1, KM, B, "3,00"),
+        (2, KM, A, "2,20"),
+    ]
+    return PriceCube.from_frame(frame([[DATES[d], store, product, "", price] for d, store, product, price in prices]))
+
+
+def values(series: pd.DataFrame, member: str, column: str) -> list:
+    return series.loc[series["Ketju"] == member, column].tolist()
+
+
+def test_carry_forward():
+    prices = np.array([[[1.0, np.nan], [np.nan, 2.0], [3.0, np.nan]]])
+    np.testing.assert_array_equal(carry_forward(prices), [[[1.0, np.nan], [1.0, 2.0], [3.0, 2.0]]])
+
+
+def test_common_basket():
+    assert common_basket(cube(), ["Prisma", "K-Market"]) == [A, B]
+    # Only one chain has prices: its products
+    assert common_basket(cube(), ["Prisma", "Alepa"]) == [A, B, C]
+    assert common_basket(cube(), ["Alepa"]) == []
+
+
+def test_chained_index_by_hand():
+    index = BasketIndex(cube(), "Ketju", ["Prisma", "K-Market", "Alepa"], [A, B])
+    # Alepa has no basket prices and drops out
+    assert index.members == ["Prisma", "K-Market"]
+    series = index.series()
+
+    # Prisma: links 3.10/3.00, 3.30/3.10, 3.41/3.30 -> the basket cost ratio
+    assert values(series, "Prisma", "Indeksi") == pytest.approx([100, 310 / 3, 110, 341 / 3])
+    assert values(series, "Prisma", "Korin hinta") == pytest.approx([3.0, 3.1, 3.3, 3.41])
+
+    # K-Market: 1st link only over A (B not priced yet), then (2.20 + 3.00) / (2.00 + 3.00)
+    assert values(series, "K-Market", "Indeksi") == pytest.approx([100, 100, 104, 104])
+    costs = values(series, "K-Market", "Korin hinta")
+    assert np.isnan(costs[0]) and costs[1:] == pytest.approx([5.0, 5.2, 5.2])
+
+
+def test_rebased_at_the_range_start():
+    series = BasketIndex(cube(), "Ketju", ["Prisma"], [A, B]).series(pd.Timestamp(DATES[1]), pd.Timestamp(DATES[2]))
+    assert series["pvm"].tolist() == [pd.Timestamp(DATES[1]), pd.Timestamp(DATES[2])]
+    assert values(series, "Prisma", "Indeksi") == pytest.approx([100, 100 * 3.3 / 3.1])
+
+
+def test_empty_basket():
+    index = BasketIndex(cube(), "Ketju", ["Prisma", "K-Market"], [])
+    assert index.empty and index.members == []
+    assert index.series().empty
+    assert BasketIndex(cube(), "Ketju", ["Prisma"], [A]).series("2025-01-01", "2025-02-01").empty
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from chart_data import limit_points, lttb_indices
+
+
+def melted(n_products: int, n_dates: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    days = pd.date_range("2024-01-01", periods=n_dates, freq="D")
+    return pd.DataFrame({
+        "pvm": np.tile(days, n_products),
+        "tuote": np.repeat([f"Tuote {i}" for i in range(n_products)], n_dates),
+        "Mittari": "Keskiarvo",
+        "Hinta": rng.uniform(1, 3, n_products * n_dates),
+    })
+
+
+def test_lttb_keeps_ends():
+    x = np.arange(100, dtype=float)
+    idx = lttb_indices(x, np.sin(x / 5), 10)
+    assert len(idx) == 10 and idx[0] == 0 and idx[-1] == 99
+
+
+def test_limit_points_thins_each_line():
+    out = limit_points(melted(10, 1000), max_points=400)
+    assert len(out) == 400
+    assert out.groupby("tuote").size().eq(40).all()
+
+
+def test_limit_points_caps_many_lines():
+    # More lines than max_points // 3: each line shrinks to its ends, then
+    # to its latest point, then lines are dropped
+    for n_products, per_line in [(150, 2), (300, 1), (700, 1)]:
+        out = limit_points(melted(n_products, 20), max_points=400)
+        assert len(out) <= 400
+        assert out.groupby("tuote").size().eq(per_line).all()
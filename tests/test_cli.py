@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+from cli import write_matrices
+from matrix import AsOfPrices
+from stores import slug
+from tests.helpers import synthetic_frame
+
+
+def test_matrices_are_same_day_by_default(tmp_path):
+    asof = AsOfPrices(synthetic_frame(stores=14, products=6, dates=8))
+    (tmp_path / "default").mkdir()
+    (tmp_path / "carried").mkdir()
+    default = write_matrices(asof, str(tmp_path / "default"))
+    carried = write_matrices(asof, str(tmp_path / "carried"), max_age=None)
+    assert [os.path.basename(p) for p in default] == [os.path.basename(p) for p in carried]
+    assert "hintamatriisi-k-ryhma-" in default[0]
+    same_day = sum(pd.read_csv(p).iloc[:, 2:].notna().sum().sum() for p in default)
+    all_known = sum(pd.read_csv(p).iloc[:, 2:].notna().sum().sum() for p in carried)
+    assert same_day < all_known
+
+
+def test_slug():
+    assert slug("K-Ryhmä") == "k-ryhma"
+    assert slug("S Ryhmä") == "s-ryhma"
+
+
+def test_cli_does_not_import_the_export_stack():
+    code = "import sys, cli; print('exports' in sys.modules or 'pyarrow.parquet' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert out.stdout.strip() == "False"
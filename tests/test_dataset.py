@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from dataset import compact_frame, concat_frames, price64
+from tests.helpers import frame
+
+
+def test_price64_is_exact():
+    # Half-cent and cent prices don't survive float32 as such
+    prices = np.array([0.285, 1.005, 2.49, 12.345, 0.1, 199.99, 799.9999])
+    stored = compact_frame(pd.DataFrame({"hinta": prices}))["hinta"]
+    assert stored.dtype == "float32"
+    np.testing.assert_array_equal(price64(stored).to_numpy(), prices)
+    assert price64(stored).mean() == prices.mean()
+
+
+def test_concat_keeps_compact_layout():
+    a = frame([["2024-01-01", "K-Market Testi", "Peruna 1 kg", "6400000000017", "2,49"]])
+    b = frame([["2024-01-08", "Prisma Testi", "Porkkana 1 kg", "6400000000024", "1,19"]])
+    out = concat_frames([a, b])
+    for col in ["kauppa", "tuote", "ean", "Ketju", "Ryhmä"]:
+        assert isinstance(out[col].dtype, pd.CategoricalDtype)
+    assert out["hinta"].dtype == "float32"
+    assert list(out["tuote"].astype(str)) == ["Peruna 1 kg", "Porkkana 1 kg"]
@@ -0,0 +1,132 @@
+import datetime
+import io
+import re
+import tracemalloc
+import xml.etree.ElementTree as ET
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import exports
+from dataset import price64
+from exports import SELECTION_COLUMNS, matrix_chunks, selection_chunks, selection_rows, write_export
+from filter_index import FilterIndex
+from matrix import AsOfPrices
+from stores import ALLOWED_CHAINS
+from tests.helpers import synthetic_frame
+
+NS = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def read_xlsx(data: bytes) -> list[list[list]]:
+    # Rows of every sheet, without openpyxl: inline strings and numbers
+    # as xlsxwriter's constant_memory mode writes them; blank = None
+    sheets = []
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        names = sorted((n for n in z.namelist() if n.startswith("xl/worksheets/sheet")),
+                       key=lambda n: int(re.search(r"(\d+)\.xml$", n).group(1)))
+        for name in names:
+            rows = []
+            for row in ET.fromstring(z.read(name)).iter(f"{{{NS['m']}}}row"):
+                cells = {}
+                for c in row.findall("m:c", NS):
+                    col = sum((ord(ch) - 64) * 26 ** i for i, ch in enumerate(reversed(re.match(r"[A-Z]+", c.get("r")).group())))
+                    text = c.find("m:is/m:t", NS)
+                    value = c.find("m:v", NS)
+                    cells[col - 1] = (text.text or "") if text is not None else float(value.text)
+                rows.append([cells.get(i) for i in range(max(cells) + 1)] if cells else [])
+            sheets.append(rows)
+    return sheets
+
+
+def selection():
+    df = synthetic_frame(stores=10, products=6, dates=10)
+    fidx = FilterIndex(df)
+    products = sorted(df["tuote"].astype(str).unique())[:4]
+    stores = sorted(df["kauppa"].astype(str).unique())
+    rows = selection_rows(fidx, fidx.min_date, fidx.max_date, products, stores)
+    expected = fidx.take(rows)[SELECTION_COLUMNS].reset_index(drop=True)
+    return fidx, rows, expected.assign(hinta=price64(expected["hinta"]))
+
+
+def test_csv_round_trip_and_chunking():
+    fidx, rows, expected = selection()
+    data = write_export(selection_chunks(fidx, rows, chunk_rows=7), "CSV")
+    assert data == write_export(selection_chunks(fidx, rows, chunk_rows=len(rows)), "CSV")
+    back = pd.read_csv(io.BytesIO(data), encoding="utf-8-sig", dtype={"ean": str}, parse_dates=["pvm"])
+    assert len(back) == len(expected)
+    for col in ["Ryhmä", "Ketju", "kauppa", "tuote", "ean"]:
+        assert back[col].fillna("").tolist() == expected[col].astype(str).tolist()
+    assert (back["pvm"] == expected["pvm"]).all()
+    np.testing.assert_array_equal(back["hinta"].to_numpy(), expected["hinta"].to_numpy())
+
+
+def test_parquet_round_trip_and_chunking():
+    fidx, rows, expected = selection()
+    data = write_export(selection_chunks(fidx, rows, chunk_rows=7), "Parquet")
+    assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == -(-len(rows) // 7)
+    back = pq.read_table(io.BytesIO(data)).to_pandas()
+    single = pq.read_table(io.BytesIO(write_export(selection_chunks(fidx, rows), "Parquet"))).to_pandas()
+    pd.testing.assert_frame_equal(back, single)
+    pd.testing.assert_frame_equal(back.astype({c: str for c in ["Ryhmä", "Ketju", "kauppa", "tuote", "ean"]}),
+                                  expected.astype({c: str for c in ["Ryhmä", "Ketju", "kauppa", "tuote", "ean"]}),
+                                  check_dtype=False)
+
+
+def test_xlsx_round_trip_and_sheet_rollover(monkeypatch):
+    fidx, rows, expected = selection()
+    monkeypatch.setattr(exports, "XLSX_MAX_ROWS", 40)
+    sheets = read_xlsx(write_export(selection_chunks(fidx, rows, chunk_rows=15), "XLSX"))
+    assert len(sheets) == -(-len(rows) // 40)
+    assert all(sheet[0] == SELECTION_COLUMNS for sheet in sheets)
+    assert [len(sheet) - 1 for sheet in sheets[:-1]] == [40] * (len(sheets) - 1)
+    body = [row for sheet in sheets for row in sheet[1:]]
+    assert len(body) == len(expected)
+    epoch = datetime.datetime(1899, 12, 30)
+    for row, want in zip(body, expected.itertuples(index=False)):
+        assert epoch + datetime.timedelta(days=row[0]) == want.pvm
+        assert row[1:6] == [str(v) for v in want[1:6]]
+        assert (row[6] if len(row) > 6 else None) == (None if np.isnan(want.hinta) else want.hinta)
+
+
+def test_empty_selection_has_a_header():
+    fidx, _, _ = selection()
+    none = np.empty(0, dtype=np.int64)
+    assert write_export(selection_chunks(fidx, none), "CSV").decode("utf-8-sig").strip() == ",".join(SELECTION_COLUMNS)
+    assert read_xlsx(write_export(selection_chunks(fidx, none), "XLSX")) == [[SELECTION_COLUMNS]]
+
+
+def test_matrix_directions_match_the_table():
+    asof = AsOfPrices(synthetic_frame(stores=14, products=6, dates=8))
+    chains = ALLOWED_CHAINS["K-Ryhmä"]
+    days = asof.survey_dates(chains)
+    matrix = asof.matrix(days[-1], days[-2], chains, max_age_days=0)
+    exported = pd.concat(matrix_chunks(matrix, chunk_rows=4), ignore_index=True)
+    table = matrix.table
+    assert exported["tuote"].tolist() == table["tuote"].astype(str).tolist()
+    seen = set()
+    for (chain, store), name in zip(matrix.columns, [f"{c} / {s}" for c, s in matrix.columns]):
+        for price, direction, cell in zip(exported[name], exported[f"{name} suunta"], table[(chain, store)]):
+            if np.isnan(price):
+                assert direction == "" and pd.isna(cell)
+            else:
+                assert cell == f"{price:.2f} €" + (f" {direction}" if direction else "")
+                seen.add(direction)
+    assert {"▲", "▼", "➖"} <= seen
+
+
+def test_finished_file_is_held_once():
+    fidx, rows, _ = selection()
+    rows = np.tile(rows, 40)
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        data = write_export(selection_chunks(fidx, rows, chunk_rows=500), "CSV")
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    # The file plus about one chunk, not two copies of the file
+    assert peak < 1.5 * len(data)
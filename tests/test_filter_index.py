@@ -0,0 +1,94 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from exports import selection_rows
+from filter_index import FilterIndex
+from stores import ALLOWED_CHAINS
+from tests.helpers import synthetic_frame
+
+GROUPS = ["Kaikki", "K-Ryhmä", "S-Ryhmä"]
+
+
+def baseline_sidebar(df: pd.DataFrame, group: str, chain: str):
+    # The dashboard's sidebar before the index: chains, then df_sb -> pickers
+    if group == "Kaikki":
+        chains_avail = sorted([c for c in df["Ketju"].unique() if c != "Muu"])
+    else:
+        chains_avail = sorted(df[df["Ketju"].isin(ALLOWED_CHAINS[group])]["Ketju"].unique())
+    df_sb = df.copy()
+    if group != "Kaikki":
+        df_sb = df_sb[df_sb["Ketju"].isin(ALLOWED_CHAINS[group])]
+    if chain != "Kaikki":
+        df_sb = df_sb[df_sb["Ketju"] == chain]
+    return chains_avail, sorted(df_sb["tuote"].dropna().unique()), sorted(df_sb["kauppa"].dropna().unique())
+
+
+def baseline_mask(df: pd.DataFrame, start_date, end_date, products, stores) -> pd.Series:
+    return (
+        (df["pvm"].dt.date >= start_date) & (df["pvm"].dt.date <= end_date)
+        & df["tuote"].isin(products) & df["kauppa"].isin(stores)
+    )
+
+
+def pick(rng, values: list, extra=None) -> list:
+    out = [values[i] for i in sorted(rng.choice(len(values), rng.integers(0, len(values) + 1), replace=False))]
+    if extra is not None and rng.random() < 0.2:
+        out.append(extra)  # a value not in the data (e.g. from an old session)
+    return out
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_matches_pandas_masks(seed):
+    rng = np.random.default_rng(seed)
+    df = synthetic_frame(stores=24, products=7, dates=9, seed=seed)
+    fidx = FilterIndex(df)
+    frame = fidx.frame
+    pd.testing.assert_frame_equal(frame, df.sort_values("pvm", kind="stable").reset_index(drop=True))
+
+    days = [d.date() for d in pd.date_range(fidx.min_date - datetime.timedelta(days=2),
+                                            fidx.max_date + datetime.timedelta(days=2))]
+    hits = 0
+    for _ in range(40):
+        group = GROUPS[rng.integers(len(GROUPS))]
+        chains_avail, all_p, all_s = baseline_sidebar(df, group, "Kaikki")
+        assert fidx.chains(group) == chains_avail
+        chain = (["Kaikki"] + chains_avail)[rng.integers(len(chains_avail) + 1)]
+        _, all_p, all_s = baseline_sidebar(df, group, chain)
+        assert fidx.picker_lists(group, chain) == (all_p, all_s)
+
+        products = pick(rng, all_p, extra="Ei tuotetta")
+        stores = pick(rng, all_s, extra="Ei kauppaa")
+        start_date, end_date = sorted(days[i] for i in rng.integers(len(days), size=2))
+
+        expected = np.flatnonzero(baseline_mask(frame, start_date, end_date, products, stores))
+        rows = selection_rows(fidx, start_date, end_date, products, stores)
+        assert np.array_equal(rows, expected)
+        hits += len(rows) > 0
+        pd.testing.assert_frame_equal(
+            fidx.take(rows).reset_index(drop=True),
+            df[baseline_mask(df, start_date, end_date, products, stores)]
+            .sort_values("pvm", kind="stable").reset_index(drop=True),
+        )
+
+        # rows/restrict on their own, without a date range
+        chains = pick(rng, chains_avail)
+        by_chain = fidx.rows("Ketju", chains)
+        assert np.array_equal(by_chain, np.flatnonzero(frame["Ketju"].isin(chains)))
+        assert np.array_equal(
+            fidx.restrict(by_chain, "kauppa", stores),
+            np.flatnonzero(frame["Ketju"].isin(chains) & frame["kauppa"].isin(stores)),
+        )
+    assert hits >= 10
+
+
+def test_latest_dates():
+    df = synthetic_frame(stores=6, products=3, dates=5, seed=4)
+    fidx = FilterIndex(df)
+    dates = sorted(df["pvm"].unique(), reverse=True)
+    assert fidx.latest_dates(n=2) == [pd.Timestamp(d) for d in dates[:2]]
+    rows = fidx.rows("kauppa", [df["kauppa"].iloc[0]])
+    own = sorted(df.loc[df["kauppa"] == df["kauppa"].iloc[0], "pvm"].unique(), reverse=True)
+    assert fidx.latest_dates(rows, n=3) == [pd.Timestamp(d) for d in own[:3]]
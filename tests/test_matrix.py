@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+from matrix import MATRIX_PAGE_COLS, MATRIX_PAGE_ROWS, AsOfPrices, PriceMatrix, page_count, page_slice
+from stores import ALLOWED_CHAINS
+from tests.helpers import synthetic_frame
+
+
+def old_pivot(df: pd.DataFrame, chains: list[str], day_now, day_prev) -> dict:
+    # The matrix before the as-of prices: rows of the two survey dates only
+    m_df = df[df["Ketju"].isin(chains)]
+    latest = m_df[m_df["pvm"] == day_now].rename(columns={"hinta": "price_now"})
+    prev = m_df[m_df["pvm"] == day_prev][["kauppa", "tuote", "ean", "hinta"]].rename(columns={"hinta": "price_prev"})
+    merged = pd.merge(latest, prev, on=["kauppa", "tuote", "ean"], how="left")
+    cells = {}
+    for row in merged.itertuples():
+        p, pr = float(np.float32(row.price_now)), float(np.float32(row.price_prev))
+        if np.isnan(p):
+            continue
+        arrow = "" if np.isnan(pr) else " ▲" if p > pr else " ▼" if p < pr else " ➖"
+        cells.setdefault((row.tuote, row.ean, row.Ketju, row.kauppa), f"{p:.2f} €{arrow}")
+    return cells
+
+
+def cells(matrix) -> dict:
+    table = matrix.table.set_index(["tuote", "ean"])
+    stacked = table.stack(level=[0, 1], future_stack=True).dropna()
+    return {(t, e, chain, store): v for (t, e, chain, store), v in stacked.items()}
+
+
+def test_same_day_matrix_matches_old_pivot():
+    df = synthetic_frame(stores=14, products=6, dates=8)
+    asof = AsOfPrices(df)
+    for group, chains in ALLOWED_CHAINS.items():
+        days = asof.survey_dates(chains)
+        for day_prev, day_now in [(days[-2], days[-1]), (days[0], days[3])]:
+            matrix = asof.matrix(day_now, day_prev, chains, max_age_days=0)
+            expected = old_pivot(df, chains, pd.Timestamp(day_now), pd.Timestamp(day_prev))
+            assert cells(matrix) == expected, group
+            assert not matrix.stale.any()
+
+
+def test_carried_prices_are_stale():
+    df = synthetic_frame(stores=14, products=6, dates=8)
+    asof = AsOfPrices(df)
+    chains = ALLOWED_CHAINS["K-Ryhmä"]
+    day = asof.survey_dates(chains)[-1]
+    same_day = asof.matrix(day, None, chains, max_age_days=0)
+    carried = asof.matrix(day, None, chains)
+    n_same = int((~np.isnan(same_day.prices)).sum())
+    n_carried = int((~np.isnan(carried.prices)).sum())
+    assert n_carried - n_same == int(carried.stale.sum())
+
+
+def price_matrix(products: list[tuple[str, str]], stores: list[tuple[str, str]]) -> PriceMatrix:
+    rows = pd.MultiIndex.from_tuples(products, names=["tuote", "ean"])
+    columns = pd.MultiIndex.from_tuples(stores, names=["Ketju", "kauppa"])
+    shape = (len(rows), len(columns))
+    prices = np.arange(shape[0] * shape[1], dtype=np.float32).reshape(shape) / 100 + 1
+    return PriceMatrix(rows, columns, prices, np.zeros(shape, dtype=np.int8))
+
+
+STORES = [
+    ("K-Market", "K-Market Kamppi"),
+    ("Prisma", "Prisma Itis"),
+    ("K-Market", "K-Market Töölö"),
+    ("Alepa", "Alepa Kallio"),
+]
+
+
+def test_search_is_case_insensitive():
+    matrix = price_matrix([
+        ("Peruna Rosamunda 1kg", "6410000000011"),
+        ("PERUNA kiinteä 2kg", "6410000000028"),
+        ("Porkkana 1kg", "6410000000035"),
+    ], STORES)
+    for text in ["peruna", "PERUNA", "  Peruna "]:
+        assert matrix.search(text).tolist() == [0, 1]
+    assert matrix.search("KIINTEÄ").tolist() == [1]
+    assert matrix.search("0035").tolist() == [2]
+    assert matrix.search("").tolist() == matrix.search("   ").tolist() == [0, 1, 2]
+    assert matrix.search("lanttu").tolist() == []
+
+
+def test_column_positions_by_chain_and_store():
+    matrix = price_matrix([("Peruna", "1")], STORES)
+    assert matrix.column_positions().tolist() == [0, 1, 2, 3]
+    # The multiselects pass [] for "no filter"
+    assert matrix.column_positions([], []).tolist() == [0, 1, 2, 3]
+    assert matrix.column_positions(["K-Market"]).tolist() == [0, 2]
+    assert matrix.column_positions(["K-Market", "Alepa"]).tolist() == [0, 2, 3]
+    assert matrix.column_positions(stores=["Prisma Itis"]).tolist() == [1]
+    assert matrix.column_positions(["K-Market"], ["K-Market Töölö", "Prisma Itis"]).tolist() == [2]
+    assert matrix.column_positions(["Alepa"], ["Prisma Itis"]).tolist() == []
+    assert matrix.column_positions(["S-Market"]).tolist() == []
+
+
+def test_pages_cover_the_view_once():
+    n_rows, n_cols = 2 * MATRIX_PAGE_ROWS + 7, MATRIX_PAGE_COLS + 3
+    matrix = price_matrix(
+        [(f"Tuote {i:03d}", f"64100{i:08d}") for i in range(n_rows)],
+        [("K-Market", f"K-Market {j:03d}") for j in range(n_cols)],
+    )
+    view_rows, view_cols = matrix.search("tuote"), matrix.column_positions()
+    row_pages, col_pages = page_count(len(view_rows), MATRIX_PAGE_ROWS), page_count(len(view_cols), MATRIX_PAGE_COLS)
+    assert (row_pages, col_pages) == (3, 2)
+
+    rows = [page_slice(view_rows, p, MATRIX_PAGE_ROWS) for p in range(1, row_pages + 1)]
+    cols = [page_slice(view_cols, p, MATRIX_PAGE_COLS) for p in range(1, col_pages + 1)]
+    assert [len(r) for r in rows] == [MATRIX_PAGE_ROWS, MATRIX_PAGE_ROWS, 7]
+    assert [len(c) for c in cols] == [MATRIX_PAGE_COLS, 3]
+    assert np.concatenate(rows).tolist() == list(range(n_rows))
+    assert np.concatenate(cols).tolist() == list(range(n_cols))
+
+    # Last partial page of both: the right cells, tuote/ean first
+    last = matrix.frame(rows[-1], cols[-1])
+    assert last.shape == (7, 2 + 3)
+    assert last["tuote"].tolist() == [f"Tuote {i:03d}" for i in range(n_rows - 7, n_rows)]
+    assert last.iloc[-1, -1] == f"{matrix.prices[-1, -1]:.2f} €"
+
+    # A search filling exactly one page has no second page
+    one_page = matrix.search("tuote 0")[:MATRIX_PAGE_ROWS]
+    assert page_count(len(one_page), MATRIX_PAGE_ROWS) == 1
+
+
+def test_empty_search_is_one_empty_page():
+    matrix = price_matrix([("Peruna", "1"), ("Porkkana", "2")], STORES)
+    view_rows = matrix.search("lanttu")
+    assert page_count(len(view_rows), MATRIX_PAGE_ROWS) == 1
+    page_rows = page_slice(view_rows, 1, MATRIX_PAGE_ROWS)
+    assert len(page_rows) == 0
+    assert matrix.frame(page_rows, matrix.column_positions()).empty
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from parsing import REJECT_AMBIGUOUS_DATE, REJECT_BAD_DATE, REJECT_NO_DATE, parse_date, parse_price, parse_sheet
+from sheet_sync import rows_to_frame
+
+HEADER = ["pvm", "kauppa", "tuote", "EAN", "hinta"]
+
+
+def test_dates():
+    assert parse_date("2024-03-04") == np.datetime64("2024-03-04")
+    assert parse_date("4.3.2024") == np.datetime64("2024-03-04")
+    assert parse_date("13/03/2024") == np.datetime64("2024-03-13")
+    assert parse_date("03/13/2024") == np.datetime64("2024-03-13")
+    assert parse_date("03/03/2024") == np.datetime64("2024-03-03")
+    assert np.isnat(parse_date("03/04/2024"))
+    assert parse_date.cache_info().maxsize is not None
+
+
+def test_prices():
+    assert parse_price("2,49") == 2.49
+    assert parse_price("1 299,00 €") == 1299.0
+    assert np.isnan(parse_price("halpa"))
+
+
+def test_rejected_rows():
+    rows = [
+        ["2024-03-04", "K-Market Testi", "Peruna 1 kg", "6400000000017", "2,49"],
+        ["", "K-Market Testi", "Peruna 1 kg", "6400000000017", "2,49"],
+        ["03/04/2024", "K-Market Testi", "Peruna 1 kg", "6400000000017", "2,49"],
+        ["4.3.", "K-Market Testi", "Peruna 1 kg", "6400000000017", "2,49"],
+        ["2024-03-04", "Prisma Testi", "Peruna 1 kg", "6400000000017", "halpa"],
+    ]
+    result = parse_sheet(rows_to_frame(HEADER, rows))
+    assert list(result.frame.index) == [2, 6]
+    assert np.isnan(result.frame["hinta"].iloc[1])
+    assert result.rejected["rivi"].tolist() == [3, 4, 5, 6]
+    assert result.rejected["syy"].tolist()[:3] == [REJECT_NO_DATE, REJECT_AMBIGUOUS_DATE, REJECT_BAD_DATE]
+    assert isinstance(result.frame["kauppa"].dtype, pd.CategoricalDtype)
@@ -0,0 +1,55 @@
+import datetime
+
+from bench.fake_gspread import FakeSpreadsheet
+from bench.synthetic import generate_rows
+from dataset import concat_frames
+from parsing import parse_sheet
+from partitions import PartitionedSync, discover_partitions
+
+TODAY = datetime.date(2024, 6, 1)
+
+
+def sheets():
+    rows = generate_rows(5, 3, 9, seed=2)
+    header, body = rows[0], rows[1:]
+    main = FakeSpreadsheet("Potwell Data", {
+        "Sheet1": [header] + body[30:],
+        "K-Ryhmä 2024": [header] + body[15:30],
+    })
+    archive = FakeSpreadsheet("Potwell 2023", {"Vanhat": [header] + body[:15]})
+    return main, archive
+
+
+def make_sync(main, archive) -> PartitionedSync:
+    return PartitionedSync(lambda: [main, archive], parse=parse_sheet, concat=concat_frames, today=lambda: TODAY)
+
+
+def rebuilt(main, archive):
+    sync = make_sync(main, archive)
+    sync.refresh()
+    return sync.frame
+
+
+def test_order_closed_then_open_main_last():
+    main, archive = sheets()
+    titles = [p.title for p in discover_partitions([main, archive], TODAY.year)]
+    assert titles == ["Potwell 2023 / Vanhat", "Potwell Data / K-Ryhmä 2024", "Potwell Data / Sheet1"]
+
+
+def test_appends_keep_rebuild_order():
+    main, archive = sheets()
+    sync = make_sync(main, archive)
+    sync.refresh()
+    extra = [["2024-05-27", *r[1:]] for r in main.sheet1.rows[1:4]]
+
+    # Main worksheet is last: appended as a delta
+    main.sheet1.append_rows(extra)
+    sync.refresh()
+    assert sync.last_mode == "delta" and len(sync.last_delta) == len(extra)
+    assert sync.frame.equals(rebuilt(main, archive))
+
+    # An earlier open partition: rebuilt in partition order
+    main.worksheet("K-Ryhmä 2024").append_rows(extra)
+    sync.refresh()
+    assert sync.last_mode == "full"
+    assert sync.frame.equals(rebuilt(main, archive))
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from price_changes import SERIES_KEYS, ChangeIndex
+from tests.helpers import split_last_date, synthetic_frame
+
+
+def brute_force_since(df: pd.DataFrame, day) -> pd.DataFrame:
+    # Series by series: price at the end of `day` against the latest price
+    day = pd.Timestamp(day)
+    out = []
+    obs = df.assign(price=df["hinta"].astype("float64").round(4)).dropna(subset=["price"])
+    for key, series in obs.groupby(SERIES_KEYS, observed=True, sort=False):
+        series = series.drop_duplicates("pvm").sort_values("pvm", kind="stable")
+        before = series[series["pvm"] <= day]
+        if before.empty:
+            continue
+        old, new = before["price"].iloc[-1], series["price"].iloc[-1]
+        if old == new:
+            continue
+        after = series[series["pvm"] > day]
+        prices = np.r_[old, after["price"].to_numpy()]
+        changed = after["pvm"].to_numpy()[prices[1:] != prices[:-1]]
+        out.append((*map(str, key), old, new, changed[-1], len(changed)))
+    return pd.DataFrame(out, columns=SERIES_KEYS + ["Vanha", "Uusi", "Muutettu", "Muutoksia"])
+
+
+def comparable(table: pd.DataFrame) -> pd.DataFrame:
+    table = table[SERIES_KEYS + ["Vanha", "Uusi", "Muutettu", "Muutoksia"]].astype({c: str for c in SERIES_KEYS})
+    return table.sort_values(SERIES_KEYS).reset_index(drop=True).astype({"Muutoksia": "int64"})
+
+
+def test_since_matches_brute_force():
+    df = synthetic_frame(stores=10, products=6, dates=12)
+    index = ChangeIndex.from_frame(df)
+    days = np.unique(df["pvm"].to_numpy())
+    for day in days[[0, 3, len(days) // 2, -2, -1]]:
+        pd.testing.assert_frame_equal(comparable(index.since(day)), comparable(brute_force_since(df, day)))
+
+
+def test_extend_matches_rebuild():
+    df = synthetic_frame(stores=10, products=6, dates=12)
+    history, delta, full = split_last_date(df)
+    extended = ChangeIndex.from_frame(history).extend(delta)
+    rebuilt = ChangeIndex.from_frame(full)
+    # Same events; within a date the series may come in another order
+    events = [i.events.astype(str).sort_values(["pvm"] + SERIES_KEYS).reset_index(drop=True)
+              for i in (extended, rebuilt)]
+    pd.testing.assert_frame_equal(*events)
+    assert extended.last == rebuilt.last
+    assert ChangeIndex.from_frame(full).extend(history.iloc[:10]) is None
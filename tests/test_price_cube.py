@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from dataset import concat_frames
+from price_cube import LEVEL_KEYS, PriceCube
+from tests.helpers import split_last_date, synthetic_frame
+
+
+def sorted_level(cube: PriceCube, level: str) -> pd.DataFrame:
+    keys = ["pvm", "tuote", "kauppa", "Ketju", "Ryhmä"] if level == "kauppa" else LEVEL_KEYS[level]
+    table = cube.levels[level].astype({k: str for k in keys if k != "pvm"})
+    return table.sort_values(keys).reset_index(drop=True)[sorted(table.columns)]
+
+
+def assert_same_cube(a: PriceCube, b: PriceCube):
+    for level in ("kauppa", "Ketju", "Ryhmä", "all"):
+        pd.testing.assert_frame_equal(sorted_level(a, level), sorted_level(b, level), check_dtype=False)
+
+
+def test_extend_matches_rebuild():
+    df = synthetic_frame()
+    history, delta, full = split_last_date(df)
+    assert_same_cube(PriceCube.from_frame(history).extend(delta), PriceCube.from_frame(full))
+
+
+def test_extend_into_the_last_date():
+    # Part of the last date first, the rest as the delta
+    df = synthetic_frame()
+    history, delta, _ = split_last_date(df)
+    first, rest = delta.iloc[: len(delta) // 2], delta.iloc[len(delta) // 2:]
+    extended = PriceCube.from_frame(concat_frames([history, first])).extend(rest)
+    assert_same_cube(extended, PriceCube.from_frame(concat_frames([history, first, rest])))
+
+
+def test_kpis_match_the_rows():
+    df = synthetic_frame()
+    cube = PriceCube.from_frame(df)
+    products = sorted(df["tuote"].astype(str).unique())[:2]
+    stores = sorted(df["kauppa"].astype(str).unique())[:5]
+    kpis = cube.kpis(cube.select(df["pvm"].min(), df["pvm"].max(), products, stores))
+
+    rows = df[df["tuote"].isin(products) & df["kauppa"].isin(stores)]
+    rows = rows.assign(hinta=rows["hinta"].astype("float64").round(4)).dropna(subset=["hinta"])
+    means = rows.groupby("pvm")["hinta"].mean()
+    np.testing.assert_allclose(kpis["latest_avg"], means.iloc[-1])
+    np.testing.assert_allclose(kpis["delta"], means.iloc[-1] - means.iloc[-2])
+    np.testing.assert_allclose([kpis["min"], kpis["max"]], [rows["hinta"].min(), rows["hinta"].max()])
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from price_quality import QualityReport
+from tests.helpers import frame, split_last_date, synthetic_frame
+
+
+def test_cents_typo_starting_a_series_is_corrected():
+    # One store, no peers on the same day and no other stores for the product
+    df = frame([
+        ["2024-01-01", "K-Market Testi", "Peruna 1 kg", "6400000000017", "249"],
+        ["2024-01-08", "K-Market Testi", "Peruna 1 kg", "6400000000017", "2,49"],
+        ["2024-01-15", "K-Market Testi", "Peruna 1 kg", "6400000000017", "2,59"],
+    ])
+    report = QualityReport.from_frame(df)
+    assert list(report.flags.index) == [0]
+    assert report.flags["syy"].iloc[0] == "senttejä"
+    assert report.flags["korjattu"].iloc[0] == 2.49
+    np.testing.assert_allclose(report.apply(df)["hinta"].to_numpy(), [2.49, 2.49, 2.59], rtol=1e-6)
+
+
+def test_extend_matches_full_check():
+    df = synthetic_frame()
+    history, delta, full = split_last_date(df)
+    extended = QualityReport.from_frame(history).extend(full, len(history))
+    rebuilt = QualityReport.from_frame(full)
+    assert extended is not None
+    pd.testing.assert_frame_equal(extended.flags, rebuilt.flags)
+    np.testing.assert_array_equal(extended.positions, rebuilt.positions)
+    np.testing.assert_array_equal(extended.corrected, rebuilt.corrected)
+
+
+def test_extend_refuses_backfilled_dates():
+    df = synthetic_frame()
+    history, delta, full = split_last_date(df)
+    late = QualityReport.from_frame(full)
+    assert late.extend(pd.concat([full, history.iloc[:5]], ignore_index=True), len(full)) is None
@@ -0,0 +1,85 @@
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+import shared_dataset
+from bench.fake_gspread import FakeSpreadsheet
+from bench.synthetic import generate_rows
+from dataset import concat_frames
+from parsing import parse_sheet
+from partitions import PartitionedSync
+from shared_dataset import KEEP_VERSIONS, SharedSync
+
+
+def leader_and_follower(root):
+    rows = generate_rows(5, 3, 6, seed=4)
+    main = FakeSpreadsheet("Potwell Data", {"Sheet1": rows})
+    leader = SharedSync(root, lambda: PartitionedSync(lambda: [main], parse=parse_sheet, concat=concat_frames))
+    leader.refresh()
+    # The leader holds leader.lock, so this one only follows CURRENT
+    follower = SharedSync(root, lambda: pytest.fail("the follower must not sync"))
+    return main, leader, follower
+
+
+def append_day(main, day):
+    rows = main.sheet1.rows
+    main.sheet1.append_rows([[day, *r[1:5]] for r in rows[1:4]])
+
+
+def test_follower_sees_versions_and_delta(tmp_path):
+    main, leader, follower = leader_and_follower(str(tmp_path))
+    assert leader.is_leader
+    assert follower.version == leader.version and follower.last_mode == "full"
+    first = follower.version
+
+    follower.refresh()
+    assert not follower.is_leader and follower.last_mode == "unchanged"
+
+    append_day(main, "2024-07-01")
+    leader.refresh()
+    follower.refresh()
+    assert follower.version == leader.version != first
+    assert follower.last_mode == "delta" and follower.parent_version == first
+    assert len(follower.last_delta) == 3
+    pd.testing.assert_frame_equal(follower.frame, leader.frame)
+
+
+def test_follower_skips_a_removed_version(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    main, leader, follower = leader_and_follower(root)
+    append_day(main, "2024-07-01")
+    leader.refresh()
+
+    real_open = shared_dataset.open_dataset
+    raced = []
+
+    def open_dataset(root, name):
+        if not raced:
+            # The follower has read CURRENT; the leader publishes past it and
+            # removes its file before the open
+            raced.append(name)
+            for day in range(2, 2 + KEEP_VERSIONS):
+                append_day(main, f"2024-07-0{day}")
+                leader.refresh()
+            assert not os.path.exists(os.path.join(root, name))
+        return real_open(root, name)
+
+    monkeypatch.setattr(shared_dataset, "open_dataset", open_dataset)
+    follower.refresh()
+    assert raced
+    assert follower.version == leader.version and follower.last_mode == "full"
+    pd.testing.assert_frame_equal(follower.frame, leader.frame)
+    assert len(glob.glob(os.path.join(root, "data-*.arrow"))) == KEEP_VERSIONS
+
+
+def test_current_file_gone_keeps_the_frame(tmp_path):
+    root = str(tmp_path)
+    main, leader, follower = leader_and_follower(root)
+    version = follower.version
+    append_day(main, "2024-07-01")
+    leader.refresh()
+    os.remove(os.path.join(root, shared_dataset.read_current(root)["file"]))
+    follower.refresh()
+    assert follower.version == version and follower.last_mode == "unchanged"
@@ -0,0 +1,92 @@
+from bench.fake_gspread import FakeSpreadsheet, FakeWorksheet
+from bench.synthetic import generate_rows
+from dataset import concat_frames
+from parsing import parse_sheet
+from sheet_sync import BackgroundRefresher, SheetSync
+
+
+def make_sync(ws: FakeWorksheet) -> SheetSync:
+    return SheetSync(lambda: ws, parse=parse_sheet, concat=concat_frames)
+
+
+def test_poll_sequence():
+    rows = generate_rows(6, 4, 6, seed=3)
+    # A note in a cell right of the header on the last row
+    rows[-1] = rows[-1] + ["muistiinpano"]
+    ws = FakeWorksheet(rows)
+    sync = make_sync(ws)
+
+    modes = []
+    for _ in range(2):
+        sync.refresh()
+        modes.append(sync.last_mode)
+    new = [["2024-06-03", *r[1:5]] for r in rows[1:5]]
+    ws.append_rows(new)
+    sync.refresh()
+    modes.append(sync.last_mode)
+    assert modes == ["full", "unchanged", "delta"]
+    assert len(sync.frame) == len(rows) - 1 + len(new)
+    assert sync.parent_version is not None and len(sync.last_delta) == len(new)
+
+
+def test_edit_above_the_mark_reloads():
+    rows = generate_rows(6, 4, 6, seed=3)
+    ws = FakeWorksheet(rows)
+    sync = make_sync(ws)
+    sync.refresh()
+    ws.rows[-1][4] = "9,99"
+    sync.refresh()
+    assert sync.last_mode == "full"
+
+
+def test_delta_matches_full_reload():
+    rows = generate_rows(6, 4, 6, seed=3)
+    ws = FakeWorksheet(rows[:40])
+    sync = make_sync(ws)
+    sync.refresh()
+    ws.append_rows(rows[40:])
+    sync.refresh()
+    assert sync.last_mode == "delta"
+
+    fresh = make_sync(FakeWorksheet(rows))
+    fresh.refresh()
+    assert sync.frame.reset_index(drop=True).equals(fresh.frame.reset_index(drop=True))
+
+
+def test_refresh_now_waits_for_the_next_poll():
+    rows = generate_rows(6, 4, 6, seed=3)
+    ws = FakeWorksheet(rows[:40])
+    sync = make_sync(ws)
+    refresher = BackgroundRefresher(sync, interval=3600)
+    try:
+        assert refresher.wait_for_data(10)
+        ws.append_rows(rows[40:])
+        assert refresher.refresh_now(10)
+        assert len(sync.frame) == len(rows) - 1
+    finally:
+        refresher.stop()
+
+
+def test_stale_sync_downloads_only_when_the_probe_changes():
+    rows = generate_rows(6, 4, 6, seed=3)
+    spreadsheet = FakeSpreadsheet("Potwell Data", {"Sheet1": rows[:40]})
+    ws = spreadsheet.sheet1
+    sync = SheetSync(lambda: ws, parse=parse_sheet, concat=concat_frames,
+                     probe=lambda w: w.spreadsheet.get_lastUpdateTime(), full_reload_interval=0)
+    sync.refresh()
+    sync.refresh()
+    assert sync.last_mode == "unchanged"
+    assert [c[0] for c in ws.calls].count("get_all_values") == 1
+
+    # Changed and past the interval: read in full
+    ws.append_rows(rows[40:])
+    sync.refresh()
+    assert sync.last_mode == "full" and len(sync.frame) == len(rows) - 1
+
+
+def test_stale_sync_without_probe_reloads():
+    ws = FakeWorksheet(generate_rows(6, 4, 6, seed=3))
+    sync = SheetSync(lambda: ws, parse=parse_sheet, concat=concat_frames, full_reload_interval=0)
+    sync.refresh()
+    sync.refresh()
+    assert sync.last_mode == "full"
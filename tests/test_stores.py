@@ -0,0 +1,78 @@
+import random
+import re
+
+import numpy as np
+import pandas as pd
+
+from bench.synthetic import store_names
+from stores import CITYMARKET_OVERRIDES, classify_store, classify_stores, get_group, normalize_store_name
+
+
+def baseline_chain(store: str) -> str:
+    # The ordered rules of the original dashboard.get_chain
+    n = normalize_store_name(store)
+    u = n.upper()
+    if n in CITYMARKET_OVERRIDES:
+        return "Citymarket"
+    if re.search(r"\(\s*SM\b", u):
+        return "K-Supermarket"
+    if re.search(r"\(\s*KM\b", u):
+        return "K-Market"
+    if "CITYMARKET" in u or re.search(r"\(\s*CM\b", u):
+        return "Citymarket"
+    if "K-SUPERMARKET" in u or re.search(r"\bK[- ]?SUPERMARKET\b", u):
+        return "K-Supermarket"
+    if "K-MARKET" in u or re.search(r"\bK[- ]?MARKET\b", u):
+        return "K-Market"
+    if "PRISMA" in u:
+        return "Prisma"
+    if "ALEPA" in u:
+        return "Alepa"
+    if re.search(r"\bSALE\b", u):
+        return "Sale"
+    if "SM Arabia" in u or "SM Leinola" in u or re.search(r"\bS[- ]?MARKET\b", u):
+        return "S-Market"
+    return "Muu"
+
+
+NAMES = [
+    *CITYMARKET_OVERRIDES,
+    "Tampere (SM Hervanta)", "Oulu ( KM Raksila )", "Espoo (sm Leppävaara)", "Lahti (SMX)",
+    "Citymarket Kupittaa", "Turku (CM Kupittaa)", "K-Supermarket Kamppi", "K Supermarket Kamppi",
+    "KSupermarket Kamppi", "K-Market Kaleva", "K Market Kaleva", "KMarket Kaleva",
+    "Prisma Kaleva", "PRISMA Itäkeskus", "Alepa Kamppi", "Sale Laune", "Salem", "Salem Sale",
+    "S-Market Laune", "S Market Laune", "SMarket Laune", "SM Arabia", "SM Leinola",
+    "Prisma (KM Kaleva)", "Sale (SM Keskusta)", "Lähikauppa Kaleva", "Tokmanni", "", "  ",
+]
+
+
+def test_classify_store_matches_the_baseline_rules():
+    names = NAMES + store_names(400, random.Random(5))
+    for name in names:
+        n = normalize_store_name(name)
+        chain = baseline_chain(name)
+        assert classify_store(n) == (chain, get_group(chain)), name
+
+
+def test_known_cases():
+    assert classify_store("Tampere (SM Hervanta)")[0] == "K-Supermarket"
+    assert classify_store("K Market Kaleva") == ("K-Market", "K-Ryhmä")
+    assert classify_store("Sale Laune") == ("Sale", "S-Ryhmä")
+    assert classify_store("Salem") == ("Muu", "Muu")
+    # Upper-cased before the match, so the mixed-case literal never hits
+    assert classify_store("SM Arabia") == ("Muu", "Muu")
+    assert classify_store("Tokmanni") == ("Muu", "Muu")
+    for name in CITYMARKET_OVERRIDES:
+        assert classify_store(name) == ("Citymarket", "K-Ryhmä")
+
+
+def test_classify_stores_broadcasts_per_row():
+    raw = pd.Series(["Prisma Kaleva", np.nan, "Oulu ( KM Raksila )", "Prisma Kaleva", np.nan,
+                     "Oulu (KM Raksila)", "Salem"], index=[10, 11, 12, 13, 14, 15, 16])
+    out = classify_stores(raw)
+    assert list(out.index) == list(raw.index)
+    names = [normalize_store_name(x) for x in raw]
+    assert out["kauppa"].tolist() == names
+    assert out["Ketju"].tolist() == [classify_store(n)[0] for n in names]
+    assert out["Ryhmä"].tolist() == [classify_store(n)[1] for n in names]
+    assert out["Ketju"].tolist() == ["Prisma", "Muu", "K-Market", "Prisma", "Muu", "K-Market", "Muu"]